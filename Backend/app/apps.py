@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # Register (but don't open) the MongoDB connection; see app/mongo_connection.py
+        from .mongo_connection import register_mongodb
+        register_mongodb()
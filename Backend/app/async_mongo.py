@@ -0,0 +1,39 @@
+"""
+Async MongoDB access for the ASGI views.
+
+Uses PyMongo's native async API (``pymongo.AsyncMongoClient``). A client is
+bound to the event loop it was created on, so one client is kept per loop:
+under uvicorn that is one per worker process.
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+from pymongo import AsyncMongoClient
+
+from .instrumentation import mongo_command_listener
+
+_CLIENT_OPTIONS = (
+    'maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'serverSelectionTimeoutMS',
+    'socketTimeoutMS', 'connectTimeoutMS',
+)
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_db():
+    """Database handle for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        config = settings.MONGODB_SETTINGS
+        options = {key: config[key] for key in _CLIENT_OPTIONS if key in config}
+        client = AsyncMongoClient(
+            config['host'],
+            event_listeners=[mongo_command_listener],
+            tz_aware=False,
+            **options,
+        )
+        _clients[loop] = client
+    return client[settings.MONGODB_SETTINGS['db']]
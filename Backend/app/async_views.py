@@ -0,0 +1,234 @@
+"""
+Async (ASGI) variants of the hot read endpoints.
+
+These mirror the response shapes of the sync views in mongo_views.py and
+mongo_auth.py, but await MongoDB through ``AsyncMongoClient`` so an in-flight
+Atlas round trip doesn't hold a worker thread. Serve them with
+``APP_SERVER=asgi`` (uvicorn workers); under WSGI they still work but gain
+nothing.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime, time
+
+import jwt
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import slot_events
+from .async_mongo import get_async_db
+from .degraded import (
+    DatabaseUnavailable, guarded_fetch_async, mark_stale, read_or_stale_async, serves_stale, unavailable_response,
+)
+from .mongo_auth import JWT_ALGORITHM, JWT_SECRET
+from .mongo_models import Consultation, JWTToken, SlotDay, SlotHold, Test, TimeSlot, User
+from .mongo_views import serialize_consultation, serialize_test, serialize_time_slot, time_slot_key
+from .payment_gateway import GatewayError, GatewayUnavailable, get_gateway
+from .slot_buckets import bucket_id, bucket_slots_enabled, bucket_time_slots, template_bucket
+from .slot_holds import apply_holds, attach_order, get_active_hold, held_seats_pipeline, request_hold_owners
+from .slot_templates import overlay, virtual_slots_enabled
+
+logger = logging.getLogger(__name__)
+
+
+def _collection(document_cls):
+    return get_async_db()[document_cls._meta['collection']]
+
+
+def _parse_date(date_str):
+    if date_str:
+        try:
+            return datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return date.today()
+
+
+async def _find_time_slots(target_date):
+    if bucket_slots_enabled():
+        # One point read on the day's bucket (see slot_buckets.py)
+        document = await _collection(SlotDay).find_one({'_id': bucket_id(target_date)})
+        if document is None:
+            document = await sync_to_async(template_bucket)(target_date)
+        return bucket_time_slots(document)
+    query = {'date': datetime.combine(target_date, time.min)}
+    if not virtual_slots_enabled():
+        query['available'] = True
+    cursor = _collection(TimeSlot).find(query).sort('start_time', 1)
+    slots = [TimeSlot._from_son(doc) async for doc in cursor]
+    if virtual_slots_enabled():
+        # The template is cached in-process; a miss is a single small read
+        return await sync_to_async(overlay)(target_date, slots)
+    return slots
+
+
+async def _time_slot_data(target_date):
+    slots = await _find_time_slots(target_date)
+    held = {}
+    if slots:
+        cursor = await _collection(SlotHold).aggregate(
+            held_seats_pipeline([slot.api_id for slot in slots])
+        )
+        held = {row['_id']: row['seats'] async for row in cursor}
+    return [serialize_time_slot(apply_holds(slot, held.get(slot.api_id))) for slot in slots]
+
+
+@serves_stale
+@require_GET
+async def time_slots(request):
+    """Async variant of GET /api/mongo/time-slots/"""
+    target_date = _parse_date(request.GET.get('date'))
+    key = time_slot_key(target_date)  # snapshots shared with the sync view (degraded.py)
+    try:
+        slot_data, stale_since = await read_or_stale_async(
+            key, lambda: guarded_fetch_async(key, lambda: _time_slot_data(target_date))
+        )
+        return mark_stale(JsonResponse({
+            'success': True,
+            'date': target_date.isoformat(),
+            'slots': slot_data,
+            'source': 'stale_snapshot' if stale_since else 'mongodb_async',
+            'total_slots': len(slot_data)
+        }), stale_since)
+    except DatabaseUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        logger.exception("MongoDB async time slots error")
+        return JsonResponse({
+            'success': False,
+            'error': f'MongoDB error: {str(e)}',
+            'date': target_date.isoformat(),
+            'slots': []
+        }, status=500)
+
+
+@serves_stale
+@require_GET
+async def time_slot_stream(request):
+    """
+    GET /api/mongo/async/time-slots/stream/?date=YYYY-MM-DD: Server-Sent
+    Events with the day's slots (``snapshot``), then the slots that change
+    (``delta``) as seats are held and booked (see slot_events.py)
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI thread would be pinned for as long as the client listens
+        return JsonResponse({'success': False, 'error': 'Live availability needs APP_SERVER=asgi'}, status=501)
+    target_date = _parse_date(request.GET.get('date'))
+    if not slot_events.watchable(target_date):
+        return JsonResponse({'success': False, 'error': f'{target_date} is outside the bookable horizon'}, status=400)
+    response = StreamingHttpResponse(slot_events.stream(target_date), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # no proxy buffering
+    return response
+
+
+async def _catalog(key, document_cls, serializer, sort_field):
+    async def query():
+        cursor = _collection(document_cls).find().sort(sort_field, 1)
+        return [serializer(document_cls._from_son(doc)) async for doc in cursor]
+
+    try:
+        data, stale_since = await read_or_stale_async(key, lambda: guarded_fetch_async(key, query))
+        return mark_stale(JsonResponse(data, safe=False), stale_since)
+    except DatabaseUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        logger.exception("MongoDB async catalog error")
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@serves_stale
+@require_GET
+async def test_catalog(request):
+    """Async variant of GET /api/mongo/tests/"""
+    return await _catalog('tests', Test, serialize_test, 'name')
+
+
+@serves_stale
+@require_GET
+async def consultation_catalog(request):
+    """Async variant of GET /api/mongo/consultations/"""
+    return await _catalog('consultations', Consultation, serialize_consultation, 'docname')
+
+
+@require_GET
+async def verify_token(request):
+    """Async variant of GET /api/mongo/auth/verify/"""
+    access_token = request.COOKIES.get('access_token')
+    if not access_token:
+        return JsonResponse({'authenticated': False}, status=401)
+
+    try:
+        # Reject expired/forged tokens before touching MongoDB
+        payload = jwt.decode(access_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        user_id = ObjectId(payload['user_id'])
+    except (jwt.InvalidTokenError, InvalidId, KeyError):
+        return JsonResponse({'authenticated': False}, status=401)
+
+    try:
+        stored_token, user = await asyncio.gather(
+            _collection(JWTToken).find_one({'token': access_token, 'is_blacklisted': False}, {'_id': 1}),
+            _collection(User).find_one({'_id': user_id}),
+        )
+    except Exception as e:
+        logger.exception("MongoDB async verify error")
+        return JsonResponse({'error': str(e)}, status=500)
+
+    if not stored_token or not user or not user.get('is_active', True):
+        return JsonResponse({'authenticated': False}, status=401)
+
+    username = user['username']
+    return JsonResponse({
+        'authenticated': True,
+        'user': {
+            'id': str(user['_id']),
+            'username': username.split('@')[0] if '@' in username else username,  # Extract username part
+            'email': user['email'],
+            'role': user.get('role', 'patient')
+        }
+    })
+
+
+@csrf_exempt
+@require_POST
+async def create_order(request):
+    """Async variant of POST /create-order/: the gateway call doesn't hold a worker"""
+    from .views import ORDER_AMOUNT
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    hold_id = data.get('hold_id')
+    hold_owners = await sync_to_async(request_hold_owners)(request, data.get('hold_token'))
+    if hold_id and await sync_to_async(get_active_hold)(hold_id, hold_owners) is None:
+        return JsonResponse({'error': 'Seat hold not found or expired'}, status=410)
+
+    try:
+        order = await get_gateway().create_order_async(
+            ORDER_AMOUNT, 'INR', notes={'hold_id': hold_id} if hold_id else None
+        )
+    except GatewayUnavailable as e:
+        response = JsonResponse({'error': str(e)}, status=503)
+        if e.retry_after:
+            response['Retry-After'] = str(int(e.retry_after) + 1)
+        return response
+    except GatewayError as e:
+        return JsonResponse({'error': str(e)}, status=502)
+
+    if hold_id:
+        await sync_to_async(attach_order)(hold_id, order['id'], hold_owners, order['amount'])
+    return JsonResponse({
+        'order_id': order['id'],
+        'amount': order['amount'],
+        'currency': order['currency'],
+        'hold_id': hold_id
+    }, status=201)
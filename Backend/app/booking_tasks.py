@@ -0,0 +1,34 @@
+"""
+Side effects of a booking that run on the task worker (see tasks.py).
+"""
+
+import base64
+import binascii
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .mongo_models import Patient
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+
+@task()
+def save_prescription(patient_id, file_data, filename):
+    """Decode an uploaded prescription (base64 or data URL), store it and attach it to the patient"""
+    if ',' in file_data:
+        _, file_data = file_data.split(',', 1)
+    try:
+        file_content = base64.b64decode(file_data)
+    except (binascii.Error, ValueError):
+        # Retrying won't fix a corrupt upload
+        logger.error("Prescription %s for patient %s is not valid base64; dropped", filename, patient_id)
+        return
+
+    saved_path = default_storage.save(f'prescriptions/{filename}', ContentFile(file_content))
+    Patient.objects(id=patient_id).update_one(
+        set__prescription_file=saved_path, set__prescription_filename=filename
+    )
+    logger.debug("Saved prescription file: %s", saved_path)
@@ -0,0 +1,442 @@
+"""
+Two-tier Django cache: a small LRU in each process in front of a shared store.
+
+``TwoTierCache`` (``settings.CACHES['default']``) reads L1, a per-process
+``LocalCache``, then L2, a store every worker shares. ``LOCATION`` picks L2:
+
+* ``mongodb`` (default): the ``cache_entries`` collection, expired by a TTL
+  index (``MongoStore``);
+* ``redis://...`` or ``memcached://host:port``: the redis or pymemcache
+  client, when installed (``RedisStore``, ``MemcachedStore``);
+* ``memory``: an in-process stand-in for tests and development
+  (``MemoryStore``).
+
+A store is anything with the small memcached/Redis-shaped protocol of
+``MemoryStore``: ``get_many``, ``set``, ``add`` (set if absent), ``delete_many``
+and ``clear`` on pickled bytes with a timeout in seconds (None: never), plus
+an optional ``set_many``.
+
+L1 keeps a copy for at most ``L1_TIMEOUT`` seconds, which bounds how long a
+worker can serve a value another worker has overwritten; ``delete`` and
+``clear`` also go out on the cache bus (cache_bus.py), so removals reach
+every worker's L1 at once.
+
+``get_or_set`` protects the source behind a key:
+
+* probabilistic early refresh: each read of a fresh value may recompute it
+  slightly before it expires, more likely the closer expiry is and the
+  longer the last computation took (the XFetch rule with ``EARLY_REFRESH_BETA``),
+  so a hot key is refreshed by one request instead of expiring under load;
+* stampede protection: a recomputation takes a lock in L2 (``add``); other
+  workers keep serving the previous value, kept ``STALE_GRACE`` seconds past
+  expiry, or wait up to ``LOCK_TIMEOUT`` for the new one. Within a process,
+  concurrent misses share one computation (singleflight.py).
+
+L2 failures are logged and treated as misses; the cache never fails a request.
+"""
+
+import logging
+import math
+import pickle
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .cache_bus import ALL, LocalCache, bus, invalidate
+from .mongo_models import CacheEntry
+from .singleflight import coalesce
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.05
+
+
+class Envelope:
+    """A cached value with its logical expiry and how long it took to compute"""
+    __slots__ = ('value', 'expires', 'delta')
+
+    def __init__(self, value, expires=None, delta=0.0):
+        self.value = value
+        self.expires = expires  # time.time(); None: never
+        self.delta = delta
+
+    def expired(self, now):
+        return self.expires is not None and now >= self.expires
+
+
+# Shared stores
+
+class MemoryStore:
+    """In-process stand-in for a shared store (one per process: not shared between workers)"""
+
+    def __init__(self, location=None):
+        self._data = {}  # key -> (bytes, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._lock:
+            return {key: item[0] for key in keys if (item := self._live(key, now)) is not None}
+
+    def set(self, key, data, timeout):
+        with self._lock:
+            self._data[key] = (data, None if timeout is None else time.time() + timeout)
+
+    def add(self, key, data, timeout):
+        with self._lock:
+            if self._live(key, time.time()) is not None:
+                return False
+            self._data[key] = (data, None if timeout is None else time.time() + timeout)
+            return True
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MongoStore:
+    """``cache_entries``: one document per key, removed by the TTL index once expired"""
+
+    def __init__(self, location=None):
+        self.collection = CacheEntry._get_collection
+
+    @staticmethod
+    def _expires_at(timeout):
+        return None if timeout is None else datetime.utcnow() + timedelta(seconds=timeout)
+
+    @staticmethod
+    def _live(now):
+        # The TTL monitor runs once a minute, so reads filter expired entries themselves
+        return {'$or': [{'expires_at': None}, {'expires_at': {'$gt': now}}]}
+
+    def get_many(self, keys):
+        query = {'_id': {'$in': list(keys)}, **self._live(datetime.utcnow())}
+        return {document['_id']: document['value'] for document in self.collection().find(query)}
+
+    def set(self, key, data, timeout):
+        self.collection().update_one(
+            {'_id': key}, {'$set': {'value': data, 'expires_at': self._expires_at(timeout)}}, upsert=True
+        )
+
+    def set_many(self, items, timeout):
+        self.collection().bulk_write([
+            UpdateOne({'_id': key}, {'$set': {'value': data, 'expires_at': self._expires_at(timeout)}}, upsert=True)
+            for key, data in items.items()
+        ], ordered=False)
+
+    def add(self, key, data, timeout):
+        now = datetime.utcnow()
+        try:
+            # Matches only an expired entry; a live one makes the upsert collide on _id
+            self.collection().find_one_and_update(
+                {'_id': key, 'expires_at': {'$ne': None, '$lte': now}},
+                {'$set': {'value': data, 'expires_at': self._expires_at(timeout)}},
+                upsert=True,
+                projection={'_id': 1},
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def delete_many(self, keys):
+        self.collection().bulk_write([DeleteMany({'_id': {'$in': list(keys)}})])
+
+    def clear(self):
+        self.collection().delete_many({})
+
+
+class RedisStore:
+    """``redis://`` locations, through redis-py"""
+
+    def __init__(self, location):
+        import redis  # optional dependency, only needed for this store
+
+        self.client = redis.Redis.from_url(location)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        return {key: data for key, data in zip(keys, self.client.mget(keys)) if data is not None}
+
+    def set(self, key, data, timeout):
+        self.client.set(key, data, px=None if timeout is None else max(1, int(timeout * 1000)))
+
+    def add(self, key, data, timeout):
+        return bool(self.client.set(key, data, nx=True, px=None if timeout is None else max(1, int(timeout * 1000))))
+
+    def delete_many(self, keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class MemcachedStore:
+    """``memcached://host:port`` locations, through pymemcache"""
+
+    def __init__(self, location):
+        from pymemcache.client.base import Client  # optional dependency, only needed for this store
+
+        host, _, port = location.split('://', 1)[1].partition(':')
+        self.client = Client((host, int(port or 11211)))
+
+    @staticmethod
+    def _expire(timeout):
+        return 0 if timeout is None else max(1, math.ceil(timeout))
+
+    def get_many(self, keys):
+        return self.client.get_many(list(keys))
+
+    def set(self, key, data, timeout):
+        self.client.set(key, data, expire=self._expire(timeout))
+
+    def add(self, key, data, timeout):
+        return self.client.add(key, data, expire=self._expire(timeout), noreply=False)
+
+    def delete_many(self, keys):
+        self.client.delete_many(list(keys))
+
+    def clear(self):
+        self.client.flush_all()
+
+
+def make_store(location):
+    if location.startswith('redis://') or location.startswith('rediss://'):
+        return RedisStore(location)
+    if location.startswith('memcached://'):
+        return MemcachedStore(location)
+    if location == 'memory':
+        return MemoryStore()
+    return MongoStore()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location or 'mongodb'
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.l1 = LocalCache(ttl=self.l1_timeout, max_entries=options.get('L1_MAX_ENTRIES', 1000))
+        self.beta = options.get('EARLY_REFRESH_BETA', 1.0)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.stale_grace = options.get('STALE_GRACE', 60)
+        self._store = None
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'early_refreshes': 0, 'stale_served': 0,
+                      'l2_errors': 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = make_store(self.location)
+        return self._store
+
+    def _count(self, name):
+        self.stats[name] += 1  # approximate under threads; diagnostics only
+
+    def _l2(self, method, *args, default=None):
+        try:
+            return getattr(self.store, method)(*args)
+        except Exception:
+            self._count('l2_errors')
+            logger.warning("Cache store %s failed", method, exc_info=True)
+            return default
+
+    # Envelopes in both tiers
+
+    def _l1_get(self, key):
+        entry = self.l1.get(key, bus.stamp(key))
+        return entry[2] if entry is not None else None
+
+    def _l1_set(self, key, envelope):
+        ttl = self.l1_timeout
+        if envelope.expires is not None:
+            ttl = min(ttl, envelope.expires + self.stale_grace - time.time())
+        if ttl > 0:
+            self.l1.set(key, bus.stamp(key), envelope, ttl)
+
+    def _read(self, key):
+        envelope = self._l1_get(key)
+        if envelope is not None:
+            self._count('l1_hits')
+            return envelope
+        return self._read_many([key]).get(key)
+
+    def _read_many(self, keys):
+        found = {}
+        for key, data in self._l2('get_many', keys, default={}).items():
+            try:
+                envelope = pickle.loads(data)
+            except Exception:
+                logger.warning("Unreadable cache entry %s", key, exc_info=True)
+                continue
+            self._count('l2_hits')
+            self._l1_set(key, envelope)
+            found[key] = envelope
+        return found
+
+    def _write(self, key, value, timeout, delta=0.0, grace=0):
+        """Store ``value`` for ``timeout`` seconds (None: forever), kept ``grace`` more for stale reads"""
+        envelope = Envelope(value, None if timeout is None else time.time() + timeout, delta)
+        self._l2('set', key, pickle.dumps(envelope, pickle.HIGHEST_PROTOCOL),
+                 None if timeout is None else timeout + grace)
+        self._l1_set(key, envelope)
+        return envelope
+
+    def _timeout(self, timeout):
+        """Seconds from now (None: forever), per Django's conventions"""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(0, timeout)
+
+    # Django cache API
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self._timeout(timeout)
+        if timeout == 0:
+            return False
+        envelope = Envelope(value, None if timeout is None else time.time() + timeout)
+        added = self._l2('add', key, pickle.dumps(envelope, pickle.HIGHEST_PROTOCOL), timeout, default=False)
+        if added:
+            self._l1_set(key, envelope)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version)
+        envelope = self._read(key)
+        if envelope is None or envelope.expired(time.time()):
+            self._count('misses')
+            return default
+        return envelope.value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self._timeout(timeout)
+        if timeout == 0:
+            self._delete([key])  # Django: expire immediately
+        else:
+            self._write(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        envelope = self._read(key)
+        if envelope is None or envelope.expired(time.time()):
+            return False
+        self._write(key, envelope.value, self._timeout(timeout), envelope.delta)
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        existed = self._read(key) is not None
+        self._delete([key])
+        return existed
+
+    def _delete(self, keys):
+        self._l2('delete_many', keys)
+        # Our own L1 at once, whether or not the bus carries the invalidation
+        self.l1.delete(*keys)
+        invalidate(*keys)
+
+    def get_many(self, keys, version=None):
+        full_keys = {self.make_and_validate_key(key, version): key for key in keys}
+        now = time.time()
+        found, missing = {}, []
+        for full_key in full_keys:
+            envelope = self._l1_get(full_key)
+            if envelope is None:
+                missing.append(full_key)
+            else:
+                found[full_key] = envelope
+        if missing:
+            found.update(self._read_many(missing))
+        return {full_keys[key]: envelope.value for key, envelope in found.items() if not envelope.expired(now)}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if hasattr(self.store, 'set_many') and data and timeout != 0:
+            expires = None if timeout is None else time.time() + timeout
+            envelopes = {self.make_and_validate_key(key, version): Envelope(value, expires) for key, value in data.items()}
+            self._l2('set_many', {key: pickle.dumps(envelope, pickle.HIGHEST_PROTOCOL)
+                                  for key, envelope in envelopes.items()}, timeout)
+            for key, envelope in envelopes.items():
+                self._l1_set(key, envelope)
+        else:
+            for key, value in data.items():
+                self.set(key, value, timeout, version)
+        return []
+
+    def delete_many(self, keys, version=None):
+        full_keys = [self.make_and_validate_key(key, version) for key in keys]
+        if full_keys:
+            self._delete(full_keys)
+
+    def clear(self):
+        self._l2('clear')
+        self.l1.clear()
+        invalidate(ALL)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self._timeout(timeout)
+        envelope = self._read(key)
+        now = time.time()
+        if envelope is not None and not self._refresh_due(envelope, now):
+            return envelope.value
+        if envelope is None:
+            self._count('misses')
+        elif not envelope.expired(now):
+            self._count('early_refreshes')
+        return coalesce(f'cache:{key}', lambda: self._recompute(key, default, timeout, envelope), shared=False)
+
+    def _refresh_due(self, envelope, now):
+        if envelope.expires is None:
+            return False
+        if now >= envelope.expires:
+            return True
+        # XFetch: -log(U) is exponential, so early refreshes get likelier as expiry nears
+        return now - envelope.delta * self.beta * math.log(1.0 - random.random()) >= envelope.expires
+
+    def _recompute(self, key, default, timeout, previous):
+        lock = f'{key}:refresh'
+        if self._l2('add', lock, b'1', self.lock_timeout, default=True):
+            try:
+                return self._compute(key, default, timeout)
+            finally:
+                self._l2('delete_many', [lock])
+
+        # Another worker is recomputing
+        if previous is not None:
+            self._count('stale_served')
+            return previous.value
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            envelope = self._read_many([key]).get(key)
+            if envelope is not None and not envelope.expired(time.time()):
+                return envelope.value
+        return self._compute(key, default, timeout)
+
+    def _compute(self, key, default, timeout):
+        started = time.perf_counter()
+        value = default() if callable(default) else default
+        if value is not None and timeout != 0:
+            self._write(key, value, timeout, time.perf_counter() - started, self.stale_grace)
+        return value
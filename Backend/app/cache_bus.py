@@ -0,0 +1,256 @@
+"""
+Cross-process cache invalidation over a MongoDB capped collection.
+
+Every worker keeps its own in-process caches (``LocalCache``); to keep them
+consistent across gunicorn workers and nodes, whoever changes cached data
+calls ``invalidate(key, ...)``, which inserts one message into the capped
+``cache_bus`` collection. Each process tails that collection with a
+tailable cursor on a daemon thread and records, per key, the id of the
+last message naming it: that id is the key's version. A cached entry is
+stamped with the version it was read under and is only served while the
+version is unchanged, so an invalidation reaches every worker within one
+tail round trip. It works on a single mongod as well as on a replica set.
+
+Messages are read in the collection's natural (insertion) order, never
+filtered on ``_id``: ObjectIds are made by each publisher's clock, so a
+message inserted later can carry a smaller id. A (re)connecting tailer
+reads the collection from the start and skips up to the last message it
+applied.
+
+Staleness stays bounded when the bus is down: once the tailer hasn't been
+current for ``CACHE_BUS_MAX_STALENESS`` seconds (Mongo unreachable, the
+thread stuck), ``stamp()`` returns None and local caches neither serve nor
+keep entries until it catches up. If it reconnects to find that the last
+message it applied has rolled off the capped collection, so others may have
+been missed, everything cached locally is dropped. ``status()`` reports
+whether the tailer is live.
+
+With ``CACHE_BUS = False`` versions never change and local caches expire on
+their TTL only.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from pymongo import CursorType
+from pymongo.errors import PyMongoError
+
+from .mongo_models import CacheInvalidation
+from .singleflight import coalesce
+
+logger = logging.getLogger(__name__)
+
+ALL = '*'
+AWAIT_SECONDS = 1.0  # how long a tail read waits for new messages
+
+ORIGIN = f'{socket.gethostname()}:{os.getpid()}'
+
+
+def bus_enabled():
+    return getattr(settings, 'CACHE_BUS', True)
+
+
+def max_staleness():
+    return getattr(settings, 'CACHE_BUS_MAX_STALENESS', 30)
+
+
+class CacheBus:
+    """This process's view of the bus: key versions, fed by a tailer thread"""
+
+    def __init__(self):
+        self.versions = {}  # key -> id of the last invalidation naming it
+        self.epoch = 0  # bumped when everything must be dropped
+        self.last_id = None
+        self.positioned = False  # last_id is set (None: the collection was empty)
+        self.heard_at = 0.0  # monotonic time the tailer was last known to be current
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start tailing (once per process; threads don't survive a fork)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._tail, name='cache-bus', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop tailing after the current await round trip"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def live(self):
+        return time.monotonic() - self.heard_at < max_staleness()
+
+    def stamp(self, key):
+        """
+        Version of ``key`` to cache under; cached copies are valid while it is
+        unchanged. None while the tailer isn't live: nothing may be served
+        from or kept in a local cache then.
+        """
+        if bus_enabled():
+            self.start()
+            if not self.live():
+                return None
+        with self._lock:
+            return (self.epoch, self.versions.get(key))
+
+    def status(self):
+        return {
+            'enabled': bus_enabled(),
+            'live': bus_enabled() and self.live(),
+            'seconds_since_heard': round(time.monotonic() - self.heard_at, 1) if self.heard_at else None,
+            'keys': len(self.versions),
+            'epoch': self.epoch,
+        }
+
+    def apply(self, message, tailed=True):
+        """Bump the versions of the message's keys; ``tailed``: the tailer read it, so it is our position"""
+        with self._lock:
+            keys = message.get('keys') or []
+            if ALL in keys:
+                self.epoch += 1
+                self.versions.clear()
+            else:
+                for key in keys:
+                    self.versions[key] = message['_id']
+            if tailed:
+                self.last_id = message['_id']
+
+    def flush(self):
+        with self._lock:
+            self.epoch += 1
+            self.versions.clear()
+
+    def _position(self, collection):
+        """The last message accounted for (None: none yet): the last one tailed, or at start the newest"""
+        if not self.positioned:
+            # Older messages can't concern anything this process has cached yet
+            newest = next(collection.find({}, {'_id': 1}).sort('$natural', -1).limit(1), None)
+            self.last_id = newest['_id'] if newest else None
+            self.positioned = True
+        return self.last_id
+
+    def _tail(self):
+        collection = CacheInvalidation._get_collection()
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                position = self._position(collection)
+                cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                cursor = cursor.max_await_time_ms(int(AWAIT_SECONDS * 1000))
+                delay = 1.0
+                while cursor.alive and not self._stop.is_set():
+                    for message in cursor:
+                        if position is not None:
+                            # Up to and including ``position`` was applied before
+                            if message['_id'] == position:
+                                position = None
+                            continue
+                        self.apply(message)
+                    if position is not None:
+                        logger.warning("Cache bus messages rolled off while disconnected; dropping local caches")
+                        self.flush()
+                        position = None
+                    # An empty await round trip: nothing was missed up to now
+                    self.heard_at = time.monotonic()
+                if self.last_id is None:
+                    # A tailable cursor on an empty collection dies at once
+                    self._stop.wait(AWAIT_SECONDS)
+            except PyMongoError:
+                logger.warning("Cache bus tail failed; retrying in %.0fs", delay, exc_info=True)
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30.0)
+            except Exception:
+                logger.exception("Cache bus tailer stopped")
+                return
+
+
+bus = CacheBus()
+
+
+def invalidate(*keys):
+    """Drop ``keys`` from every worker's local caches (``ALL`` drops everything)"""
+    if not keys:
+        return
+    if not bus_enabled():
+        if ALL in keys:
+            bus.flush()
+        return
+    message = {'keys': list(keys), 'origin': ORIGIN}
+    try:
+        CacheInvalidation._get_collection().insert_one(message)
+    except PyMongoError:
+        # Other workers keep serving their copies until TTL; this one at least doesn't
+        logger.warning("Could not publish invalidation of %s", keys, exc_info=True)
+        bus.flush()
+        return
+    # Don't wait for our own tailer; it still reads the message in its turn
+    bus.apply(message, tailed=False)
+
+
+class LocalCache:
+    """
+    A small in-process LRU whose entries expire after ``ttl`` seconds or
+    as soon as their key is invalidated on the bus. Misses go through
+    single-flight, so a cold key is fetched once per process.
+    """
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stamp, expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if stamp is None or entry is None or entry[0] != stamp or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, stamp, value, ttl=None):
+        with self._lock:
+            if stamp is None:
+                # Invalidations aren't being heard: don't keep what they can't reach
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = (stamp, time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """The cached value of ``key``, else ``fetch()`` (stored under the version read before it)"""
+        stamp = bus.stamp(key)
+        entry = self.get(key, stamp)
+        if entry is not None:
+            return entry[2]
+        value = coalesce(key, fetch)
+        self.set(key, stamp, value, ttl)
+        return value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,111 @@
+"""
+A small thread-safe circuit breaker.
+
+``closed``: calls go through; ``failure_threshold`` consecutive failures
+open the circuit. ``open``: calls fail fast with ``CircuitOpenError`` for
+``reset_timeout`` seconds. ``half_open``: up to ``half_open_max_calls``
+trial calls go through; a success closes the circuit, a failure re-opens it.
+
+Only exceptions listed in ``failure_exceptions`` count as failures, so a
+caller's own mistakes (e.g. a 400 from the gateway) don't trip it.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} circuit is open; retry in {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1,
+                 failure_exceptions=(Exception,), clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_exceptions = failure_exceptions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """Reserve a call or raise CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+                self.stats['rejected'] += 1
+                retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+                raise CircuitOpenError(self.name, retry_after)
+            if state == HALF_OPEN:
+                self._half_open_calls += 1
+            self.stats['calls'] += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("%s circuit closed", self.name)
+            self._state = CLOSED
+            self._failures = 0
+
+    def release(self):
+        """End a reserved call that neither succeeded nor failed: frees its half-open slot, state unchanged"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.stats['opened'] += 1
+                    logger.warning("%s circuit opened after %d failure(s)", self.name, self._failures)
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def call(self, function, *args, **kwargs):
+        self.before_call()
+        try:
+            result = function(*args, **kwargs)
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Not the dependency's fault: neither a success nor a failure
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {'name': self.name, 'state': self._current_state(), 'consecutive_failures': self._failures,
+                    **self.stats}
@@ -0,0 +1,414 @@
+"""
+Synthetic data for query-plan checks and scale testing.
+
+Documents are generated as raw dicts in the exact shape mongoengine stores
+(see mongo_models.py) and written with ``insert_many``, so seeding a large
+collection doesn't pay for document validation or per-insert round trips.
+Generation is deterministic for a given ``seed``.
+
+``seed_basic`` fills a small database in-process (check_query_plans).
+``ScalePlan``/``plan_chunks``/``write_chunk`` split a large load into
+independent chunks for the ``generate_data`` command's writer processes:
+ids are derived from (kind, index), so a booking chunk can reference
+patients and slots written by other processes without looking them up.
+"""
+
+import itertools
+import random
+from bisect import bisect
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+from bson import ObjectId
+
+from .normalization import normalize_email, normalize_name, normalize_phone
+from .slot_templates import SLOT_TIMES, day_slots
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Ayaan', 'Krishna', 'Ishaan',
+    'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Anika', 'Navya', 'Myra', 'Sara', 'Ira',
+    'Rohan', 'Kabir', 'Meera', 'Priya', 'Rahul', 'Neha', 'Amit', 'Pooja', 'Vikram', 'Kavya',
+]
+TEST_NAMES = [
+    'Complete Blood Count', 'Lipid Profile', 'Thyroid Profile', 'HbA1c', 'Liver Function Test',
+    'Kidney Function Test', 'Vitamin D', 'Vitamin B12', 'Urine Routine', 'Blood Sugar Fasting',
+    'Iron Studies', 'CRP', 'ESR', 'Dengue NS1', 'Malaria Antigen', 'Full Body Checkup',
+]
+SPECIALIZATIONS = ['General Physician', 'Cardiology', 'Dermatology', 'Pediatrics', 'Orthopedics', 'ENT']
+
+
+def midnight(day):
+    """mongoengine stores DateField values as datetimes at midnight"""
+    return datetime.combine(day, time.min)
+
+
+def phone_number(rng):
+    return f"9{rng.randrange(10**8, 10**9):09d}"
+
+
+def make_patient(rng, created_at, phone=None):
+    first_name = rng.choice(FIRST_NAMES)
+    phone = phone or phone_number(rng)
+    email = f"{first_name.lower()}{rng.randrange(10**6)}@example.com"
+    return {
+        '_id': ObjectId(),
+        'user_id': None,
+        'first_name': first_name,
+        'age': rng.randint(1, 90),
+        'gender': rng.choice('MFO'),
+        'phone_number': phone,
+        'email': email,
+        'prescription_file': None,
+        'prescription_filename': None,
+        'created_at': created_at,
+        'phone_normalized': normalize_phone(phone),
+        'email_lc': normalize_email(email),
+        'first_name_lc': normalize_name(first_name),
+    }
+
+
+def make_tests():
+    return [
+        {'_id': ObjectId(), 'name': name, 'description': f'{name} test', 'price': test_price(i),
+         'created_at': datetime.utcnow()}
+        for i, name in enumerate(TEST_NAMES)
+    ]
+
+
+def make_consultations(rng, count=12):
+    return [
+        {'_id': ObjectId(), 'docname': f'Dr. {rng.choice(FIRST_NAMES)} {i}',
+         'specialization': rng.choice(SPECIALIZATIONS), 'price': float(rng.choice([300, 500, 800])),
+         'created_at': datetime.utcnow()}
+        for i in range(count)
+    ]
+
+
+def make_day_slots(day, max_patients=10):
+    return [{'_id': ObjectId(), **slot} for slot in day_slots(day, max_patients)]
+
+
+def make_booking(rng, booking_number, patient_ids, tests, booking_day, slot_id, created_at):
+    chosen = rng.sample(tests, k=min(len(tests), rng.randint(1, 3)))
+    return {
+        '_id': ObjectId(),
+        'booking_id': f'BK{booking_number:012d}',
+        'patients': patient_ids,
+        'tests': [test['name'] for test in chosen],
+        'total_amount': float(sum(test['price'] for test in chosen) * max(len(patient_ids), 1)),
+        'booking_date': midnight(booking_day),
+        'time_slot': slot_id,
+        'preferred_time': None,
+        'status': rng.choices(['confirmed', 'completed', 'pending', 'cancelled'], [50, 35, 10, 5])[0],
+        'notes': None,
+        'created_at': created_at,
+        'updated_at': created_at,
+    }
+
+
+def insert_batched(collection, documents, batch_size=5000):
+    """insert_many in unordered batches; returns the number inserted"""
+    batch, inserted = [], 0
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    return inserted
+
+
+def seed_basic(db, patients=10000, days=60, bookings=10000, seed=42, batch_size=5000):
+    """
+    Seed ``db`` (a pymongo Database) with catalog data, ``days`` of slots from
+    today, ``patients`` patients and ``bookings`` bookings. Returns counts.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    tests = make_tests()
+    db['tests'].insert_many(tests)
+    db['consultations'].insert_many(make_consultations(rng))
+
+    slot_ids_by_day = {}
+    all_slots = []
+    for offset in range(days):
+        day = date.today() + timedelta(days=offset)
+        if day.weekday() == 6:  # clinic is closed on Sundays
+            continue
+        day_slots = make_day_slots(day)
+        slot_ids_by_day[day] = [slot['_id'] for slot in day_slots]
+        all_slots.extend(day_slots)
+    insert_batched(db['timeslots'], all_slots, batch_size)
+
+    patient_ids = []
+
+    def patient_docs():
+        for i in range(patients):
+            document = make_patient(rng, now - timedelta(seconds=i * 30))
+            patient_ids.append(document['_id'])
+            yield document
+
+    inserted_patients = insert_batched(db['patients'], patient_docs(), batch_size)
+
+    days_with_slots = list(slot_ids_by_day)
+
+    def booking_docs():
+        for i in range(bookings):
+            day = rng.choice(days_with_slots)
+            members = rng.sample(patient_ids, k=min(len(patient_ids), rng.randint(1, 3))) if patient_ids else []
+            yield make_booking(rng, i, members, tests, day, rng.choice(slot_ids_by_day[day]),
+                               now - timedelta(seconds=i * 45))
+
+    inserted_bookings = insert_batched(db['bookings'], booking_docs(), batch_size) if days_with_slots else 0
+
+    return {
+        'tests': len(tests),
+        'timeslots': len(all_slots),
+        'patients': inserted_patients,
+        'bookings': inserted_bookings,
+    }
+
+
+# --- Scale generation ------------------------------------------------------
+
+ID_KINDS = {'user': 1, 'patient': 2, 'member': 3, 'slot': 4, 'booking': 5}
+ID_TIMESTAMP = 1_700_000_000
+
+MAX_FAMILY = 5  # primary patient + up to 4 family members per household
+FAMILY_SIZE_WEIGHTS = [35, 25, 20, 12, 8]  # 1..5 people
+SLOT_WEIGHTS = [3.0, 3.0, 2.5, 2.0, 1.0, 1.0, 1.0, 0.8]  # mornings (fasting tests) are busiest
+WEEKDAY_WEIGHTS = [1.4, 1.0, 1.0, 1.0, 1.1, 1.6, 0.0]  # Mon..Sun; closed on Sundays
+
+
+def synthetic_id(kind, index):
+    """Deterministic ObjectId for the ``index``-th generated document of ``kind``"""
+    return ObjectId(ID_TIMESTAMP.to_bytes(4, 'big') + bytes([ID_KINDS[kind]]) + index.to_bytes(7, 'big'))
+
+
+def test_price(index):
+    return float(199 + 100 * index)
+
+
+@dataclass(frozen=True)
+class ScalePlan:
+    users: int = 100_000
+    bookings: int = 1_000_000
+    days: int = 365
+    start: date = None  # first slot day; default: half the range in the past
+    hot_dates: int = 12
+    seed: int = 42
+    password_hash: str = ''
+
+    def first_day(self):
+        return self.start or date.today() - timedelta(days=self.days // 2)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def household_size(plan, household):
+    rng = random.Random(plan.seed * 1_000_003 + household)
+    return rng.choices(range(1, MAX_FAMILY + 1), FAMILY_SIZE_WEIGHTS)[0]
+
+
+@lru_cache(maxsize=8)
+def _day_distribution(plan):
+    """(day offsets, cumulative weights) for booking dates: weekday mix, month starts, hot dates"""
+    rng = random.Random(plan.seed + 1)
+    first_day = plan.first_day()
+    hot = set(rng.sample(range(plan.days), k=min(plan.hot_dates, plan.days)))
+    offsets, weights = [], []
+    for offset in range(plan.days):
+        day = first_day + timedelta(days=offset)
+        weight = WEEKDAY_WEIGHTS[day.weekday()]
+        if not weight:
+            continue
+        if day.day <= 3:
+            weight *= 1.5  # salary week / monthly checkups
+        if offset in hot:
+            weight *= 4  # health camps, outbreaks
+        offsets.append(offset)
+        weights.append(weight)
+    return offsets, list(itertools.accumulate(weights))
+
+
+def _test_cum_weights():
+    # Zipf-like: a few tests (CBC, lipid profile, thyroid) dominate
+    return list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(TEST_NAMES))))
+
+
+def _users(plan, start, count):
+    now = datetime.utcnow()
+    for i in range(start, start + count):
+        joined = now - timedelta(minutes=(plan.users - i) * 5)
+        yield {
+            '_id': synthetic_id('user', i),
+            'username': f'user{i}',
+            'email': f'user{i}@example.com',
+            'password_hash': plan.password_hash,
+            'role': 'staff' if i % 1000 == 0 else 'patient',
+            'is_active': True,
+            'is_staff': i % 1000 == 0,
+            'is_superuser': False,
+            'date_joined': joined,
+            'last_login': None,
+        }
+
+
+def _households(plan, start, count, patients, members):
+    """Fill ``patients``/``members`` lists for households [start, start+count)"""
+    now = datetime.utcnow()
+    for household in range(start, start + count):
+        rng = random.Random(plan.seed * 7_919 + household)
+        created_at = now - timedelta(minutes=(plan.users - household) * 5)
+        phone = f"9{household:09d}"
+        primary_id = synthetic_id('patient', household * MAX_FAMILY)
+        for member in range(household_size(plan, household)):
+            patient = make_patient(rng, created_at, phone=phone)
+            patient['_id'] = synthetic_id('patient', household * MAX_FAMILY + member)
+            if member == 0:
+                patient['user_id'] = str(synthetic_id('user', household))
+            else:
+                members.append({
+                    '_id': synthetic_id('member', household * MAX_FAMILY + member),
+                    'owner': primary_id,
+                    'first_name': patient['first_name'],
+                    'age': patient['age'],
+                    'gender': patient['gender'],
+                    'phone_number': f"8{household * MAX_FAMILY + member:09d}",  # unique index
+                    'created_at': created_at,
+                })
+            patients.append(patient)
+
+
+def _slots(plan, start, count):
+    first_day = plan.first_day()
+    for offset in range(start, start + count):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() == 6:
+            continue
+        for position, slot in enumerate(make_day_slots(day)):
+            slot['_id'] = synthetic_id('slot', offset * len(SLOT_TIMES) + position)
+            yield slot
+
+
+def _bookings(plan, start, count):
+    rng = random.Random(plan.seed * 104_729 + start)
+    offsets, day_weights = _day_distribution(plan)
+    test_weights = _test_cum_weights()
+    slot_weights = list(itertools.accumulate(SLOT_WEIGHTS))
+    first_day = plan.first_day()
+    today = date.today()
+    now = datetime.utcnow()
+
+    for i in range(start, start + count):
+        offset = offsets[bisect(day_weights, rng.random() * day_weights[-1])]
+        position = bisect(slot_weights, rng.random() * slot_weights[-1])
+        booking_day = first_day + timedelta(days=offset)
+
+        # Repeat customers: low household numbers book more often
+        household = int(plan.users * rng.random() ** 2)
+        size = household_size(plan, household)
+        patient_ids = [
+            synthetic_id('patient', household * MAX_FAMILY + member)
+            for member in rng.sample(range(size), k=rng.randint(1, size))
+        ]
+
+        tests = {bisect(test_weights, rng.random() * test_weights[-1]) for _ in range(rng.randint(1, 3))}
+        if booking_day < today:
+            status = rng.choices(['completed', 'cancelled', 'pending'], [85, 10, 5])[0]
+        else:
+            status = rng.choices(['confirmed', 'pending', 'cancelled'], [80, 15, 5])[0]
+        created_at = min(
+            datetime.combine(booking_day, time.min) - timedelta(days=rng.randint(0, 14), seconds=rng.randrange(86400)),
+            now,
+        )
+        yield {
+            '_id': synthetic_id('booking', i),
+            'booking_id': f'BK{i:012d}',
+            'patients': patient_ids,
+            'tests': [TEST_NAMES[t] for t in sorted(tests)],
+            'total_amount': float(sum(test_price(t) for t in tests) * len(patient_ids)),
+            'booking_date': midnight(booking_day),
+            'time_slot': synthetic_id('slot', offset * len(SLOT_TIMES) + position),
+            'preferred_time': None,
+            'status': status,
+            'notes': None,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+def plan_chunks(plan, chunk_size):
+    """Independent (kind, start, count) work items covering the whole plan"""
+    totals = {'users': plan.users, 'households': plan.users, 'slots': plan.days, 'bookings': plan.bookings}
+    for kind, total in totals.items():
+        # Slots are chunked by day; ~100 days of slots is one insert-sized chunk
+        size = max(1, chunk_size // len(SLOT_TIMES)) if kind == 'slots' else chunk_size
+        for start in range(0, total, size):
+            yield kind, start, min(size, total - start)
+
+
+def write_chunk(task):
+    """
+    Worker entry point (runs in a separate process): generate one chunk and
+    insert it. ``task`` is ``(uri, database, plan dict, kind, start, count,
+    batch_size)``; returns ``{collection: inserted}``.
+    """
+    uri, database, plan, kind, start, count, batch_size = task
+    plan = ScalePlan(**plan)
+    client = _worker_client(uri)
+    db = client[database]
+
+    if kind == 'users':
+        return {'users': insert_batched(db['users'], _users(plan, start, count), batch_size)}
+    if kind == 'households':
+        patients, members = [], []
+        _households(plan, start, count, patients, members)
+        counts = {'patients': insert_batched(db['patients'], patients, batch_size)}
+        counts['member_patients'] = insert_batched(db['member_patients'], members, batch_size)
+        return counts
+    if kind == 'slots':
+        return {'timeslots': insert_batched(db['timeslots'], _slots(plan, start, count), batch_size)}
+    if kind == 'bookings':
+        return {'bookings': insert_batched(db['bookings'], _bookings(plan, start, count), batch_size)}
+    raise ValueError(f'unknown chunk kind {kind!r}')
+
+
+_clients = {}
+
+
+def _worker_client(uri):
+    """One MongoClient per worker process, reused across its chunks"""
+    from pymongo import MongoClient
+
+    if uri not in _clients:
+        _clients[uri] = MongoClient(uri)
+    return _clients[uri]
+
+
+def recompute_slot_counters(db):
+    """Set booked/available counters on every slot from the generated bookings"""
+    from pymongo import UpdateOne
+
+    booked = db['bookings'].aggregate([
+        {'$match': {'status': {'$ne': 'cancelled'}, 'time_slot': {'$ne': None}}},
+        {'$group': {'_id': '$time_slot', 'count': {'$sum': 1}}},
+    ], allowDiskUse=True)
+    operations, updated = [], 0
+    for row in booked:
+        # Demand above capacity is folded in: the slot is simply full
+        operations.append(UpdateOne({'_id': row['_id'], 'unlimited_patients': False}, [{'$set': {
+            'booked_slots': {'$min': ['$max_patients', row['count']]},
+            'available_slots': {'$max': [0, {'$subtract': ['$max_patients', row['count']]}]},
+            'available': {'$lt': [row['count'], '$max_patients']},
+        }}]))
+        if len(operations) >= 5000:
+            updated += db['timeslots'].bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += db['timeslots'].bulk_write(operations, ordered=False).modified_count
+    return updated
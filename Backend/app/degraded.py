@@ -0,0 +1,228 @@
+"""
+Degraded read mode while MongoDB is unreachable.
+
+Without it, every request to an unreachable cluster waits out
+``serverSelectionTimeoutMS`` before failing, and the worker pool drains in
+seconds. Instead, database reads go through one per-process circuit
+breaker (``circuit_breaker.CircuitBreaker`` named 'mongodb'):
+
+* ``guarded_fetch(key, query)`` runs ``query()`` through the breaker and
+  keeps its result as ``key``'s last good snapshot. Connection failures
+  and timeouts (not e.g. duplicate keys) count towards
+  ``DEGRADED_FAILURE_THRESHOLD``; once the circuit is open it raises
+  ``DatabaseUnavailable`` without touching the network.
+* ``read_or_stale(key, load)`` serves that snapshot while the database is
+  unavailable, so slot and catalog reads keep answering, marked stale.
+  ``guarded_fetch_async`` and ``read_or_stale_async`` do the same for the
+  async views, sharing the snapshots.
+* After ``DEGRADED_RESET_SECONDS`` the circuit goes half-open and one call
+  is the probe: the next guarded read, or the next request to another
+  database view, which the middleware reserves it for. Everything else keeps
+  failing fast or getting snapshots; the probe's success closes the circuit.
+* ``DegradedModeMiddleware`` answers every other database view with a 503
+  and ``Retry-After`` while the circuit is open or half-open, instead of
+  letting it block on server selection. Bookings are the exception: they go
+  to the offline journal (offline_journal.py).
+
+Snapshots are per process and in memory; a worker started during an outage
+has none and answers 503 until the cluster is back.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from pymongo.errors import ConnectionFailure
+
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+MAX_SNAPSHOTS = 512  # slot days and catalogs kept for degraded reads
+
+# Views in these modules need MongoDB to answer
+DATABASE_VIEW_MODULES = ('app.mongo_views', 'app.async_views', 'app.mongo_auth')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+breaker = CircuitBreaker(
+    'mongodb',
+    failure_threshold=getattr(settings, 'DEGRADED_FAILURE_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'DEGRADED_RESET_SECONDS', 15.0),
+    failure_exceptions=(ConnectionFailure,),
+)
+
+_snapshots = OrderedDict()  # key -> (value, wall-clock time it was read)
+_lock = threading.Lock()
+stats = {'snapshots_taken': 0, 'stale_served': 0, 'failed_fast': 0}
+
+
+class DatabaseUnavailable(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _remember(key, value):
+    with _lock:
+        _snapshots[key] = (value, datetime.now(timezone.utc))
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+        stats['snapshots_taken'] += 1
+
+
+def _stale(key):
+    """``key``'s last good snapshot, or None"""
+    with _lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is not None:
+            stats['stale_served'] += 1
+    return snapshot
+
+
+def guarded_fetch(key, query):
+    """``query()`` through the breaker; its result becomes ``key``'s last good snapshot"""
+    try:
+        value = breaker.call(query)
+    except CircuitOpenError as e:
+        raise DatabaseUnavailable('Database unavailable', retry_after=e.retry_after) from e
+    except ConnectionFailure as e:
+        raise DatabaseUnavailable(f'Database unavailable: {e}', retry_after=breaker.reset_timeout) from e
+    _remember(key, value)
+    return value
+
+
+async def guarded_fetch_async(key, query):
+    """``guarded_fetch`` for a coroutine function ``query``"""
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        raise DatabaseUnavailable('Database unavailable', retry_after=e.retry_after) from e
+    try:
+        value = await query()
+    except ConnectionFailure as e:
+        breaker.record_failure()
+        raise DatabaseUnavailable(f'Database unavailable: {e}', retry_after=breaker.reset_timeout) from e
+    except BaseException:
+        breaker.release()
+        raise
+    breaker.record_success()
+    _remember(key, value)
+    return value
+
+
+def read_or_stale(key, load):
+    """
+    ``(value, stale_since)``: ``load()`` and None, or ``key``'s last good
+    snapshot and when it was read while the database is unavailable
+    """
+    try:
+        return load(), None
+    except DatabaseUnavailable:
+        snapshot = _stale(key)
+        if snapshot is None:
+            raise
+        return snapshot
+
+
+async def read_or_stale_async(key, load):
+    """``read_or_stale`` for a coroutine function ``load``"""
+    try:
+        return await load(), None
+    except DatabaseUnavailable:
+        snapshot = _stale(key)
+        if snapshot is None:
+            raise
+        return snapshot
+
+
+def database_down(request=None):
+    """
+    True while database calls would fail fast: the circuit is open, or
+    half-open and ``request`` isn't the probe the middleware let through
+    """
+    state = breaker.state
+    return state == OPEN or (state == HALF_OPEN and not getattr(request, 'degraded_probe', False))
+
+
+def mark_stale(response, stale_since):
+    """Tell clients (and caches) how old a degraded answer is"""
+    if stale_since is not None:
+        age = (datetime.now(timezone.utc) - stale_since).total_seconds()
+        response['Age'] = str(int(age))
+        response['X-Data-Stale-Since'] = stale_since.isoformat()
+    return response
+
+
+def unavailable_response(error=None):
+    retry_after = getattr(error, 'retry_after', None) or breaker.reset_timeout
+    response = JsonResponse({'error': str(error or 'Database unavailable'), 'degraded': True}, status=503)
+    response['Retry-After'] = str(int(retry_after) + 1)
+    return response
+
+
+def serves_stale(view):
+    """Mark a view whose safe requests can be answered from snapshots while the circuit is open"""
+    view.serves_stale = True
+    return view
+
+
+def handles_outage(view):
+    """Mark a view that answers by itself while the circuit is open (e.g. by journaling the request)"""
+    view.handles_outage = True
+    return view
+
+
+def status():
+    with _lock:
+        return {**breaker.snapshot(), 'snapshots': len(_snapshots), **stats}
+
+
+class DegradedModeMiddleware(MiddlewareMixin):
+    """
+    Fail database views fast while the MongoDB circuit is open, and while it
+    is half-open for all but the one request that probes the cluster
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, '__module__', None) not in DATABASE_VIEW_MODULES:
+            return None
+        if getattr(view_func, 'serves_stale', False) and request.method in SAFE_METHODS:
+            return None  # guarded reads probe for themselves
+        if breaker.state == CLOSED:
+            return None
+        try:
+            breaker.before_call()  # half-open with the probe free: this request is it
+            request.degraded_probe = True
+            return None
+        except CircuitOpenError:
+            pass
+        if getattr(view_func, 'handles_outage', False):
+            return None
+        with _lock:
+            stats['failed_fast'] += 1
+        return unavailable_response()
+
+    def process_response(self, request, response):
+        if getattr(request, 'degraded_probe', False):
+            request.degraded_probe = False
+            # Still half-open: the probe recorded no connection failure
+            if breaker.state == HALF_OPEN:
+                if response.status_code >= 500:
+                    breaker.release()
+                else:
+                    breaker.record_success()
+        return response
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DatabaseUnavailable):
+            return unavailable_response(exception)
+        if isinstance(exception, ConnectionFailure):
+            breaker.record_failure()
+            logger.warning("Unhandled MongoDB error in %s: %s", request.path, exception)
+            return unavailable_response()
+        return None
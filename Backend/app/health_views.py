@@ -1,3 +1,5 @@
+import hmac
+
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -33,4 +35,120 @@ def warm_up(request):
         return JsonResponse({
             'status': 'error',
             'message': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+def _is_metrics_client(request):
+    """Staff/admin users (JWT cookie) or callers presenting METRICS_TOKEN"""
+    from django.conf import settings
+    from .mongo_auth import is_staff_user, request_user
+
+    metrics_token = getattr(settings, 'METRICS_TOKEN', '')
+    presented = request.headers.get('X-Metrics-Token', '')
+    # Constant-time, and on bytes: compare_digest rejects non-ASCII str
+    if metrics_token and hmac.compare_digest(presented.encode(), metrics_token.encode()):
+        return True
+    return is_staff_user(request_user(request))
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def slow_endpoints(request):
+    """
+    Slowest endpoints from the rolling request timing histogram
+    """
+    from .instrumentation import endpoint_histogram
+
+    if not _is_metrics_client(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    if request.method == 'DELETE':
+        endpoint_histogram.reset()
+        return JsonResponse({'status': 'reset'})
+
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = 20
+
+    return JsonResponse({
+        'window': endpoint_histogram.window,
+        'endpoints': endpoint_histogram.snapshot(limit=limit)
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def task_metrics(request):
+    """
+    Background task counts and durations per task and status
+    """
+    from datetime import datetime, timedelta
+    from .tasks import task_metrics as collect_task_metrics
+
+    if not _is_metrics_client(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        hours = float(request.GET.get('hours', 24))
+    except ValueError:
+        hours = 24
+
+    return JsonResponse({
+        'hours': hours,
+        'tasks': collect_task_metrics(since=datetime.utcnow() - timedelta(hours=hours))
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def slot_subscribers(request):
+    """
+    Live availability subscribers of this worker process, per date
+    """
+    import resource
+    from .slot_events import subscriber_counts
+
+    if not _is_metrics_client(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    counts = subscriber_counts()
+    return JsonResponse({
+        'subscribers': sum(counts.values()),
+        'dates': counts,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def cache_metrics(request):
+    """
+    Hit rates of this worker's caches and the state of its cache bus tailer
+    """
+    from django.core.cache import cache
+    from .cache_bus import bus
+    from .mongo_views import catalog_cache
+
+    if not _is_metrics_client(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    return JsonResponse({
+        'default': {
+            'location': getattr(cache, 'location', None),
+            **getattr(cache, 'stats', {}),
+            'l1_entries': len(cache.l1) if hasattr(cache, 'l1') else None,
+        },
+        'catalogs': {'hits': catalog_cache.hits, 'misses': catalog_cache.misses},
+        'bus': bus.status(),
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def database_metrics(request):
+    """
+    State of this worker's MongoDB circuit breaker, its degraded-mode snapshots
+    and the bookings journaled on this host while the database was down
+    """
+    from .degraded import status
+    from .offline_journal import pending_count
+
+    if not _is_metrics_client(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    return JsonResponse({**status(), 'offline_bookings_pending': pending_count()})
@@ -0,0 +1,204 @@
+"""
+Request timing and MongoDB command instrumentation.
+
+``MongoCommandListener`` is registered on the MongoDB client and attributes
+every command to the request that issued it. ``RequestTimingMiddleware``
+measures total latency, splits it into MongoDB and Python time, emits a
+``Server-Timing`` header plus one structured log line, and feeds a rolling
+per-endpoint histogram that ``slow_endpoints`` exposes to staff users.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from pymongo import monitoring
+
+logger = logging.getLogger('app.timing')
+
+# Stats for the request currently being handled (None outside a request)
+_current_stats = contextvars.ContextVar('request_mongo_stats', default=None)
+# Command capture for query-plan checks (None unless capture_commands is active)
+_captured_commands = contextvars.ContextVar('captured_mongo_commands', default=None)
+
+
+class RequestStats:
+    """Per-request MongoDB counters filled in by the command listener"""
+
+    __slots__ = ('mongo_commands', 'mongo_seconds')
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+
+
+def start_request_stats():
+    """Begin collecting MongoDB stats for the current context"""
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    return stats, token
+
+
+def stop_request_stats(token):
+    """Stop collecting MongoDB stats for the current context"""
+    _current_stats.reset(token)
+
+
+@contextmanager
+def capture_commands():
+    """Collect (database, command name, command document) for every command issued inside the block"""
+    commands = []
+    token = _captured_commands.set(commands)
+    try:
+        yield commands
+    finally:
+        _captured_commands.reset(token)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Attribute MongoDB command durations to the active request"""
+
+    def started(self, event):
+        commands = _captured_commands.get()
+        if commands is not None:
+            commands.append((event.database_name, event.command_name, event.command))
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        stats = _current_stats.get()
+        if stats is None:
+            return
+        stats.mongo_commands += 1
+        # duration_micros covers the round trip to the server for this command
+        stats.mongo_seconds += event.duration_micros / 1_000_000
+
+
+class EndpointHistogram:
+    """Rolling window of recent latencies per endpoint (thread-safe)"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, endpoint, total_ms, mongo_ms, mongo_commands):
+        with self._lock:
+            self._samples[endpoint].append((total_ms, mongo_ms, mongo_commands))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self, limit=20):
+        """Return the slowest endpoints ordered by p95 latency"""
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+
+        rows = []
+        for endpoint, values in samples.items():
+            totals = sorted(v[0] for v in values)
+            count = len(totals)
+            rows.append({
+                'endpoint': endpoint,
+                'count': count,
+                'p50_ms': round(_percentile(totals, 50), 2),
+                'p95_ms': round(_percentile(totals, 95), 2),
+                'p99_ms': round(_percentile(totals, 99), 2),
+                'max_ms': round(totals[-1], 2),
+                'avg_mongo_ms': round(sum(v[1] for v in values) / count, 2),
+                'avg_mongo_commands': round(sum(v[2] for v in values) / count, 2),
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows[:limit]
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+mongo_command_listener = MongoCommandListener()
+endpoint_histogram = EndpointHistogram()
+
+
+def _endpoint_name(request):
+    """Route pattern (not the raw path) so ids don't explode the histogram"""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.route:
+        return f"{request.method} /{match.route}"
+    return f"{request.method} {request.path}"
+
+
+class RequestTimingMiddleware:
+    """Measure request latency and MongoDB time, expose it via Server-Timing"""
+
+    # Native under both WSGI and ASGI so async views aren't pushed to a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        endpoint_histogram.window = getattr(settings, 'REQUEST_TIMING_WINDOW', 500)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = start_request_stats()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total_seconds = time.perf_counter() - started
+            stop_request_stats(token)
+        return self._finish(request, response, stats, total_seconds)
+
+    async def __acall__(self, request):
+        stats, token = start_request_stats()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            total_seconds = time.perf_counter() - started
+            stop_request_stats(token)
+        return self._finish(request, response, stats, total_seconds)
+
+    def _finish(self, request, response, stats, total_seconds):
+        total_ms = total_seconds * 1000
+        mongo_ms = stats.mongo_seconds * 1000
+        python_ms = max(total_ms - mongo_ms, 0.0)
+        endpoint = _endpoint_name(request)
+
+        response['Server-Timing'] = (
+            f'total;dur={total_ms:.1f}, '
+            f'mongo;dur={mongo_ms:.1f};desc="{stats.mongo_commands} commands", '
+            f'app;dur={python_ms:.1f}'
+        )
+        endpoint_histogram.record(endpoint, total_ms, mongo_ms, stats.mongo_commands)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('request', extra={
+                'endpoint': endpoint,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'mongo_ms': round(mongo_ms, 2),
+                'python_ms': round(python_ms, 2),
+                'mongo_commands': stats.mongo_commands,
+            })
+        return response
@@ -0,0 +1,158 @@
+"""
+Logging helpers for the API.
+
+Request handlers log through the standard ``logging`` module instead of
+``print()``. The configured pipeline (see ``LOGGING`` in project/settings.py)
+is::
+
+    logger -> QueueLogHandler [RedactingFilter, SamplingFilter] -> queue
+           -> QueueListener thread -> StreamHandler(JsonFormatter) -> stdout
+
+so request threads only pay for a queue put. Redaction runs as a handler
+filter, before the message is merged with its arguments, and disabled levels
+short-circuit in ``logger.debug`` before any of this happens.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Keys whose values must never reach the logs (PHI, credentials, file payloads)
+REDACTED_KEYS = frozenset({
+    'password', 'password_hash', 'token', 'access_token', 'refresh_token',
+    'prescription_file', 'phone', 'phone_number', 'email', 'name', 'first_name',
+    'razorpay_signature',
+})
+
+# Strings longer than this are replaced by a length marker (base64 blobs etc.)
+MAX_STRING_LENGTH = 256
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(value, _depth=0):
+    """Return a copy of ``value`` with sensitive keys and large blobs masked"""
+    if _depth > 8:
+        return '<nested>'
+    if isinstance(value, dict) or hasattr(value, 'items'):
+        try:
+            items = value.items()
+        except Exception:
+            return value
+        return {
+            key: '<redacted>' if str(key).lower() in REDACTED_KEYS else redact(item, _depth + 1)
+            for key, item in items
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, _depth + 1) for item in value]
+    if isinstance(value, str) and len(value) > MAX_STRING_LENGTH:
+        return f'<{len(value)} chars>'
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    """Mask sensitive values in the record arguments and ``extra=`` attributes before formatting"""
+
+    def filter(self, record):
+        if record.args:
+            if isinstance(record.args, dict):
+                record.args = redact(record.args)
+            else:
+                record.args = tuple(redact(arg) for arg in record.args)
+        elif isinstance(record.msg, dict):
+            record.msg = redact(record.msg)
+        # JsonFormatter emits these as they are
+        for key, value in list(record.__dict__.items()):
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                setattr(record, key, '<redacted>' if key.lower() in REDACTED_KEYS else redact(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records; WARNING and above always pass"""
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and extras"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Non-blocking handler: records are queued and written to ``stream`` by a
+    background QueueListener thread.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.listener = None
+        self._start_listener()
+        atexit.register(self._stop_listener)
+
+    def _start_listener(self):
+        # Threads do not survive fork(), so a preloaded gunicorn worker starts
+        # its own listener on first use.
+        self._pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, not the request thread
+        self.target.setFormatter(fmt)
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start_listener()
+        self.queue.put_nowait(record)
+
+    def prepare(self, record):
+        # Merge the (already redacted) args now because callers may mutate
+        # them after logging returns; leave JSON/traceback formatting to the
+        # listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def _stop_listener(self):
+        # QueueListener.stop() is not idempotent; flushes pending records
+        if self._pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
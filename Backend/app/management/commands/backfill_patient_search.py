@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from app.mongo_models import Patient
+from app.normalization import normalize_email, normalize_name, normalize_phone
+
+
+class Command(BaseCommand):
+    help = 'Fill phone_normalized/email_lc/first_name_lc on patients saved before patient search existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every patient, not only those missing first_name_lc')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        collection = Patient._get_collection()
+        query = {} if options['all'] else {'first_name_lc': {'$exists': False}}
+        projection = {'first_name': 1, 'phone_number': 1, 'email': 1}
+
+        batch, updated = [], 0
+        for document in collection.find(query, projection).batch_size(options['batch_size']):
+            batch.append(UpdateOne({'_id': document['_id']}, {'$set': {
+                'phone_normalized': normalize_phone(document.get('phone_number')),
+                'email_lc': normalize_email(document.get('email')),
+                'first_name_lc': normalize_name(document.get('first_name')),
+            }}))
+            if len(batch) >= options['batch_size']:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+
+        self.stdout.write(f"✅ Updated search keys on {updated} patients")
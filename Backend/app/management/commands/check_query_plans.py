@@ -0,0 +1,148 @@
+import json
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from mongoengine.connection import get_db
+
+from app.datagen import midnight, seed_basic
+from app.instrumentation import capture_commands
+from app.mongo_connection import use_database
+from app.query_plans import bad_stages, command_target, explain_command, explainable
+
+
+def next_weekday(start):
+    day = start
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return day
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scratch MongoDB database, exercise the /api/mongo/ endpoints and fail '
+        'if any captured query uses a COLLSCAN or an in-memory SORT on a large collection'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongo-uri', default=None, help='MongoDB to use (default: settings MONGO_URI)')
+        parser.add_argument('--database', default=None,
+                            help='Scratch database (default: <configured db>_queryplan); it is dropped first')
+        parser.add_argument('--min-docs', type=int, default=1000,
+                            help='Ignore plans on collections smaller than this')
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=180)
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch database afterwards')
+        parser.add_argument('--report', help='Write a JSON report to this path')
+
+    def handle(self, *args, **options):
+        database = options['database'] or f"{settings.MONGODB_SETTINGS['db']}_queryplan"
+        if database == settings.MONGODB_SETTINGS['db']:
+            raise CommandError('Refusing to seed and drop the configured application database')
+
+        use_database(database, host=options['mongo_uri'])
+        db = get_db()
+        try:
+            db.client.drop_database(database)
+            call_command('ensure_indexes', stdout=self.stdout)
+            counts = seed_basic(db, patients=options['patients'], days=options['days'],
+                                bookings=options['bookings'])
+            self.stdout.write(f"🌱 Seeded {database}: {counts}")
+
+            captured = self.exercise_endpoints(db)
+            problems, explained = self.check_plans(db, captured, options['min_docs'])
+        finally:
+            if not options['keep']:
+                db.client.drop_database(database)
+
+        failures = [entry for entry in captured if entry['status'] >= 400]
+        for entry in failures:
+            self.stdout.write(f"❌ {entry['request']} returned {entry['status']}")
+        for problem in problems:
+            self.stdout.write(
+                f"❌ {problem['request']}: {problem['stages']} on {problem['collection']} "
+                f"({problem['collection_size']} docs) {problem['command']} "
+                f"filter={problem['filter']} sort={problem['sort']}"
+            )
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump({'database': database, 'explained': explained, 'problems': problems,
+                           'failed_requests': failures}, f, indent=2, default=str)
+
+        if problems or failures:
+            raise CommandError(f'{len(problems)} query plan problem(s), {len(failures)} failed request(s)')
+        self.stdout.write(f"✅ {explained} queries explained, no collection scans or in-memory sorts")
+
+    def exercise_endpoints(self, db):
+        """Drive the API with the test client, capturing MongoDB commands per request"""
+        from app.mongo_models import User
+
+        user = User(username='queryplan', email='queryplan@example.com', role='staff')
+        user.set_password('queryplan-password')
+        user.save()
+
+        patient = db['patients'].find_one({}, {'phone_number': 1, 'email': 1, 'first_name': 1})
+        patient_id = str(patient['_id'])
+        slot_day = next_weekday(date.today() + timedelta(days=1))
+        slot = db['timeslots'].find_one({'date': midnight(slot_day)})
+        slot_date = slot_day.isoformat()
+
+        client = Client()
+        requests = [
+            ('POST', '/api/mongo/auth/login/', {'username': 'queryplan', 'password': 'queryplan-password'}),
+            ('GET', '/api/mongo/auth/verify/', None),
+            ('GET', '/api/mongo/patients/', None),
+            ('GET', f'/api/mongo/patients/{patient_id}/', None),
+            ('GET', f"/api/mongo/patients/search/?q={patient['phone_number']}", None),
+            ('GET', f"/api/mongo/patients/search/?q={patient['phone_number'][:5]}", None),
+            ('GET', f"/api/mongo/patients/search/?q={patient['email']}", None),
+            ('GET', f"/api/mongo/patients/search/?q={patient['first_name'][:3]}", None),
+            ('GET', '/api/mongo/consultations/', None),
+            ('GET', '/api/mongo/tests/', None),
+            ('GET', '/api/mongo/dashboard/stats/', None),
+            ('GET', f'/api/mongo/time-slots/?date={slot_date}', None),
+            ('GET', f'/api/mongo/simple-time-slots/?date={slot_date}', None),
+            ('POST', '/api/mongo/book-test/', {
+                'cart_items': [{'name': 'Lipid Profile', 'price': 499, 'patients': [
+                    {'name': 'Query Plan', 'age': 30, 'gender': 'F', 'phone': '9000000000'}]}],
+                'total_price': 499,
+                'booking_date': slot['date'].date().isoformat(),
+                'time_slot_id': str(slot['_id']),
+            }),
+        ]
+
+        captured = []
+        for method, path, body in requests:
+            with capture_commands() as commands:
+                if method == 'GET':
+                    response = client.get(path)
+                else:
+                    response = client.post(path, data=json.dumps(body), content_type='application/json')
+            captured.append({'request': f'{method} {path}', 'status': response.status_code, 'commands': commands})
+            self.stdout.write(f"   {response.status_code} {method} {path} ({len(commands)} commands)")
+        return captured
+
+    def check_plans(self, db, captured, min_docs):
+        sizes, problems, explained = {}, [], 0
+        for entry in captured:
+            for database_name, command_name, command in entry['commands']:
+                if database_name != db.name or not explainable(command_name, command):
+                    continue
+                collection, query_filter, sort = command_target(command_name, command)
+                if collection not in sizes:
+                    sizes[collection] = db[collection].estimated_document_count()
+                if sizes[collection] < min_docs:
+                    continue
+                stages = bad_stages(explain_command(db, command))
+                explained += 1
+                if stages:
+                    problems.append({
+                        'request': entry['request'], 'command': command_name, 'collection': collection,
+                        'collection_size': sizes[collection], 'stages': sorted(stages),
+                        'filter': query_filter, 'sort': sort,
+                    })
+        return problems, explained
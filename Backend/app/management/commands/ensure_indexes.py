@@ -0,0 +1,142 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from app.mongo_indexes import (
+    CONFLICT, EXTRA, MISSING, OK, diff_indexes, duplicate_keys, index_usage, live_model, registered_documents,
+    set_ttl, ttl_change,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Converge MongoDB indexes to the declarations in app/mongo_models.py. TTL changes are applied '
+        'in place; other conflicting options need --rebuild. A unique index is only built (or rebuilt) '
+        'once its keys have no duplicates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report, change nothing')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop and recreate indexes whose options conflict with the declaration')
+        parser.add_argument('--drop-extra', action='store_true',
+                            help='Drop live indexes that are not declared')
+        parser.add_argument('--collection', action='append', default=[],
+                            help='Limit to these collections (repeatable)')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        documents = [
+            document for document in registered_documents()
+            if not options['collection'] or document._get_collection_name() in options['collection']
+        ]
+        if not documents:
+            raise CommandError('No matching collections')
+
+        totals = {MISSING: 0, CONFLICT: 0, EXTRA: 0, 'created': 0, 'dropped': 0, 'modified': 0, 'unused': 0,
+                  'failed': 0}
+        for document in documents:
+            try:
+                states = diff_indexes(document)
+            except Exception as e:
+                raise CommandError(f'Could not read indexes of {document._get_collection_name()}: {e}')
+
+            collection = document._get_collection()
+            usage = index_usage(document)
+            self.stdout.write(f"📚 {collection.name}")
+
+            to_create, to_drop, to_modify, to_rebuild = [], [], [], []
+            for state in states:
+                ops = usage.get(state.name, (None, None))[0]
+                usage_note = '' if ops is None else f' ({ops} ops since restart)'
+                if state.state == OK:
+                    self.stdout.write(f"   ✅ {state.name}{usage_note}")
+                elif state.state == MISSING:
+                    self.stdout.write(f"   ➕ {state.name} missing")
+                    if self._buildable(collection, state):
+                        to_create.append(state.declared)
+                elif state.state == CONFLICT:
+                    self.stdout.write(f"   ⚠️  {state.name} conflicts: {state.detail}")
+                    ttl = ttl_change(state)
+                    if ttl is not None:
+                        to_modify.append((state.name, ttl))
+                    elif options['rebuild'] and self._buildable(collection, state):
+                        to_rebuild.append(state)
+                elif state.state == EXTRA:
+                    self.stdout.write(f"   ❔ {state.name} not declared{usage_note}")
+                    if options['drop_extra']:
+                        to_drop.append(state.name)
+                totals[state.state] = totals.get(state.state, 0) + 1
+
+                if ops == 0 and state.state in (OK, EXTRA):
+                    totals['unused'] += 1
+                    self.stdout.write(f"      💤 {state.name} unused since {usage[state.name][1]:%Y-%m-%d %H:%M}")
+
+            if dry_run:
+                continue
+            for name, ttl in to_modify:
+                try:
+                    set_ttl(collection, name, ttl)
+                except OperationFailure as e:
+                    # Servers before 5.1 can't turn a plain index into a TTL index
+                    self.stdout.write(f"   ⚠️  could not set the TTL of {name} in place ({e}); rerun with --rebuild")
+                    continue
+                totals['modified'] += 1
+                self.stdout.write(f"   🔧 set {name} expireAfterSeconds={ttl}")
+            for name in to_drop:
+                self._drop(collection, name, totals)
+            # One build at a time, so a failing one (say a unique index that
+            # duplicates written since _buildable's check break) costs only
+            # itself. Builds don't block reads/writes on MongoDB 4.2+
+            for state in to_rebuild:
+                self._drop(collection, state.name, totals)
+                if not self._create(collection, state.declared.model(), totals):
+                    self._create(collection, live_model(state.name, state.live), totals, restore=True)
+            for spec in to_create:
+                self._create(collection, spec.model(), totals)
+
+        summary = (
+            f"missing={totals[MISSING]} conflicts={totals[CONFLICT]} extra={totals[EXTRA]} "
+            f"unused={totals['unused']} created={totals['created']} dropped={totals['dropped']} "
+            f"modified={totals['modified']} failed={totals['failed']}"
+        )
+        if dry_run:
+            self.stdout.write(f"🔍 Dry run: {summary}")
+        elif totals['failed']:
+            raise CommandError(f"Some indexes could not be built: {summary}")
+        else:
+            self.stdout.write(f"✅ Indexes converged: {summary}")
+
+    def _drop(self, collection, name, totals):
+        try:
+            collection.drop_index(name)
+        except OperationFailure as e:
+            if e.code != 27:  # IndexNotFound: another instance dropped it first
+                raise
+        totals['dropped'] += 1
+        self.stdout.write(f"   🗑️  dropped {name}")
+
+    def _create(self, collection, model, totals, restore=False):
+        """Build one index; on failure say so and return False"""
+        name = model.document['name']
+        try:
+            collection.create_indexes([model])
+        except OperationFailure as e:
+            totals['failed'] += 1
+            action = 'restore the previous' if restore else 'build'
+            self.stdout.write(f"   ❌ could not {action} {name}: {e}")
+            return False
+        if restore:
+            self.stdout.write(f"   ↩️  restored the previous {name}")
+        else:
+            totals['created'] += 1
+            self.stdout.write(f"   🏗️  created {name}")
+        return True
+
+    def _buildable(self, collection, state):
+        """False (and say why) for a unique index that existing duplicates would fail"""
+        if not state.declared.options.get('unique'):
+            return True
+        duplicates = duplicate_keys(collection, state.declared)
+        if duplicates:
+            self.stdout.write(f"   ⛔ {state.name}: {duplicates} duplicate key values; remove them first")
+        return not duplicates
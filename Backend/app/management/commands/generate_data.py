@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import random
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+
+from app.datagen import (
+    ScalePlan, make_consultations, make_tests, plan_chunks, recompute_slot_counters, write_chunk,
+)
+from app.mongo_connection import use_database
+from app.mongo_models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-load a synthetic dataset (users, patients with family members, consultations, tests, '
+        'a year of time slots, skewed bookings) into a scratch MongoDB database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongo-uri', default=None, help='MongoDB to load (default: settings MONGO_URI)')
+        parser.add_argument('--database', default=None,
+                            help='Target database (default: <configured db>_synthetic)')
+        parser.add_argument('--users', type=int, default=100_000,
+                            help='Users; each has one household of 1-5 patients')
+        parser.add_argument('--bookings', type=int, default=1_000_000)
+        parser.add_argument('--consultations', type=int, default=50)
+        parser.add_argument('--days', type=int, default=365, help='Days of time slots')
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='First slot day, YYYY-MM-DD (default: half the range in the past)')
+        parser.add_argument('--hot-dates', type=int, default=12, help='Days with ~4x booking demand')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Writer processes')
+        parser.add_argument('--chunk-size', type=int, default=50_000, help='Documents per work item')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Documents per insert_many')
+        parser.add_argument('--password', default='synthetic-password',
+                            help='Password of every generated user (hashed once)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--drop', action='store_true', help='Drop the target database first')
+        parser.add_argument('--no-indexes', action='store_true', help="Don't build indexes after loading")
+
+    def handle(self, *args, **options):
+        uri = options['mongo_uri'] or settings.MONGODB_SETTINGS['host']
+        database = options['database'] or f"{settings.MONGODB_SETTINGS['db']}_synthetic"
+        if database == settings.MONGODB_SETTINGS['db']:
+            raise CommandError('Refusing to load synthetic data into the configured application database')
+
+        # One PBKDF2 hash shared by every user; hashing per user would dominate the run
+        hasher = User()
+        hasher.set_password(options['password'])
+        plan = ScalePlan(
+            users=options['users'], bookings=options['bookings'], days=options['days'],
+            start=options['start'], hot_dates=options['hot_dates'], seed=options['seed'],
+            password_hash=hasher.password_hash,
+        )
+
+        client = MongoClient(uri)
+        db = client[database]
+        if options['drop']:
+            client.drop_database(database)
+        elif db['bookings'].estimated_document_count() or db['users'].estimated_document_count():
+            raise CommandError(f'{database} already has data; pass --drop to replace it')
+
+        started = time.perf_counter()
+        rng = random.Random(plan.seed)
+        db['tests'].insert_many(make_tests())
+        db['consultations'].insert_many(make_consultations(rng, options['consultations']))
+
+        tasks = [
+            (uri, database, plan.as_dict(), kind, start, count, options['batch_size'])
+            for kind, start, count in plan_chunks(plan, options['chunk_size'])
+        ]
+        self.stdout.write(
+            f"🏭 Loading {database}: {plan.users} users, {plan.bookings} bookings, {plan.days} days of slots "
+            f"in {len(tasks)} chunks with {options['workers']} writer processes"
+        )
+
+        totals = {}
+        # spawn: workers open their own MongoClient; forking a process that
+        # already holds one is unsafe
+        with multiprocessing.get_context('spawn').Pool(options['workers']) as pool:
+            for done, counts in enumerate(pool.imap_unordered(write_chunk, tasks), start=1):
+                for collection, inserted in counts.items():
+                    totals[collection] = totals.get(collection, 0) + inserted
+                if done % max(1, len(tasks) // 20) == 0 or done == len(tasks):
+                    elapsed = time.perf_counter() - started
+                    written = sum(totals.values())
+                    self.stdout.write(f"   {done}/{len(tasks)} chunks, {written} docs, {written / elapsed:,.0f} docs/s")
+        load_seconds = time.perf_counter() - started
+
+        updated = recompute_slot_counters(db)
+        self.stdout.write(f"   slot counters updated on {updated} slots")
+
+        if not options['no_indexes']:
+            # Building indexes once after the load is much faster than
+            # maintaining them during it
+            use_database(database, host=uri)
+            call_command('ensure_indexes', stdout=self.stdout)
+
+        summary = ', '.join(f"{collection}={count}" for collection, count in sorted(totals.items()))
+        self.stdout.write(
+            f"✅ Loaded {summary} in {load_seconds:.1f}s (total {time.perf_counter() - started:.1f}s)"
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.slot_horizon import (
+    duplicate_slot_groups, ensure_horizon, horizon_days, merge_duplicate_slots, missing_days,
+)
+from app.slot_buckets import bucket_slots_enabled
+from app.slot_templates import virtual_slots_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep the next SLOT_HORIZON_DAYS days of time slots materialized so availability reads never write '
+        '(runs once with --once, e.g. at deploy or from cron; otherwise every --interval seconds)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Days ahead (default: SLOT_HORIZON_DAYS)')
+        parser.add_argument('--once', action='store_true', help='Extend the horizon once and exit')
+        parser.add_argument('--interval', type=float, default=3600.0, help='Seconds between runs')
+        parser.add_argument('--check', action='store_true', help='Only report missing days and duplicate slots')
+        parser.add_argument('--merge-duplicates', action='store_true',
+                            help='Fold duplicate slots into the oldest one first: a one-off migration, '
+                                 'needed before the unique index can be built')
+
+    def handle(self, *args, **options):
+        days = options['days'] or horizon_days()
+        if options['check']:
+            duplicates = sum(len(group) - 1 for group in duplicate_slot_groups())
+            if virtual_slots_enabled() or bucket_slots_enabled():
+                self.stdout.write(f"🔍 {duplicates} duplicate slots")
+                return
+            missing = missing_days(days)
+            self.stdout.write(
+                f"🔍 {len(missing)} open days without slots in the next {days} days"
+                + (f" (first: {missing[0]})" if missing else '') + f", {duplicates} duplicate slots"
+            )
+            return
+
+        if options['merge_duplicates']:
+            repointed, deleted = merge_duplicate_slots(list(duplicate_slot_groups()))
+            self.stdout.write(f"🧹 Deleted {deleted} duplicate slots, repointed {repointed} bookings")
+
+        if virtual_slots_enabled():
+            self.stdout.write("📅 SLOT_STORAGE=virtual: slots are stored on first booking, nothing to materialize")
+            return
+        if bucket_slots_enabled():
+            self.stdout.write("📅 SLOT_STORAGE=bucket: day buckets are created on first hold, nothing to materialize")
+            return
+        try:
+            while True:
+                created = ensure_horizon(days)
+                self.stdout.write(f"📅 Slot horizon: {days} days, {created} slots created")
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,52 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from app.mongo_models import Patient
+from app.patient_identity import duplicate_groups, merge_duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge Patient documents sharing (phone, first name, age) into the oldest one and '
+        'repoint Booking.patients, MemberPatient.owner and Cart.patient, then build the unique '
+        'identity index that keeps new duplicates out. Needed once, for patients stored before it existed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count duplicates')
+        parser.add_argument('--batch-size', type=int, default=500, help='Identity groups merged per bulk write')
+        parser.add_argument('--skip-backfill', action='store_true',
+                            help="Don't fill missing search keys first (they are what identities are matched on)")
+
+    def handle(self, *args, **options):
+        if not options['skip_backfill'] and not options['dry_run']:
+            call_command('backfill_patient_search', stdout=self.stdout)
+
+        batch, groups, duplicates = [], 0, 0
+        bookings_updated, deleted = 0, 0
+        for group in duplicate_groups():
+            groups += 1
+            duplicates += len(group) - 1
+            if options['dry_run']:
+                continue
+            batch.append(group)
+            if len(batch) >= options['batch_size']:
+                updated, removed = merge_duplicates(batch)
+                bookings_updated += updated
+                deleted += removed
+                self.stdout.write(f"   merged {groups} identities so far")
+                batch = []
+        if batch:
+            updated, removed = merge_duplicates(batch)
+            bookings_updated += updated
+            deleted += removed
+
+        if options['dry_run']:
+            self.stdout.write(f"🔍 Dry run: {duplicates} duplicate patients across {groups} identities")
+        else:
+            self.stdout.write(
+                f"✅ Merged {groups} identities: deleted {deleted} duplicate patients, "
+                f"repointed {bookings_updated} bookings"
+            )
+            call_command('ensure_indexes', '--rebuild', '--collection', Patient._get_collection_name(),
+                         stdout=self.stdout)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from app.mongo_models import SlotDay, TimeSlot
+from app.slot_buckets import buckets_from_slots, slots_from_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert time slots between TimeSlot documents and day buckets (SLOT_STORAGE=bucket), '
+        'repointing bookings and seat holds. Run it before switching SLOT_STORAGE, with bookings paused.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=['bucket', 'documents'], required=True,
+                            help='bucket: TimeSlot documents -> slot_days; documents: the reverse')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be migrated')
+        parser.add_argument('--batch-size', type=int, default=500, help='Days written per bulk write')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            if options['to'] == 'bucket':
+                days = len(TimeSlot._get_collection().distinct('date'))
+                slots = TimeSlot._get_collection().estimated_document_count()
+            else:
+                days = SlotDay._get_collection().count_documents({})
+                slots = next(SlotDay._get_collection().aggregate([
+                    {'$group': {'_id': None, 'slots': {'$sum': {'$size': '$slots'}}}},
+                ]), {'slots': 0})['slots']
+            self.stdout.write(f"🔍 Dry run: {slots} slots across {days} days to migrate to {options['to']}")
+            return
+
+        migrate = buckets_from_slots if options['to'] == 'bucket' else slots_from_buckets
+        days = slots = 0
+        for days, slots in migrate(options['batch_size']):
+            self.stdout.write(f"   migrated {days} days so far")
+        self.stdout.write(f"✅ Migrated {slots} slots across {days} days to {options['to']}")
@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app.payment_events import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Razorpay webhook events to bookings (run continuously, or --once from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Events claimed per batch')
+        parser.add_argument('--lease-seconds', type=int, default=60,
+                            help='How long a claimed batch is reserved before another consumer may retry it')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an event is marked failed')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        lease = timedelta(seconds=options['lease_seconds'])
+        totals = {'events': 0, 'bookings': 0, 'failed': 0}
+        try:
+            while True:
+                counts = process_batch(options['batch_size'], lease, options['max_attempts'])
+                for key, value in counts.items():
+                    totals[key] += value
+                if counts['events']:
+                    self.stdout.write(
+                        f"   {counts['events']} events, {counts['bookings']} bookings updated"
+                        + (f", {counts['failed']} failed" if counts['failed'] else '')
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            f"✅ Processed {totals['events']} payment events, updated {totals['bookings']} bookings"
+            + (f", {totals['failed']} failed" if totals['failed'] else '')
+        )
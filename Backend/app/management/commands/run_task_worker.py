@@ -0,0 +1,39 @@
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app.tasks import Worker, task_metrics
+
+
+class Command(BaseCommand):
+    help = 'Run background tasks queued with task.delay() (see app/tasks.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Tasks run concurrently by this process')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when nothing is due')
+        parser.add_argument('--lease-seconds', type=int, default=300,
+                            help='After this long a running task is assumed lost and retried')
+        parser.add_argument('--once', action='store_true', help='Run what is due now and exit')
+        parser.add_argument('--stats', action='store_true', help='Print per-task metrics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for row in task_metrics():
+                self.stdout.write(
+                    f"{row['task']:<45} {row['status']:<8} {row['count']:>8}  "
+                    f"avg={row['avg_ms'] or 0:.1f}ms max={row['max_ms'] or 0:.1f}ms attempts={row['avg_attempts']}"
+                )
+            return
+
+        worker = Worker(options['threads'], options['poll_interval'], timedelta(seconds=options['lease_seconds']))
+        # Finish the running tasks on SIGTERM (e.g. a deploy) instead of abandoning them
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        self.stdout.write(f"🛠️  Task worker {worker.name} with {options['threads']} threads")
+        worker.run(once=options['once'])
+
+        for name, row in sorted(worker.metrics.items()):
+            self.stdout.write(
+                f"   {name}: {row['runs']} runs, {row['failures']} failed, "
+                f"avg {row['total_ms'] / row['runs']:.1f}ms, max {row['max_ms']:.1f}ms"
+            )
@@ -0,0 +1,64 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine.errors import ValidationError
+
+from app.mongo_models import ScheduleTemplate, SlotRule
+from app.slot_templates import DEFAULT_SCHEDULE, active_schedule, forget_schedule
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+class Command(BaseCommand):
+    help = (
+        'Show or replace the schedule template that time slots are generated from. '
+        'A template file is JSON: {"name": ..., "rules": [{"weekdays": [0, 1, ...], "start": "08:00", '
+        '"end": "09:00", "capacity": 10}, ...], "holidays": ["YYYY-MM-DD", ...]}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--load', metavar='FILE', help='Store this template and make it the active one')
+        parser.add_argument('--holiday', action='append', default=[], type=date.fromisoformat,
+                            help='Add a holiday (YYYY-MM-DD) to the active template (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['load']:
+            self.load(options['load'])
+        if options['holiday']:
+            self.add_holidays(options['holiday'])
+        forget_schedule()
+        self.show()
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            template = ScheduleTemplate.objects(name=data['name']).first() or ScheduleTemplate(name=data['name'])
+            template.rules = [SlotRule(**rule) for rule in data['rules']]
+            template.holidays = [date.fromisoformat(day) for day in data.get('holidays', [])]
+            template.active = True
+            template.validate()
+        except (OSError, ValueError, KeyError, TypeError, ValidationError) as e:
+            raise CommandError(f'Invalid template {path}: {e}')
+        template.save()
+        ScheduleTemplate.objects(name__ne=template.name, active=True).update(set__active=False)
+        self.stdout.write(f"✅ Template {template.name} is active")
+
+    def add_holidays(self, days):
+        template = ScheduleTemplate.objects(active=True).order_by('-updated_at').first()
+        if template is None:
+            raise CommandError('No stored template; --load one first (the built-in default has no holidays)')
+        template.holidays = sorted(set(template.holidays) | set(days))
+        template.save()
+        self.stdout.write(f"✅ {len(days)} holiday(s) added to {template.name}")
+
+    def show(self):
+        schedule = active_schedule()
+        source = 'built-in default' if schedule is DEFAULT_SCHEDULE else 'stored template'
+        self.stdout.write(f"📋 Active schedule ({source}):")
+        for weekdays, start, end, capacity in schedule.rules:
+            days = ','.join(WEEKDAYS[d] for d in sorted(weekdays))
+            self.stdout.write(f"   {start}-{end}  capacity {capacity:>3}  {days}")
+        if schedule.holidays:
+            self.stdout.write(f"   holidays: {', '.join(str(day) for day in sorted(schedule.holidays))}")
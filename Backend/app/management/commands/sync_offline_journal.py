@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from pymongo.errors import PyMongoError
+
+from app.mongo_models import Booking
+from app.offline_journal import import_legacy, journal_path, pending_count, sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay bookings taken while MongoDB was unavailable (the offline journal) into MongoDB. '
+        'Runs continuously, replaying whenever the database is reachable, or --once from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Replay what is journaled now and exit')
+        parser.add_argument('--batch-size', type=int, default=500, help='Journal entries per bulk write')
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Seconds between checks for journaled bookings and a reachable database')
+        parser.add_argument('--import-legacy', metavar='PATH',
+                            help="Journal the booking_history of simple_working_api.py's bookings_data.json first")
+
+    def handle(self, *args, **options):
+        if options['import_legacy']:
+            count = import_legacy(options['import_legacy'])
+            self.stdout.write(f"📥 Journaled {count} legacy bookings from {options['import_legacy']}")
+
+        try:
+            while True:
+                if pending_count():
+                    self._sync(options['batch_size'])
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _sync(self, batch_size):
+        try:
+            Booking._get_collection().database.command('ping')
+            counts = sync(batch_size)
+        except PyMongoError as e:
+            self.stdout.write(f"⚠️ MongoDB unavailable ({e}); {pending_count()} bookings stay in {journal_path()}")
+            return
+        if counts is None:
+            self.stdout.write('⏭️ Another sync is replaying the journal')
+            return
+        self.stdout.write(
+            f"✅ Replayed {counts['entries']} journaled bookings: {counts['bookings']} written, "
+            f"{counts['already_synced']} already synced, {counts['patients']} patients, "
+            f"{counts['seated']} seated"
+            + (f", {counts['renamed']} booking ids renamed" if counts['renamed'] else '')
+            + (f", {counts['overbooked']} overbooked" if counts['overbooked'] else '')
+            + (f", {counts['slot_not_found']} with unknown slots" if counts['slot_not_found'] else '')
+            + (f", {counts['unsynced']} kept for the next run" if counts['unsynced'] else '')
+        )
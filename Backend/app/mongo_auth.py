@@ -8,6 +8,9 @@ import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 # JWT Settings
 JWT_SECRET = settings.SECRET_KEY
@@ -15,8 +18,8 @@ JWT_ALGORITHM = 'HS256'
 ACCESS_TOKEN_LIFETIME = timedelta(hours=1)
 REFRESH_TOKEN_LIFETIME = timedelta(days=7)
 
-def create_jwt_token(user, token_type='access'):
-    """Create JWT token for user"""
+def encode_jwt_token(user, token_type='access'):
+    """Sign a JWT for user; returns (token, expires_at)"""
     if token_type == 'access':
         expires_at = datetime.utcnow() + ACCESS_TOKEN_LIFETIME
     else:
@@ -32,7 +35,11 @@ def create_jwt_token(user, token_type='access'):
         'type': token_type
     }
     
-    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM), expires_at
+
+def create_jwt_token(user, token_type='access'):
+    """Create JWT token for user"""
+    token, expires_at = encode_jwt_token(user, token_type)
     
     # Store token in MongoDB
     jwt_token = JWTToken(
@@ -67,6 +74,14 @@ def verify_jwt_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def request_user(request):
+    """The active User behind the request's access_token cookie, or None"""
+    access_token = request.COOKIES.get('access_token')
+    return verify_jwt_token(access_token) if access_token else None
+
+def is_staff_user(user):
+    return bool(user and (user.is_staff or user.role in ('admin', 'staff')))
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
@@ -150,17 +165,13 @@ def register(request):
 def login(request):
     """Login user"""
     try:
-        print(f"Login attempt - Request data: {request.data}")  # Debug log
-        
         data = request.data
         username = data.get('username', '').strip()
         password = data.get('password', '')
         
-        print(f"Login attempt - Username: {username}, Password length: {len(password)}")  # Debug log
-        
         # Validation
         if not username or not password:
-            print("Login failed - Missing username or password")  # Debug log
+            logger.debug("Login failed - Missing username or password")
             return Response({'error': 'Username and password are required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
@@ -169,23 +180,18 @@ def login(request):
         if not user:
             user = User.objects(email=username).first()
         
-        print(f"User found: {user}")  # Debug log
-        
         if not user:
-            print("Login failed - User not found")  # Debug log
+            logger.info("Login failed - User not found")
             return Response({'error': 'Invalid credentials'}, 
                           status=status.HTTP_401_UNAUTHORIZED)
         
-        password_check = user.check_password(password)
-        print(f"Password check result: {password_check}")  # Debug log
-        
-        if not password_check:
-            print("Login failed - Invalid password")  # Debug log
+        if not user.check_password(password):
+            logger.info("Login failed - Invalid password for user %s", user.id)
             return Response({'error': 'Invalid credentials'}, 
                           status=status.HTTP_401_UNAUTHORIZED)
         
         if not user.is_active:
-            print("Login failed - Account disabled")  # Debug log
+            logger.info("Login failed - Account disabled for user %s", user.id)
             return Response({'error': 'Account is disabled'}, 
                           status=status.HTTP_401_UNAUTHORIZED)
         
@@ -193,8 +199,6 @@ def login(request):
         user.last_login = datetime.utcnow()
         user.save()
         
-        print("Login successful - Creating tokens")  # Debug log
-        
         # Create tokens
         access_token = create_jwt_token(user, 'access')
         refresh_token = create_jwt_token(user, 'refresh')
@@ -230,13 +234,11 @@ def login(request):
             samesite='Lax'
         )
         
-        print("Login successful - Response sent")  # Debug log
+        logger.debug("Login successful for user %s", user.id)
         return response
         
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug log
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login error")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
@@ -0,0 +1,88 @@
+"""
+Lazy MongoDB connection setup.
+
+``register_mongodb`` only records the connection settings with mongoengine;
+the ``MongoClient`` (and with it DNS/SRV resolution and server selection) is
+created on the first query. ``AppConfig.ready`` registers the connection, so
+``manage.py`` commands and test runs that never touch MongoDB don't wait on
+Atlas. ``warm_up`` optionally opens the pool ahead of the first request.
+"""
+
+import logging
+import threading
+import time
+
+import mongoengine
+from django.conf import settings
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, get_db
+
+from .instrumentation import mongo_command_listener
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODES = ('off', 'background', 'blocking')
+
+# Settings keys that are passed straight through to MongoClient
+_CLIENT_OPTIONS = (
+    'maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'serverSelectionTimeoutMS',
+    'socketTimeoutMS', 'connectTimeoutMS',
+)
+
+
+def register_mongodb(alias=DEFAULT_CONNECTION_NAME, db=None, host=None):
+    """
+    Register the MongoDB connection from settings.MONGODB_SETTINGS (no I/O).
+    ``db``/``host`` override the configured values, e.g. for a scratch database.
+    """
+    config = settings.MONGODB_SETTINGS
+    options = {key: config[key] for key in _CLIENT_OPTIONS if key in config}
+    mongoengine.register_connection(
+        alias=alias,
+        db=db or config['db'],
+        host=host or config['host'],
+        event_listeners=[mongo_command_listener],
+        **options,
+    )
+
+
+def use_database(db, host=None, alias=DEFAULT_CONNECTION_NAME):
+    """Point the (already registered) connection at another database/host"""
+    mongoengine.disconnect(alias)
+    register_mongodb(alias=alias, db=db, host=host)
+
+
+def ping(alias=DEFAULT_CONNECTION_NAME):
+    """Open the connection (if needed) and round-trip a ping; returns seconds"""
+    started = time.perf_counter()
+    get_db(alias).command('ping')
+    return time.perf_counter() - started
+
+
+def warm_up(mode=None, alias=DEFAULT_CONNECTION_NAME):
+    """
+    Open the connection pool before the first request.
+
+    ``mode`` defaults to settings.MONGODB_WARMUP: ``off`` leaves the connection
+    to the first query, ``background`` pings from a daemon thread so the
+    worker can start serving immediately, ``blocking`` pings inline.
+    """
+    mode = mode or getattr(settings, 'MONGODB_WARMUP', 'background')
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"MONGODB_WARMUP must be one of {', '.join(WARMUP_MODES)}, got {mode!r}")
+    if mode == 'off':
+        return None
+
+    def _ping():
+        try:
+            elapsed = ping(alias)
+            logger.info("MongoDB warm-up ping took %.1f ms", elapsed * 1000)
+        except Exception as e:
+            logger.warning("MongoDB warm-up failed (will retry on first query): %s", e)
+
+    if mode == 'blocking':
+        _ping()
+        return None
+
+    thread = threading.Thread(target=_ping, name='mongodb-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,168 @@
+"""
+Declared-vs-live MongoDB index reconciliation.
+
+The declarations are the ``meta['indexes']`` / ``unique=True`` entries of the
+documents in mongo_models.py (mongoengine compiles them into
+``_meta['index_specs']``). ``diff_indexes`` compares them with what the server
+has; the ``ensure_indexes`` management command acts on the result.
+"""
+
+from dataclasses import dataclass, field
+
+from mongoengine import Document
+from pymongo import IndexModel
+
+from . import mongo_models
+
+# Index options that change behaviour and must match to count as "the same"
+_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression', 'collation')
+
+MISSING = 'missing'
+CONFLICT = 'conflict'
+OK = 'ok'
+EXTRA = 'extra'
+
+
+@dataclass
+class IndexSpec:
+    name: str
+    keys: tuple
+    options: dict = field(default_factory=dict)
+
+    def model(self):
+        return IndexModel(list(self.keys), name=self.name, background=True, **self.options)
+
+
+@dataclass
+class IndexState:
+    collection: str
+    name: str
+    state: str
+    declared: IndexSpec = None
+    live: dict = None
+    detail: str = ''
+
+
+def registered_documents():
+    """Every concrete Document class defined in mongo_models"""
+    documents = [
+        obj for obj in vars(mongo_models).values()
+        if isinstance(obj, type) and issubclass(obj, Document) and obj is not Document
+        and not obj._meta.get('abstract')
+    ]
+    return sorted(documents, key=lambda document: document._get_collection_name())
+
+
+def default_index_name(keys):
+    return '_'.join(f'{name}_{direction}' for name, direction in keys)
+
+
+def declared_indexes(document):
+    """IndexSpec list for a document class"""
+    specs = []
+    for spec in document._meta.get('index_specs', []):
+        keys = tuple((name, direction) for name, direction in spec['fields'])
+        # ``is``: an expireAfterSeconds of 0 is a TTL, though 0 == False
+        options = {
+            key: spec[key] for key in _COMPARED_OPTIONS
+            if key in spec and spec[key] is not False and spec[key] is not None
+        }
+        specs.append(IndexSpec(name=spec.get('name') or default_index_name(keys), keys=keys, options=options))
+    return specs
+
+
+def _option_mismatch(declared, live):
+    mismatches = []
+    for key in _COMPARED_OPTIONS:
+        want = declared.options.get(key)
+        have = live.get(key)
+        if key == 'collation' and want and have:
+            # The server expands collations with defaults; compare what we declared
+            have = {k: have.get(k) for k in want}
+        if key in ('unique', 'sparse'):
+            want, have = bool(want), bool(have)
+        if want != have:
+            mismatches.append(f'{key}: declared {want!r}, live {have!r}')
+    return mismatches
+
+
+def diff_indexes(document):
+    """Compare a document's declared indexes with the live collection"""
+    collection = document._get_collection()
+    collection_name = collection.name
+    live = {name: info for name, info in collection.index_information().items() if name != '_id_'}
+    live_by_keys = {tuple((k, v) for k, v in info['key']): name for name, info in live.items()}
+
+    states, matched = [], set()
+    for spec in declared_indexes(document):
+        live_name = live_by_keys.get(spec.keys)
+        if live_name is None and spec.name in live:
+            live_name = spec.name
+            detail = f"name in use with keys {live[live_name]['key']}"
+            states.append(IndexState(collection_name, spec.name, CONFLICT, spec, live[live_name], detail))
+            matched.add(live_name)
+            continue
+        if live_name is None:
+            states.append(IndexState(collection_name, spec.name, MISSING, spec))
+            continue
+        matched.add(live_name)
+        mismatches = _option_mismatch(spec, live[live_name])
+        if mismatches:
+            states.append(IndexState(collection_name, live_name, CONFLICT, spec, live[live_name], '; '.join(mismatches)))
+        else:
+            states.append(IndexState(collection_name, live_name, OK, spec, live[live_name]))
+
+    for name, info in live.items():
+        if name not in matched:
+            states.append(IndexState(collection_name, name, EXTRA, live=info))
+    return states
+
+
+def live_model(name, info):
+    """IndexModel re-creating a live index from its ``index_information()`` entry"""
+    options = {key: value for key, value in info.items() if key not in ('key', 'v', 'ns', 'background')}
+    return IndexModel(list(info['key']), name=name, background=True, **options)
+
+
+def ttl_change(state):
+    """
+    The declared ``expireAfterSeconds`` if it is all that keeps a conflicting
+    live index from matching (``collMod`` can change it in place), else None
+    """
+    if state.state != CONFLICT or state.declared is None or state.live is None:
+        return None
+    if tuple((k, v) for k, v in state.live['key']) != state.declared.keys:
+        return None
+    seconds = state.declared.options.get('expireAfterSeconds')
+    others = [m for m in _option_mismatch(state.declared, state.live) if not m.startswith('expireAfterSeconds')]
+    return None if seconds is None or others else seconds
+
+
+def set_ttl(collection, name, seconds):
+    """Make an existing single-field index a TTL index (or change its TTL) without rebuilding it"""
+    collection.database.command('collMod', collection.name, index={'name': name, 'expireAfterSeconds': seconds})
+
+
+def duplicate_keys(collection, spec):
+    """How many key values more than one document shares: what a unique build of ``spec`` would reject"""
+    names = [name for name, _ in spec.keys]
+    match = dict(spec.options.get('partialFilterExpression') or {})
+    if spec.options.get('sparse'):
+        match.update({name: {'$exists': True} for name in names})
+    pipeline = [{'$match': match}] if match else []
+    pipeline += [
+        {'$group': {'_id': [f'${name}' for name in names], 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$count': 'duplicates'},
+    ]
+    rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+    return rows[0]['duplicates'] if rows else 0
+
+
+def index_usage(document):
+    """{index name: (ops, since)} from $indexStats; empty if not permitted"""
+    try:
+        stats = document._get_collection().aggregate([{'$indexStats': {}}])
+        return {row['name']: (row['accesses']['ops'], row['accesses']['since']) for row in stats}
+    except Exception:
+        return {}
@@ -1,8 +1,16 @@
 from mongoengine import Document, EmbeddedDocument, fields
 from datetime import datetime
+
 import hashlib
 import secrets
 
+from .normalization import normalize_email, normalize_name, normalize_phone
+
+# Index registry: every document declares its indexes in ``meta['indexes']``
+# (plus ``unique=True`` fields) with ``auto_create_index`` off, so requests
+# never build indexes. `python manage.py ensure_indexes` converges the live
+# indexes to these declarations on deploy.
+
 class User(Document):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
@@ -23,7 +31,9 @@ class User(Document):
     
     meta = {
         'collection': 'users',
-        'ordering': ['-date_joined']
+        'ordering': ['-date_joined'],
+        'indexes': ['-date_joined'],  # username/email: unique field indexes
+        'auto_create_index': False  # built by `manage.py ensure_indexes`
     }
     
     def set_password(self, raw_password):
@@ -59,7 +69,13 @@ class JWTToken(Document):
     
     meta = {
         'collection': 'jwt_tokens',
-        'indexes': ['token', 'user', 'expires_at']
+        'indexes': [
+            'token',
+            'user',
+            # TTL: expired tokens are useless, let MongoDB delete them
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+        'auto_create_index': False
     }
 
 
@@ -79,12 +95,37 @@ class Patient(Document):
     prescription_file = fields.StringField(null=True)  # Store file path/URL
     prescription_filename = fields.StringField(null=True)  # Original filename
     created_at = fields.DateTimeField(default=datetime.utcnow)
+    # Search keys, derived from the fields above in clean()
+    phone_normalized = fields.StringField(max_length=15, null=True)
+    email_lc = fields.StringField(null=True)
+    first_name_lc = fields.StringField(max_length=100, null=True)
     
     meta = {
         'collection': 'patients',
-        'ordering': ['first_name']
+        'ordering': ['first_name'],
+        'indexes': [
+            'first_name',  # default ordering
+            '-created_at',  # dashboard recent patients
+            'phone_number',  # non-unique (family members share numbers)
+            'email',
+            'user_id',
+            # /patients/search/: exact phone/email, anchored name prefix
+            ('phone_normalized', '-created_at'),
+            ('email_lc', '-created_at'),
+            ('first_name_lc', '-created_at'),
+            # identity resolution upsert (see patient_identity.py); unique, so
+            # concurrent upserts of one person can't both insert
+            {'fields': ['phone_normalized', 'first_name_lc', 'age'], 'unique': True,
+             'partialFilterExpression': {'phone_normalized': {'$type': 'string'}}},
+        ],
+        'auto_create_index': False
     }
     
+    def clean(self):
+        self.phone_normalized = normalize_phone(self.phone_number)
+        self.email_lc = normalize_email(self.email)
+        self.first_name_lc = normalize_name(self.first_name)
+    
     def __str__(self):
         return f"{self.first_name}"
 
@@ -105,7 +146,9 @@ class MemberPatient(Document):
     
     meta = {
         'collection': 'member_patients',
-        'ordering': ['first_name']
+        'ordering': ['first_name'],
+        'indexes': ['owner'],
+        'auto_create_index': False
     }
     
     def __str__(self):
@@ -121,7 +164,9 @@ class Consultation(Document):
     
     meta = {
         'collection': 'consultations',
-        'ordering': ['docname']
+        'ordering': ['docname'],
+        'indexes': ['docname'],
+        'auto_create_index': False
     }
     
     def __str__(self):
@@ -145,7 +190,8 @@ class ConsultTimeSlot(Document):
         'ordering': ['date', 'start_time'],
         'indexes': [
             ('doctor', 'date', 'start_time', 'end_time')  # Compound index for uniqueness
-        ]
+        ],
+        'auto_create_index': False
     }
     
     def save(self, *args, **kwargs):
@@ -172,7 +218,9 @@ class Test(Document):
     
     meta = {
         'collection': 'tests',
-        'ordering': ['name']
+        'ordering': ['name'],
+        'indexes': ['name'],
+        'auto_create_index': False
     }
     
     def __str__(self):
@@ -194,8 +242,11 @@ class TimeSlot(Document):
         'collection': 'timeslots',
         'ordering': ['date', 'start_time'],
         'indexes': [
-            ('date', 'start_time', 'end_time')  # Compound index for uniqueness
-        ]
+            # One slot per time: makes the horizon maintainer's upserts idempotent
+            {'fields': ['date', 'start_time', 'end_time'], 'unique': True},
+            ('date', 'available', 'start_time')  # availability reads: equality, equality, sort
+        ],
+        'auto_create_index': False
     }
     
     def save(self, *args, **kwargs):
@@ -208,18 +259,112 @@ class TimeSlot(Document):
             self.available = True
         super().save(*args, **kwargs)
     
+    @property
+    def virtual_id(self):
+        """API id of a slot generated from the schedule template and not stored yet"""
+        return f"v:{self.start_time:%Y-%m-%d}:{self.start_time:%H%M}-{self.end_time:%H%M}"
+    
+    @property
+    def api_id(self):
+        return str(self.id) if self.id else self.virtual_id
+    
     def __str__(self):
         status = "Unlimited" if self.unlimited_patients else f"{self.available_slots} available"
         return f"{self.date} {self.start_time.time()}-{self.end_time.time()} ({status})"
 
 
+class BucketSlot(EmbeddedDocument):
+    key = fields.StringField(required=True)  # HHMM-HHMM
+    start = fields.StringField(required=True)  # HH:MM
+    end = fields.StringField(required=True)
+    capacity = fields.IntField(min_value=1, required=True)
+    booked = fields.IntField(min_value=0, default=0)
+
+
+class SlotDay(Document):
+    """All slots of one day in one document (SLOT_STORAGE = 'bucket', see slot_buckets.py)"""
+    id = fields.StringField(primary_key=True)  # YYYY-MM-DD: a day is a point read, a month a range scan
+    date = fields.DateField(required=True)
+    slots = fields.ListField(fields.EmbeddedDocumentField(BucketSlot))
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+    
+    meta = {
+        'collection': 'slot_days',
+        'auto_create_index': False  # only _id
+    }
+    
+    def __str__(self):
+        return f"{self.id} ({len(self.slots)} slots)"
+
+
+class SlotRule(EmbeddedDocument):
+    weekdays = fields.ListField(fields.IntField(min_value=0, max_value=6))  # Monday is 0
+    start = fields.StringField(required=True, regex=r'^\d{2}:\d{2}$')  # HH:MM
+    end = fields.StringField(required=True, regex=r'^\d{2}:\d{2}$')
+    capacity = fields.IntField(min_value=1, default=10)
+
+
+class ScheduleTemplate(Document):
+    """Weekly slot layout the clinic's availability is generated from (see slot_templates.py)"""
+    name = fields.StringField(required=True, unique=True)
+    rules = fields.ListField(fields.EmbeddedDocumentField(SlotRule))
+    holidays = fields.ListField(fields.DateField())
+    active = fields.BooleanField(default=True)
+    updated_at = fields.DateTimeField(default=datetime.utcnow)
+    
+    meta = {
+        'collection': 'schedule_templates',
+        'indexes': [
+            ('active', '-updated_at'),
+        ],
+        'auto_create_index': False  # name: unique field index
+    }
+    
+    def save(self, *args, **kwargs):
+        self.updated_at = datetime.utcnow()
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.name} ({len(self.rules)} rules{', active' if self.active else ''})"
+
+
+class SlotHold(Document):
+    """A seat reserved on a TimeSlot while the patient pays (see slot_holds.py)"""
+    slot_id = fields.StringField(required=True)
+    seats = fields.IntField(min_value=1, default=1)
+    order_id = fields.StringField(null=True)  # Razorpay order paying for the hold
+    order_amount = fields.IntField(null=True)  # its amount in paise
+    owner = fields.StringField(null=True)  # 'user:<id>', or 'token:<sha256>' of an anonymous creator's hold token
+    client = fields.StringField(null=True)  # 'ip:<address>' of the request that created it
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+    expires_at = fields.DateTimeField(required=True)
+    
+    meta = {
+        'collection': 'slot_holds',
+        'indexes': [
+            ('slot_id', 'expires_at'),  # active holds per slot
+            # active holds per owner and per client (SLOT_HOLD_MAX_ACTIVE)
+            ('owner', 'expires_at'),
+            ('client', 'expires_at'),
+            'order_id',
+            # TTL: abandoned checkouts free their seats without a cleanup job
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+        'auto_create_index': False
+    }
+    
+    def __str__(self):
+        return f"Hold of {self.seats} on {self.slot_id} until {self.expires_at}"
+
+
 class Cart(Document):
     patient = fields.ReferenceField(Patient, required=True, unique=True)
     created_at = fields.DateTimeField(default=datetime.utcnow)
     updated_at = fields.DateTimeField(default=datetime.utcnow)
     
     meta = {
-        'collection': 'carts'
+        'collection': 'carts',
+        'auto_create_index': False  # patient: unique field index
     }
     
     def save(self, *args, **kwargs):
@@ -247,7 +392,8 @@ class CartItem(Document):
         'collection': 'cart_items',
         'indexes': [
             ('cart', 'consult', 'test')  # Compound index for uniqueness
-        ]
+        ],
+        'auto_create_index': False
     }
     
     def __str__(self):
@@ -269,15 +415,39 @@ class Booking(Document):
     total_amount = fields.DecimalField(min_value=0, precision=2, required=True)
     booking_date = fields.DateField(required=True)
     time_slot = fields.ReferenceField(TimeSlot, null=True)
+    time_slot_key = fields.StringField(null=True)  # v:... id of a slot stored in a SlotDay bucket
     preferred_time = fields.StringField(null=True)  # Fallback if no time slot selected
     status = fields.StringField(max_length=20, choices=STATUS_CHOICES, default='pending')
     notes = fields.StringField(null=True)
+    # Razorpay order paying for the booking; payment_status is set from
+    # webhooks (see payment_events.py)
+    payment_order_id = fields.StringField(null=True)
+    payment_id = fields.StringField(null=True)
+    payment_status = fields.StringField(null=True)
+    paid_at = fields.DateTimeField(null=True)
+    # Bookings taken while MongoDB was down and replayed from the offline
+    # journal (see offline_journal.py): the journal entry and its seat outcome
+    offline_entry_id = fields.StringField(null=True)
+    offline_status = fields.StringField(null=True)
     created_at = fields.DateTimeField(default=datetime.utcnow)
     updated_at = fields.DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'bookings',
-        'ordering': ['-created_at']
+        'ordering': ['-created_at'],
+        'indexes': [
+            '-created_at',  # default ordering
+            'booking_date',
+            ('status', '-created_at'),
+            'patients',
+            # One booking per payment order
+            {'fields': ['payment_order_id'], 'unique': True,
+             'partialFilterExpression': {'payment_order_id': {'$type': 'string'}}},
+            # Online bookings store a null entry id; only replayed ones must be unique
+            {'fields': ['offline_entry_id'], 'unique': True,
+             'partialFilterExpression': {'offline_entry_id': {'$type': 'string'}}},
+        ],
+        'auto_create_index': False
     }
     
     def save(self, *args, **kwargs):
@@ -285,4 +455,136 @@ class Booking(Document):
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"Booking {self.booking_id} - {self.status}"
\ No newline at end of file
+        return f"Booking {self.booking_id} - {self.status}"
+
+
+class PaymentEvent(Document):
+    """A Razorpay webhook delivery, queued until process_payment_events applies it"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    )
+
+    event_id = fields.StringField(required=True, unique=True)  # X-Razorpay-Event-Id: redeliveries collide
+    event = fields.StringField(required=True)  # e.g. payment.captured
+    order_id = fields.StringField(null=True)
+    payment_id = fields.StringField(null=True)
+    payload = fields.DictField()
+    status = fields.StringField(choices=STATUS_CHOICES, default='queued')
+    attempts = fields.IntField(default=0)
+    error = fields.StringField(null=True)
+    received_at = fields.DateTimeField(default=datetime.utcnow)
+    claimed_by = fields.StringField(null=True)  # claim token of the consumer processing it
+    locked_until = fields.DateTimeField(null=True)  # ... and when its lease runs out
+    processed_at = fields.DateTimeField(null=True)
+
+    meta = {
+        'collection': 'payment_events',
+        'indexes': [
+            ('status', 'received_at'),  # consumer: oldest queued first
+            'order_id',
+            # Keep applied events for a month, for redelivery dedup and audits
+            {'fields': ['processed_at'], 'expireAfterSeconds': 30 * 24 * 3600},
+        ],
+        'auto_create_index': False  # event_id: unique field index
+    }
+
+    def __str__(self):
+        return f"{self.event} {self.event_id} ({self.status})"
+
+
+class BackgroundTask(Document):
+    """A queued call of a registered task function (see tasks.py)"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    )
+
+    name = fields.StringField(required=True)
+    args = fields.ListField()
+    kwargs = fields.DictField()
+    status = fields.StringField(choices=STATUS_CHOICES, default='queued')
+    attempts = fields.IntField(default=0)
+    max_attempts = fields.IntField(default=5)
+    run_at = fields.DateTimeField(default=datetime.utcnow)  # not before; pushed back on retry
+    worker = fields.StringField(null=True)
+    locked_until = fields.DateTimeField(null=True)  # a crashed worker's task is retried after this
+    last_error = fields.StringField(null=True)
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+    started_at = fields.DateTimeField(null=True)
+    finished_at = fields.DateTimeField(null=True)
+    duration_ms = fields.FloatField(null=True)
+
+    meta = {
+        'collection': 'tasks',
+        'indexes': [
+            ('status', 'run_at'),  # workers: due queued tasks
+            ('name', 'status'),  # per-task metrics
+            # Finished tasks are kept a week for metrics and debugging
+            {'fields': ['finished_at'], 'expireAfterSeconds': 7 * 24 * 3600},
+        ],
+        'auto_create_index': False
+    }
+
+    def __str__(self):
+        return f"{self.name} ({self.status}, attempt {self.attempts})"
+
+
+class FlightLease(Document):
+    """A read being fetched by one worker for all of them (SINGLEFLIGHT_SHARED, see singleflight.py)"""
+    id = fields.StringField(primary_key=True)  # the query key
+    owner = fields.StringField(required=True)
+    done = fields.BooleanField(default=False)
+    result = fields.DynamicField(null=True)  # {'value': ...} once done
+    expires_at = fields.DateTimeField(required=True)  # lease while fetching, then how long the result is kept
+
+    meta = {
+        'collection': 'singleflight',
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+        'auto_create_index': False
+    }
+
+    def __str__(self):
+        return f"{self.id} ({'done' if self.done else 'in flight'} by {self.owner})"
+
+
+class CacheInvalidation(Document):
+    """A broadcast on the cache bus: every worker drops its cached copies of ``keys`` (see cache_bus.py)"""
+    keys = fields.ListField(fields.StringField())  # ['*'] drops everything
+    origin = fields.StringField(null=True)  # host:pid of the publisher
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'cache_bus',
+        # Capped: tailable in insertion order, old messages roll off on their own
+        'max_size': 16 * 1024 * 1024,
+        'max_documents': 50000,
+        'auto_create_index': False
+    }
+
+    def __str__(self):
+        return f"Invalidate {', '.join(self.keys)} ({self.origin})"
+
+
+class CacheEntry(Document):
+    """A value in the shared tier of the Django cache (see cache_backends.py)"""
+    id = fields.StringField(primary_key=True)  # the full cache key
+    value = fields.BinaryField()  # pickled envelope
+    expires_at = fields.DateTimeField(null=True)  # None: never
+
+    meta = {
+        'collection': 'cache_entries',
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+        'auto_create_index': False
+    }
+
+    def __str__(self):
+        return f"{self.id} (until {self.expires_at or 'forever'})"
@@ -1,10 +1,15 @@
 from django.urls import path
-from . import mongo_views, mongo_auth, health_views
+from . import mongo_views, mongo_auth, health_views, async_views
 
 urlpatterns = [
     # Health check endpoints
     path('health/', health_views.health_check, name='health-check'),
     path('warm-up/', health_views.warm_up, name='warm-up'),
+    path('metrics/slow-endpoints/', health_views.slow_endpoints, name='slow-endpoints'),
+    path('metrics/tasks/', health_views.task_metrics, name='task-metrics'),
+    path('metrics/slot-subscribers/', health_views.slot_subscribers, name='slot-subscribers'),
+    path('metrics/cache/', health_views.cache_metrics, name='cache-metrics'),
+    path('metrics/database/', health_views.database_metrics, name='database-metrics'),
     
     # Authentication endpoints (MongoDB)
     path('auth/register/', mongo_auth.register, name='mongo-register'),
@@ -14,6 +19,7 @@ urlpatterns = [
     
     # Patient endpoints
     path('patients/', mongo_views.patient_list_create, name='patient-list-create'),
+    path('patients/search/', mongo_views.patient_search, name='patient-search'),  # before <patient_id>
     path('patients/<str:patient_id>/', mongo_views.patient_detail, name='patient-detail'),
     
     # Consultation endpoints
@@ -31,10 +37,20 @@ urlpatterns = [
     # Time Slots (Similar to Patient API)
     path('time-slots/', mongo_views.time_slots_list_create, name='time-slots-list-create'),
     path('simple-time-slots/', mongo_views.simple_time_slots, name='simple-time-slots'),
+    path('time-slots/<str:slot_id>/hold/', mongo_views.slot_hold_create, name='slot-hold-create'),
+    path('holds/<str:hold_id>/', mongo_views.slot_hold_detail, name='slot-hold-detail'),
     
     # Test API endpoint
     path('test/', mongo_views.test_api, name='test-api'),
     
     # Create default time slots (utility endpoint)
     path('create-time-slots/', mongo_views.create_time_slots_for_days, name='create-time-slots'),
+    
+    # Async read endpoints (serve with APP_SERVER=asgi)
+    path('async/time-slots/', async_views.time_slots, name='async-time-slots'),
+    path('async/time-slots/stream/', async_views.time_slot_stream, name='async-time-slot-stream'),
+    path('async/tests/', async_views.test_catalog, name='async-test-catalog'),
+    path('async/consultations/', async_views.consultation_catalog, name='async-consultation-catalog'),
+    path('async/auth/verify/', async_views.verify_token, name='async-verify'),
+    path('async/create-order/', async_views.create_order, name='async-create-order'),
 ]
\ No newline at end of file
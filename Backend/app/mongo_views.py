@@ -1,17 +1,45 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
+from rest_framework.throttling import UserRateThrottle
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from .mongo_models import Patient, Consultation, Test, Cart, CartItem, TimeSlot, Booking
+from .booking_tasks import save_prescription
+from .mongo_auth import is_staff_user, request_user
+from .patient_identity import resolve_patient
+from .payment_events import sync_booking_payment
+from .slot_horizon import ensure_days
+from .slot_templates import available_slots, parse_virtual_slot_id
+from .slot_holds import (
+    HoldError, HoldExpired, apply_holds, confirm_hold, get_active_hold, held_seats, hold_seats,
+    new_hold_token, release_hold, request_client, request_hold_owners, user_owner,
+)
+from .cache_bus import LocalCache, invalidate
+from .singleflight import coalesce
+from .degraded import (
+    DatabaseUnavailable, breaker, database_down, guarded_fetch, handles_outage, mark_stale, read_or_stale,
+    serves_stale, unavailable_response,
+)
+from .offline_journal import record_booking
+from .patient_search import DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT, search_patients
 import json
-import base64
+import logging
+import secrets
 from bson import ObjectId
+from mongoengine.errors import NotUniqueError
+from pymongo.errors import ConnectionFailure
 from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
 import os
 
+logger = logging.getLogger(__name__)
+
+# Test and consultation catalogs, kept in every worker until edited (see cache_bus.py)
+catalog_cache = LocalCache(ttl=300)
+DASHBOARD_STATS_SECONDS = 30
+
 # Custom JSON encoder for MongoDB ObjectId
 class MongoJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -58,7 +86,7 @@ def serialize_test(test):
 def serialize_time_slot(time_slot):
     """Convert TimeSlot document to dict"""
     return {
-        'id': str(time_slot.id),
+        'id': time_slot.api_id,
         'date': time_slot.date.isoformat(),
         'start_time': time_slot.start_time.strftime('%H:%M'),
         'end_time': time_slot.end_time.strftime('%H:%M'),
@@ -70,6 +98,38 @@ def serialize_time_slot(time_slot):
         'created_at': time_slot.created_at.isoformat() if time_slot.created_at else None
     }
 
+def time_slot_key(target_date):
+    return f'time-slots:{target_date.isoformat()}'
+
+def time_slot_data(target_date):
+    """Bookable slots of a day, serialized net of held seats; concurrent identical reads share one fetch"""
+    def fetch():
+        # Read-only: template slots overlaid with stored ones (see slot_templates.py)
+        slots = available_slots(target_date)
+        held = held_seats([slot.api_id for slot in slots])
+        return [serialize_time_slot(apply_holds(slot, held.get(slot.api_id))) for slot in slots]
+    key = time_slot_key(target_date)
+    # Outside the coalesced call, so an open circuit doesn't wait on a shared-flight lease either
+    return guarded_fetch(key, lambda: coalesce(key, fetch))
+
+def time_slot_data_or_stale(target_date):
+    """``(slots, stale_since)``: the day's last good slots while MongoDB is unavailable (see degraded.py)"""
+    return read_or_stale(time_slot_key(target_date), lambda: time_slot_data(target_date))
+
+def catalog_data(key, query):
+    """``(catalog, stale_since)`` from the worker's catalog cache, or its last good copy while MongoDB is unavailable"""
+    return read_or_stale(key, lambda: catalog_cache.get_or_fetch(key, lambda: guarded_fetch(key, query)))
+
+def serialize_slot_hold(hold):
+    """Convert SlotHold document to dict"""
+    return {
+        'hold_id': str(hold.id),
+        'slot_id': hold.slot_id,
+        'seats': hold.seats,
+        'order_id': hold.order_id,
+        'expires_at': hold.expires_at.isoformat(),
+    }
+
 # Patient API Views
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
@@ -85,14 +145,14 @@ def patient_list_create(request):
     elif request.method == 'POST':
         try:
             data = request.data
-            patient = Patient(
+            # The same person (phone, name, age) gets their existing document
+            patient = resolve_patient(
                 first_name=data.get('first_name'),
                 age=data.get('age'),
                 gender=data.get('gender'),
                 phone_number=data.get('phone_number'),
                 email=data.get('email')
             )
-            patient.save()
             return Response(serialize_patient(patient), status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -118,6 +178,9 @@ def patient_detail(request, patient_id):
             patient.email = data.get('email', patient.email)
             patient.save()
             return Response(serialize_patient(patient), status=status.HTTP_200_OK)
+        except NotUniqueError:
+            return Response({'error': 'Another patient has this phone number, name and age'},
+                            status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -128,15 +191,47 @@ def patient_detail(request, patient_id):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def patient_search(request):
+    """GET /patients/search/?q=<phone|email|name prefix>&limit=N (staff only)"""
+    user = request_user(request)
+    if user is None:
+        return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    if not is_staff_user(user):
+        return Response({'error': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
+    
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SEARCH_LIMIT))
+        match, patients, truncated = search_patients(query, limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception("Patient search failed")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'query': query,
+        'match': match,
+        'results': [serialize_patient(p) for p in patients],
+        'count': len(patients),
+        'truncated': truncated,
+    }, status=status.HTTP_200_OK)
+
 # Consultation API Views
+@serves_stale
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
 def consultation_list_create(request):
     if request.method == 'GET':
         try:
-            consultations = Consultation.objects.all()
-            consultation_data = [serialize_consultation(c) for c in consultations]
-            return Response(consultation_data, status=status.HTTP_200_OK)
+            consultation_data, stale_since = catalog_data(
+                'consultations', lambda: [serialize_consultation(c) for c in Consultation.objects.all()]
+            )
+            return mark_stale(Response(consultation_data, status=status.HTTP_200_OK), stale_since)
+        except DatabaseUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -149,19 +244,22 @@ def consultation_list_create(request):
                 price=data.get('price')
             )
             consultation.save()
+            invalidate('consultations')
             return Response(serialize_consultation(consultation), status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 # Test API Views
+@serves_stale
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
 def test_list_create(request):
     if request.method == 'GET':
         try:
-            tests = Test.objects.all()
-            test_data = [serialize_test(t) for t in tests]
-            return Response(test_data, status=status.HTTP_200_OK)
+            test_data, stale_since = catalog_data('tests', lambda: [serialize_test(t) for t in Test.objects.all()])
+            return mark_stale(Response(test_data, status=status.HTTP_200_OK), stale_since)
+        except DatabaseUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -174,6 +272,7 @@ def test_list_create(request):
                 price=data.get('price')
             )
             test.save()
+            invalidate('tests')
             return Response(serialize_test(test), status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -183,33 +282,82 @@ def test_list_create(request):
 @permission_classes([AllowAny])
 def dashboard_stats(request):
     try:
-        stats = {
+        # Shared by all workers, refreshed by one request shortly before it expires
+        stats = cache.get_or_set('dashboard-stats', lambda: {
             'total_patients': Patient.objects.count(),
             'total_consultations': Consultation.objects.count(),
             'total_tests': Test.objects.count(),
             'recent_patients': [serialize_patient(p) for p in Patient.objects.order_by('-created_at')[:5]]
-        }
+        }, DASHBOARD_STATS_SECONDS)
         return Response(stats, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def new_booking_id():
+    """BK, the UTC time to the second and a random suffix: bookings in the same second don't collide"""
+    return f"BK{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{secrets.token_hex(3).upper()}"
+
+def offline_booking_response(data, booking_date):
+    """202 for a booking journaled while MongoDB is unavailable (replayed by sync_offline_journal)"""
+    booking_id = new_booking_id()
+    record_booking(data, booking_id, booking_date)
+    return Response({
+        'success': True,
+        'queued': True,
+        'message': 'Booking received; it will be confirmed as soon as our database is reachable again',
+        'booking_id': booking_id,
+        'status': 'queued',
+        'total_amount': data.get('total_price', 0),
+        'booking_date': booking_date.isoformat(),
+        'time_slot_info': {'id': data.get('time_slot_id'), 'time': data.get('preferred_time')},
+    }, status=status.HTTP_202_ACCEPTED)
+
+def payment_order_error(data, payment_order_id, hold, total_price):
+    """An error response if the booking can't be paid by its hold's order, else None"""
+    from .views import ORDER_AMOUNT
+
+    claimed = data.get('razorpay_order_id')
+    if claimed and claimed != payment_order_id:
+        return Response({'error': 'Payment order does not belong to this seat hold'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not payment_order_id:
+        return None
+    try:
+        amount = Decimal(str(total_price)) * 100
+    except InvalidOperation:
+        return Response({'error': 'Invalid total_price'}, status=status.HTTP_400_BAD_REQUEST)
+    if amount != (hold.order_amount or ORDER_AMOUNT):
+        return Response({'error': 'Booking total does not match the payment order'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    paid_for = Booking.objects(payment_order_id=payment_order_id).only('booking_id').first()
+    if paid_for:
+        return Response({'error': f'Payment order already used by booking {paid_for.booking_id}'},
+                        status=status.HTTP_409_CONFLICT)
+    return None
+
 # Test Booking with Patient Data
+@handles_outage
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def book_test_with_patients(request):
+    hold, own_hold, time_slot, booking = None, False, None, None
+    # Set before the first write: past it, a lost connection may have left
+    # some of this booking in MongoDB, and replaying a journal entry would repeat it
+    writes_started = False
     try:
-        print(f"Received booking data: {request.data}")  # Debug log
+        logger.debug("Received booking data: %s", request.data)
         
         data = request.data
         cart_items = data.get('cart_items', [])
         total_price = data.get('total_price', 0)
         booking_date = data.get('booking_date')  # Expected format: YYYY-MM-DD
         time_slot_id = data.get('time_slot_id')
+        hold_id = data.get('hold_id')  # seat held at checkout (POST time-slots/<id>/hold/)
+        payment_order_id = None  # the hold's order (create-order), confirmed by the webhook
         preferred_time = data.get('preferred_time')
         
-        print(f"Cart items: {cart_items}")  # Debug log
-        print(f"Total price: {total_price}")  # Debug log
-        print(f"Booking date: {booking_date}, Time slot: {time_slot_id}")  # Debug log
+        logger.debug("Booking %d cart items, total %s, date %s, time slot %s",
+                     len(cart_items), total_price, booking_date, time_slot_id)
         
         # Parse booking date
         if booking_date:
@@ -220,24 +368,39 @@ def book_test_with_patients(request):
         else:
             booking_date_obj = date.today()
         
-        # Get time slot if provided
-        time_slot = None
-        if time_slot_id:
+        if database_down(request):
+            return offline_booking_response(data, booking_date_obj)
+        
+        # Reserve the seat before writing anything; it is confirmed once the
+        # booking is assembled and released if that fails
+        if hold_id:
+            hold = get_active_hold(hold_id, request_hold_owners(request, data.get('hold_token')))
+            if hold is None:
+                return Response({'error': 'Seat hold not found or expired'}, status=HoldExpired.status)
+            payment_order_id = hold.order_id
+        elif time_slot_id:
+            writes_started = True
             try:
-                time_slot = TimeSlot.objects.get(id=time_slot_id)
-                # Update booked slots
-                time_slot.booked_slots += 1
-                time_slot.save()
-            except TimeSlot.DoesNotExist:
-                pass
+                hold = hold_seats(time_slot_id, ttl=timedelta(minutes=1))
+                own_hold = True
+            except HoldError as e:
+                return Response({'error': str(e)}, status=e.status)
+        
+        error = payment_order_error(data, payment_order_id, hold, total_price)
+        if error:
+            if own_hold:
+                release_hold(hold.id)
+            return error
         
         # Store all patients from the booking
+        writes_started = True
         booking_patients = []
+        booking_patient_docs = {}  # id -> Patient, one entry per person
         booking_info = {
-            'booking_id': f"BK{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+            'booking_id': new_booking_id(),
             'total_amount': total_price,
             'booking_date': booking_date_obj.isoformat(),
-            'time_slot': str(time_slot.id) if time_slot else None,
+            'time_slot': hold.slot_id if hold else None,
             'preferred_time': preferred_time,
             'tests_booked': []
         }
@@ -246,7 +409,7 @@ def book_test_with_patients(request):
             test_name = cart_item.get('name', '')
             patients = cart_item.get('patients', [])
             
-            print(f"Processing test: {test_name}, patients: {patients}")  # Debug log
+            logger.debug("Processing test %s with patients %s", test_name, patients)
             
             test_info = {
                 'test_name': test_name,
@@ -257,58 +420,38 @@ def book_test_with_patients(request):
             
             # If no patients provided, this might be a "Self" booking
             if not patients:
-                print(f"No patients provided for {test_name} - treating as self booking")  # Debug log
+                logger.debug("No patients provided for %s - treating as self booking", test_name)
                 test_info['patients_count'] = 1
                 test_info['patient_details'].append({'type': 'self', 'note': 'Booked for self'})
             else:
                 for patient_data in patients:
                     # Handle "Self" patients
                     if patient_data.get('name', '').startswith('Self'):
-                        print(f"Self booking for: {patient_data}")  # Debug log
+                        logger.debug("Self booking for: %s", patient_data)
                         test_info['patient_details'].append({'type': 'self', 'note': 'Booked for self'})
                         continue
                     
                     # Skip empty patient data
                     if not patient_data.get('name') or not patient_data.get('age'):
-                        print(f"Skipping incomplete patient: {patient_data}")  # Debug log
+                        logger.debug("Skipping incomplete patient: %s", patient_data)
                         continue
                     
-                    # Handle prescription file if provided
-                    prescription_file_path = None
-                    prescription_filename = None
-                    
-                    if patient_data.get('prescription_file'):
-                        try:
-                            # Decode base64 file
-                            file_data = patient_data['prescription_file']
-                            if ',' in file_data:
-                                header, file_data = file_data.split(',', 1)
-                            
-                            file_content = base64.b64decode(file_data)
-                            filename = patient_data.get('prescription_filename', f'prescription_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.pdf')
-                            
-                            # Save file
-                            file_path = f'prescriptions/{filename}'
-                            saved_path = default_storage.save(file_path, ContentFile(file_content))
-                            prescription_file_path = saved_path
-                            prescription_filename = filename
-                            
-                            print(f"Saved prescription file: {saved_path}")  # Debug log
-                        except Exception as e:
-                            print(f"Error saving prescription file: {e}")  # Debug log
-                        
-                    # Create patient in MongoDB
-                    patient = Patient(
+                    # Reuse the patient's existing MongoDB document if we've seen them before
+                    patient = resolve_patient(
                         first_name=patient_data.get('name', ''),
                         age=int(patient_data.get('age', 0)) if patient_data.get('age') else 0,
                         gender=patient_data.get('gender', '').upper()[:1] if patient_data.get('gender') else 'O',
                         phone_number=patient_data.get('phone'),
-                        email=patient_data.get('email'),
-                        prescription_file=prescription_file_path,
-                        prescription_filename=prescription_filename
+                        email=patient_data.get('email')
                     )
-                    patient.save()
-                    print(f"Saved patient: {patient.first_name} with ID: {patient.id}")  # Debug log
+                    booking_patient_docs.setdefault(patient.id, patient)
+                    logger.debug("Resolved patient with ID: %s", patient.id)
+                    
+                    # Decoding and storing the prescription happens on the task worker
+                    has_prescription = bool(patient_data.get('prescription_file'))
+                    if has_prescription:
+                        filename = patient_data.get('prescription_filename', f'prescription_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.pdf')
+                        save_prescription.delay(str(patient.id), patient_data['prescription_file'], filename)
                     
                     patient_info = {
                         'type': 'other',
@@ -316,7 +459,7 @@ def book_test_with_patients(request):
                         'patient_name': patient.first_name,
                         'age': patient.age,
                         'gender': patient.gender,
-                        'has_prescription': bool(prescription_file_path)
+                        'has_prescription': has_prescription
                     }
                     
                     booking_patients.append(patient_info)
@@ -324,48 +467,76 @@ def book_test_with_patients(request):
             
             booking_info['tests_booked'].append(test_info)
         
-        # Create booking record
+        # Saved (pending) before the seat is booked: if the save fails the
+        # hold is untouched, and if booking the seat fails the booking goes
         booking = Booking(
             booking_id=booking_info['booking_id'],
-            patients=[Patient.objects.get(id=p['patient_id']) for p in booking_patients if p['type'] == 'other'],
+            patients=list(booking_patient_docs.values()),
             tests=[item['test_name'] for item in booking_info['tests_booked']],
             total_amount=total_price,
             booking_date=booking_date_obj,
-            time_slot=time_slot,
+            # Bucket slots have no document to reference, only their v:... id
+            time_slot=ObjectId(hold.slot_id) if hold and not parse_virtual_slot_id(hold.slot_id) else None,
+            time_slot_key=hold.slot_id if hold and parse_virtual_slot_id(hold.slot_id) else None,
             preferred_time=preferred_time,
-            status='confirmed'
+            status='pending' if payment_order_id or hold else 'confirmed',
+            payment_order_id=payment_order_id
         )
         booking.save()
+        if hold:
+            try:
+                time_slot = confirm_hold(hold.id)
+            except HoldError as e:
+                booking.delete()
+                return Response({'error': str(e)}, status=e.status)
+            if not payment_order_id:
+                booking.status = 'confirmed'
+                booking.save()
+        if payment_order_id:
+            # The payment webhook may have been processed before the booking existed
+            sync_booking_payment(payment_order_id)
+            booking.reload('status', 'payment_status')
         
-        print(f"Total patients saved to MongoDB: {len(booking_patients)}")  # Debug log
-        print(f"Booking summary: {booking_info}")  # Debug log
-        
-        print(f"Total patients saved: {len(booking_patients)}")  # Debug log
+        logger.info("Booking %s saved with %d patients", booking_info['booking_id'], len(booking_patients))
+        logger.debug("Booking summary: %s", booking_info)
         
         # Return booking confirmation
         return Response({
             'success': True,
             'message': 'Test booking successful!',
             'booking_id': booking_info['booking_id'],
+            'status': booking.status,
             'total_patients_saved': len(booking_patients),
             'total_amount': total_price,
             'booking_date': booking_date_obj.isoformat(),
             'time_slot_info': {
-                'id': str(time_slot.id) if time_slot else None,
+                'id': time_slot.api_id if time_slot else None,
                 'time': f"{time_slot.start_time.strftime('%H:%M')} - {time_slot.end_time.strftime('%H:%M')}" if time_slot else preferred_time
             },
             'booking_details': booking_info,
             'patients_saved': booking_patients
         }, status=status.HTTP_201_CREATED)
         
+    except ConnectionFailure:
+        logger.exception("Booking lost its MongoDB connection")
+        breaker.record_failure()
+        if not writes_started:
+            # Nothing written yet, so replaying the journal can't book this one twice
+            return offline_booking_response(request.data, booking_date_obj)
+        return unavailable_response()
     except Exception as e:
-        print(f"Booking error: {str(e)}")  # Debug log
-        import traceback
-        traceback.print_exc()  # Print full error trace
+        logger.exception("Booking error")
+        if hold and time_slot is None:
+            # The seat wasn't booked: neither a booking nor our own hold may stay
+            if booking is not None and booking.pk:
+                booking.delete()
+            if own_hold:
+                release_hold(hold.id)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 # Time Slots API (Pure MongoDB - Similar to Patient API)
+@serves_stale
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
 def time_slots_list_create(request):
@@ -382,37 +553,20 @@ def time_slots_list_create(request):
             else:
                 target_date = date.today()
             
-            print(f"Fetching time slots from MongoDB for date: {target_date}")
-            
-            # Get time slots from MongoDB (like getting patients)
-            slots = TimeSlot.objects.filter(date=target_date, available=True).order_by('start_time')
-            print(f"Found {slots.count()} slots in MongoDB for {target_date}")
-            
-            # If no slots exist, create default ones in MongoDB
-            if not slots.exists():
-                print(f"No slots found in MongoDB, creating default slots for {target_date}")
-                created_count = create_default_time_slots_in_mongodb(target_date)
-                print(f"Created {created_count} slots in MongoDB")
-                # Fetch the newly created slots
-                slots = TimeSlot.objects.filter(date=target_date, available=True).order_by('start_time')
-            
-            # Serialize the slots (like serializing patients)
-            slot_data = [serialize_time_slot(slot) for slot in slots]
+            slot_data, stale_since = time_slot_data_or_stale(target_date)
             
-            print(f"Returning {len(slot_data)} time slots from MongoDB")
-            
-            return Response({
+            return mark_stale(Response({
                 'success': True,
                 'date': target_date.isoformat(),
                 'slots': slot_data,
-                'source': 'mongodb',
+                'source': 'stale_snapshot' if stale_since else 'mongodb',
                 'total_slots': len(slot_data)
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK), stale_since)
             
+        except DatabaseUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
-            print(f"MongoDB time slots error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("MongoDB time slots error")
             return Response({
                 'success': False,
                 'error': f'MongoDB error: {str(e)}',
@@ -442,7 +596,8 @@ def time_slots_list_create(request):
             )
             time_slot.save()
             
-            print(f"Created time slot in MongoDB: {slot_date} {start_time.strftime('%H:%M')}-{end_time.strftime('%H:%M')}")
+            logger.info("Created time slot in MongoDB: %s %s-%s", slot_date,
+                        start_time.strftime('%H:%M'), end_time.strftime('%H:%M'))
             
             return Response({
                 'success': True,
@@ -451,7 +606,7 @@ def time_slots_list_create(request):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print(f"Error creating time slot in MongoDB: {str(e)}")
+            logger.warning("Error creating time slot in MongoDB: %s", e)
             return Response({
                 'success': False,
                 'error': f'MongoDB creation error: {str(e)}'
@@ -459,60 +614,11 @@ def time_slots_list_create(request):
 
 
 def create_default_time_slots_in_mongodb(target_date):
-    """Create default time slots in MongoDB (like creating patients)"""
+    """Create the default slots of one day; idempotent (see slot_horizon.py)"""
     try:
-        # Skip Sundays
-        if target_date.weekday() == 6:
-            print(f"Skipping Sunday: {target_date}")
-            return 0
-        
-        # Define time slots
-        time_slots = [
-            ('08:00', '09:00'),
-            ('09:00', '10:00'),
-            ('10:00', '11:00'),
-            ('11:00', '12:00'),
-            ('14:00', '15:00'),
-            ('15:00', '16:00'),
-            ('16:00', '17:00'),
-            ('17:00', '18:00'),
-        ]
-        
-        created_count = 0
-        for start_time_str, end_time_str in time_slots:
-            # Create datetime objects
-            start_datetime = datetime.combine(target_date, datetime.strptime(start_time_str, '%H:%M').time())
-            end_datetime = datetime.combine(target_date, datetime.strptime(end_time_str, '%H:%M').time())
-            
-            # Check if slot already exists in MongoDB
-            existing_slot = TimeSlot.objects.filter(
-                date=target_date,
-                start_time=start_datetime,
-                end_time=end_datetime
-            ).first()
-            
-            if not existing_slot:
-                # Create and save to MongoDB (like creating a patient)
-                time_slot = TimeSlot(
-                    date=target_date,
-                    start_time=start_datetime,
-                    end_time=end_datetime,
-                    max_patients=10,
-                    unlimited_patients=False,
-                    available_slots=10,
-                    booked_slots=0,
-                    available=True
-                )
-                time_slot.save()
-                created_count += 1
-                print(f"Created in MongoDB: {target_date} {start_time_str}-{end_time_str}")
-        
-        return created_count
-    
-    except Exception as e:
-        print(f"Error creating time slots in MongoDB: {e}")
-        import traceback
-        traceback.print_exc()
+        return ensure_days([target_date])
+    except Exception:
+        logger.exception("Error creating time slots in MongoDB")
         return 0
 
 
@@ -581,8 +687,6 @@ def test_api(request):
 def create_time_slots_for_days(request):
     """Create time slots for multiple days in MongoDB (like bulk patient creation)"""
     try:
-        print("Creating time slots in MongoDB for multiple days...")
-        
         days = request.data.get('days', 30)  # Default 30 days
         start_date = date.today()
         created_count = 0
@@ -610,16 +714,60 @@ def create_time_slots_for_days(request):
         }, status=status.HTTP_201_CREATED)
         
     except Exception as e:
-        print(f"Error in bulk time slot creation (MongoDB): {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in bulk time slot creation (MongoDB)")
         return Response({
             'success': False,
             'error': f'MongoDB bulk creation error: {str(e)}'
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Seat holds (see slot_holds.py)
+class SlotHoldThrottle(UserRateThrottle):
+    """SLOT_HOLD_THROTTLE_RATE hold requests per user, or per IP when signed out"""
+    scope = 'slot_holds'
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@throttle_classes([SlotHoldThrottle])
+def slot_hold_create(request, slot_id):
+    """
+    Hold seats on a slot while the patient pays; confirmed by book-test with hold_id.
+    The hold belongs to the signed-in user, or else to whoever presents the
+    returned hold_token (X-Hold-Token header or hold_token field).
+    """
+    user = request_user(request)
+    hold_token, owner = (None, user_owner(user)) if user else new_hold_token()
+    try:
+        hold = hold_seats(slot_id, seats=request.data.get('seats', 1), owner=owner,
+                          client=request_client(request))
+    except HoldError as e:
+        return Response({'error': str(e)}, status=e.status)
+    except (TypeError, ValueError):
+        return Response({'error': 'seats must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    hold_data = serialize_slot_hold(hold)
+    if hold_token:
+        hold_data['hold_token'] = hold_token
+    return Response(hold_data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([AllowAny])
+def slot_hold_detail(request, hold_id):
+    """GET: is the hold still active; DELETE: release it (checkout abandoned). Only for the hold's owner"""
+    owners = request_hold_owners(request, request.GET.get('hold_token'))
+    if request.method == 'DELETE':
+        if not release_hold(hold_id, owners):
+            return Response({'error': 'Seat hold not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    hold = get_active_hold(hold_id, owners)
+    if hold is None:
+        return Response({'error': 'Seat hold not found or expired'}, status=HoldExpired.status)
+    return Response(serialize_slot_hold(hold), status=status.HTTP_200_OK)
+
+
 # Simple time slots endpoint (fallback)
+@serves_stale
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def simple_time_slots(request):
@@ -633,33 +781,20 @@ def simple_time_slots(request):
         except ValueError:
             target_date = date.today()
         
-        print(f"Simple time slots - fetching from MongoDB for: {target_date}")
-        
-        # Get from MongoDB only (like getting patients)
-        slots = TimeSlot.objects.filter(date=target_date, available=True).order_by('start_time')
-        
-        # If no slots exist, create them in MongoDB
-        if not slots.exists():
-            print(f"No slots in MongoDB, creating for: {target_date}")
-            created_count = create_default_time_slots_in_mongodb(target_date)
-            print(f"Created {created_count} slots in MongoDB")
-            slots = TimeSlot.objects.filter(date=target_date, available=True).order_by('start_time')
+        slot_data, stale_since = time_slot_data_or_stale(target_date)
         
-        # Serialize from MongoDB (like serializing patients)
-        slot_data = [serialize_time_slot(slot) for slot in slots]
-        
-        return Response({
+        return mark_stale(Response({
             'success': True,
             'date': target_date.isoformat(),
             'slots': slot_data,
-            'source': 'mongodb_simple',
+            'source': 'stale_snapshot' if stale_since else 'mongodb_simple',
             'total_slots': len(slot_data)
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), stale_since)
         
+    except DatabaseUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
-        print(f"Error in simple time slots (MongoDB): {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in simple time slots (MongoDB)")
         return Response({
             'success': False,
             'error': f'MongoDB error: {str(e)}',
@@ -668,7 +803,7 @@ def simple_time_slots(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
     except Exception as e:
-        print(f"Error in simple time slots: {str(e)}")
+        logger.exception("Error in simple time slots")
         return Response({
             'success': False,
             'error': str(e),
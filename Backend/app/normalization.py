@@ -0,0 +1,38 @@
+"""
+Normalized forms of patient contact fields.
+
+Stored next to the raw values (``Patient.clean`` fills them on save) so
+search and lookups are plain equality/prefix matches on an index instead of
+regexes over user-typed data.
+"""
+
+import re
+
+_NON_DIGITS = re.compile(r'\D+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_phone(value):
+    """
+    Digits only, national number: '+91 98765-43210', '098765 43210' and
+    '9876543210' all become '9876543210'. Returns None for empty input.
+    """
+    if not value:
+        return None
+    digits = _NON_DIGITS.sub('', str(value))
+    if len(digits) > 10 and (digits.startswith('91') or digits.startswith('0')):
+        digits = digits[-10:]
+    return digits or None
+
+
+def normalize_email(value):
+    if not value:
+        return None
+    return str(value).strip().lower() or None
+
+
+def normalize_name(value):
+    """Lower-cased, trimmed, inner whitespace collapsed"""
+    if not value:
+        return None
+    return _WHITESPACE.sub(' ', str(value).strip()).lower() or None
@@ -0,0 +1,403 @@
+"""
+Bookings taken while MongoDB is unreachable, replayed once it is back.
+
+While the database circuit is open (degraded.py), or when a booking loses
+the database before its seat was taken, ``book_test_with_patients`` appends
+the booking (its patients, requested slot and amount) as one JSON line to
+the offline journal, ``OFFLINE_JOURNAL_PATH``, and answers 202. The workers
+of a host share the file and append under an exclusive ``flock``.
+
+``sync()`` (the ``sync_offline_journal`` command) moves the journal aside
+and replays it in batches, oldest entry first:
+
+1. patients: one bulk upsert on their identity (``resolve_patients``);
+2. bookings: one bulk upsert keyed on the journal entry id, so an entry
+   replayed twice still makes one booking. A booking id that another
+   booking already has becomes ``<booking id>-<first 6 of the entry id>``;
+3. seats: the offline bookings of a slot take their seats in one
+   ``book_seats``; if they don't all fit they are seated one by one in
+   journal order, and those left over stay ``pending`` with
+   ``offline_status = 'overbooked'`` for staff to reschedule.
+
+A moved-aside file is deleted once all of it is replayed; a sync that dies
+leaves it to the next one. Seats taken just before such a crash, before
+their bookings were marked seated, are taken again by the retry.
+
+``import_legacy`` journals the ``booking_history`` that simple_working_api.py
+kept in its JSON fallback file, so it reaches MongoDB the same way.
+"""
+
+import fcntl
+import glob
+import json
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .booking_tasks import save_prescription
+from .mongo_models import Booking
+from .patient_identity import resolve_patients
+from .payment_events import sync_booking_payment
+from .slot_holds import SlotFull, SlotNotFound, book_seats
+from .slot_templates import parse_virtual_slot_id
+
+logger = logging.getLogger(__name__)
+
+SYNCING_SUFFIX = '.syncing'
+
+# Booking.offline_status
+AWAITING_SEAT = 'awaiting_seat'
+SEATED = 'seated'
+OVERBOOKED = 'overbooked'
+SLOT_NOT_FOUND = 'slot_not_found'
+NO_SLOT = 'no_slot'
+
+
+def journal_path():
+    return str(getattr(settings, 'OFFLINE_JOURNAL_PATH', 'offline_journal.jsonl'))
+
+
+def _same_file(handle, path):
+    try:
+        return os.stat(path).st_ino == os.fstat(handle.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def append(entries):
+    """Append entries to the journal, durably"""
+    if not entries:
+        return
+    lines = ''.join(json.dumps(entry, separators=(',', ':'), default=str) + '\n' for entry in entries)
+    path = journal_path()
+    while True:
+        with open(path, 'a', encoding='utf-8') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            if not _same_file(handle, path):
+                continue  # a sync moved it aside between our open and lock
+            handle.write(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+            return
+
+
+def cart_patients(cart_items):
+    """The patients book_test_with_patients would resolve, in journal form"""
+    patients = []
+    for item in cart_items:
+        for patient in item.get('patients', []):
+            name = patient.get('name', '')
+            if name.startswith('Self') or not name or not patient.get('age'):
+                continue
+            entry = {
+                'id': str(ObjectId()),  # only used if they have no phone number to be matched on
+                'first_name': name,
+                'age': int(patient['age']),
+                'gender': patient['gender'].upper()[:1] if patient.get('gender') else 'O',
+                'phone_number': patient.get('phone'),
+                'email': patient.get('email'),
+            }
+            if patient.get('prescription_file'):
+                entry['prescription'] = {
+                    'file': patient['prescription_file'],
+                    'filename': patient.get('prescription_filename',
+                                            f'prescription_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.pdf'),
+                }
+            patients.append(entry)
+    return patients
+
+
+def record_booking(data, booking_id, booking_date):
+    """Journal a book-test request that couldn't reach MongoDB; returns the entry"""
+    cart_items = data.get('cart_items', [])
+    entry = {
+        'entry_id': uuid.uuid4().hex,
+        'recorded_at': datetime.utcnow().isoformat(),
+        'source': 'book-test',
+        'booking_id': booking_id,
+        'booking_date': booking_date.isoformat(),
+        'slot_id': data.get('time_slot_id'),
+        'preferred_time': data.get('preferred_time'),
+        'total_amount': data.get('total_price', 0),
+        # The hold's order can't be looked up offline; staff match the payment by hold id
+        'payment_order_id': None,
+        'hold_id': data.get('hold_id'),
+        'tests': [item.get('name', '') for item in cart_items],
+        'patients': cart_patients(cart_items),
+    }
+    append([entry])
+    logger.warning("MongoDB unavailable; booking %s recorded in the offline journal", booking_id)
+    return entry
+
+
+def import_legacy(path):
+    """Journal the bookings simple_working_api.py kept in ``path``; returns how many"""
+    with open(path, encoding='utf-8') as handle:
+        data = json.load(handle)
+    entries = []
+    for record in data.get('booking_history', []):
+        if record.get('mongodb_booking_id'):
+            continue  # it reached MongoDB at the time
+        recorded_at = record.get('booked_at') or datetime.utcnow().isoformat()
+        slot_id = record.get('time_slot_id')
+        if not (slot_id and (ObjectId.is_valid(slot_id) or parse_virtual_slot_id(slot_id))):
+            slot_id = None  # simple_/slot_ ids only ever existed in the JSON file
+        entries.append({
+            # Derived from the record, so importing the file again doesn't duplicate it
+            'entry_id': uuid.uuid5(uuid.NAMESPACE_URL, f"{record['booking_id']}|{recorded_at}").hex,
+            'recorded_at': recorded_at,
+            'source': f'legacy:{os.path.basename(path)}',
+            'booking_id': record['booking_id'],
+            'booking_date': record.get('booking_date') or recorded_at[:10],
+            'slot_id': slot_id,
+            'preferred_time': record.get('preferred_time'),
+            'total_amount': record.get('total_amount', 0),
+            'payment_order_id': None,
+            'tests': [item.get('name', '') for item in record.get('cart_items', [])],
+            'patients': [],
+        })
+    append(entries)
+    return len(entries)
+
+
+def read_entries(path):
+    entries = []
+    with open(path, encoding='utf-8') as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A write cut short by a crash; the request that made it got an error
+                logger.warning("Skipping unreadable offline journal line %s:%d", path, number)
+    return entries
+
+
+def pending_files():
+    return sorted(glob.glob(f'{glob.escape(journal_path())}.*{SYNCING_SUFFIX}'))
+
+
+def pending_count():
+    """Entries waiting to be replayed on this host"""
+    count = 0
+    for path in [journal_path(), *pending_files()]:
+        try:
+            with open(path, 'rb') as handle:
+                count += sum(1 for line in handle if line.strip())
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def _move_aside():
+    """Rename the journal for replay, so new entries start a fresh file"""
+    path = journal_path()
+    if not os.path.exists(path):
+        return None
+    with open(path, 'a', encoding='utf-8') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        if not _same_file(handle, path) or os.fstat(handle.fileno()).st_size == 0:
+            return None
+        target = f'{path}.{datetime.utcnow().strftime("%Y%m%d%H%M%S%f")}{SYNCING_SUFFIX}'
+        os.rename(path, target)
+    return target
+
+
+@contextmanager
+def _sync_lock():
+    """True if this process is the host's only sync"""
+    with open(f'{journal_path()}.lock', 'a') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def renamed_booking_id(entry):
+    return f"{entry['booking_id']}-{entry['entry_id'][:6].upper()}"
+
+
+def _booking_document(entry, patient_ids):
+    payment_order_id = entry.get('payment_order_id')
+    booking = Booking(
+        booking_id=entry['booking_id'],
+        patients=patient_ids,
+        tests=entry.get('tests', []),
+        total_amount=entry.get('total_amount') or 0,
+        booking_date=date.fromisoformat(entry['booking_date']),
+        preferred_time=entry.get('preferred_time'),
+        # Unconfirmed until it has its seat (and its payment is matched)
+        status='pending' if payment_order_id or entry.get('slot_id') or entry.get('hold_id') else 'confirmed',
+        payment_order_id=payment_order_id,
+        offline_entry_id=entry['entry_id'],
+        offline_status=AWAITING_SEAT if entry.get('slot_id') else NO_SLOT,
+        created_at=datetime.fromisoformat(entry['recorded_at']),
+    )
+    if entry.get('source', '').startswith('legacy:'):
+        booking.notes = f"Imported from {entry['source'][len('legacy:'):]}"
+    elif entry.get('hold_id'):
+        booking.notes = f"Checked out with seat hold {entry['hold_id']}; match its payment order before confirming"
+    booking.validate()
+    document = booking.to_mongo().to_dict()
+    document.pop('_id', None)
+    return document
+
+
+def _upsert_bookings(pending, counts):
+    """Insert (entry, document) pairs, renaming booking ids taken by other bookings"""
+    collection = Booking._get_collection()
+    while pending:
+        operations = [UpdateOne({'offline_entry_id': entry['entry_id']}, {'$setOnInsert': document}, upsert=True)
+                      for entry, document in pending]
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            counts['bookings'] += e.details['nUpserted']
+            retry = []
+            for error in e.details['writeErrors']:
+                if error['code'] != 11000:
+                    raise
+                entry, document = pending[error['index']]
+                if document['booking_id'] == entry['booking_id']:
+                    # Its booking id is taken. (Had another sync inserted this very entry, the
+                    # retry just matches that booking.)
+                    document['booking_id'] = renamed_booking_id(entry)
+                    counts['renamed'] += 1
+                    retry.append((entry, document))
+                # Already renamed and still clashing: left for the next run
+            pending = retry
+            continue
+        counts['bookings'] += result.upserted_count
+        return
+
+
+def _seat_updates(slot_id, entries, bookings, counts):
+    """Take seats on ``slot_id`` for ``entries`` (in journal order); returns the booking updates"""
+    try:
+        slots = [book_seats(slot_id, len(entries))] * len(entries)
+    except SlotNotFound:
+        slots = [SLOT_NOT_FOUND] * len(entries)
+    except SlotFull:
+        # Not room for all: first come, first seated
+        slots, full = [], False
+        for _ in entries:
+            if not full:
+                try:
+                    slot = book_seats(slot_id)
+                except SlotFull:
+                    full = True
+            slots.append(OVERBOOKED if full else slot)
+
+    updates = []
+    for entry, slot in zip(entries, slots):
+        if slot in (SLOT_NOT_FOUND, OVERBOOKED):
+            changes = {'offline_status': slot,
+                       'notes': 'Offline booking could not be seated when it was synced; please reschedule'}
+        else:
+            changes = {
+                'offline_status': SEATED,
+                # Bucket slots have no document to reference, only their v:... id
+                'time_slot': slot.id if slot.id else None,
+                'time_slot_key': slot.api_id if not slot.id else None,
+                'status': 'pending' if bookings[entry['entry_id']].get('payment_order_id') or entry.get('hold_id')
+                else 'confirmed',
+            }
+        changes['updated_at'] = datetime.utcnow()
+        counts[changes['offline_status']] += 1
+        updates.append(UpdateOne({'offline_entry_id': entry['entry_id'], 'offline_status': AWAITING_SEAT},
+                                 {'$set': changes}))
+    return updates
+
+
+def _replay_batch(batch, counts):
+    collection = Booking._get_collection()
+    entry_ids = [entry['entry_id'] for entry in batch]
+    synced = {document['offline_entry_id'] for document in
+              collection.find({'offline_entry_id': {'$in': entry_ids}}, {'offline_entry_id': 1})}
+    new = [entry for entry in batch if entry['entry_id'] not in synced]
+    counts['already_synced'] += len(batch) - len(new)
+
+    people = [patient for entry in new for patient in entry.get('patients', [])]
+    patient_ids = iter(resolve_patients([{key: value for key, value in patient.items() if key != 'prescription'}
+                                         for patient in people]))
+    counts['patients'] += len(people)
+    pending = []
+    for entry in new:
+        ids = [next(patient_ids) for _ in entry.get('patients', [])]
+        for patient, patient_id in zip(entry.get('patients', []), ids):
+            if patient.get('prescription'):
+                save_prescription.delay(str(patient_id), patient['prescription']['file'],
+                                        patient['prescription']['filename'])
+        pending.append((entry, _booking_document(entry, list(dict.fromkeys(ids)))))
+    _upsert_bookings(pending, counts)
+
+    # Seats, for bookings still waiting for theirs (this run's, or a crashed run's)
+    bookings = {document['offline_entry_id']: document for document in collection.find(
+        {'offline_entry_id': {'$in': entry_ids}}, {'offline_entry_id': 1, 'offline_status': 1, 'payment_order_id': 1}
+    )}
+    counts['unsynced'] += len(batch) - len(bookings)
+    by_slot = {}
+    for entry in batch:
+        if bookings.get(entry['entry_id'], {}).get('offline_status') == AWAITING_SEAT:
+            by_slot.setdefault(entry['slot_id'], []).append(entry)
+    updates = []
+    for slot_id, entries in by_slot.items():
+        updates.extend(_seat_updates(slot_id, entries, bookings, counts))
+    if updates:
+        collection.bulk_write(updates, ordered=False)
+
+    for entry in batch:
+        booking = bookings.get(entry['entry_id'])
+        if booking and booking.get('payment_order_id') and entry['entry_id'] not in synced:
+            # The payment webhook was most likely processed before the booking existed
+            sync_booking_payment(booking['payment_order_id'])
+    return [entry for entry in batch if entry['entry_id'] not in bookings]
+
+
+def _zero_counts():
+    return dict.fromkeys(('entries', 'bookings', 'already_synced', 'renamed', 'patients',
+                          SEATED, OVERBOOKED, SLOT_NOT_FOUND, 'unsynced'), 0)
+
+
+def replay(entries, batch_size=500):
+    """Write journal entries to MongoDB; returns (counts, entries that could not be written)"""
+    counts = _zero_counts()
+    unique = {entry['entry_id']: entry for entry in entries}
+    ordered = sorted(unique.values(), key=lambda entry: (entry['recorded_at'], entry['entry_id']))
+    counts['entries'] = len(ordered)
+    unsynced = []
+    for start in range(0, len(ordered), batch_size):
+        unsynced.extend(_replay_batch(ordered[start:start + batch_size], counts))
+    return counts, unsynced
+
+
+def sync(batch_size=500):
+    """
+    Replay this host's journal; returns the counts, or None if another sync
+    is running. Raises (leaving the journal for the next run) if MongoDB
+    goes away midway.
+    """
+    with _sync_lock() as acquired:
+        if not acquired:
+            return None
+        _move_aside()
+        totals = _zero_counts()
+        for path in pending_files():
+            counts, unsynced = replay(read_entries(path), batch_size)
+            if unsynced:
+                logger.error("%d offline bookings could not be written; kept in the journal", len(unsynced))
+                append(unsynced)
+            os.unlink(path)
+            for key, value in counts.items():
+                totals[key] += value
+        return totals
@@ -0,0 +1,231 @@
+"""
+Patient identity resolution.
+
+A person is identified by (normalized phone, lower-cased first name, age):
+booking the same family member again reuses their ``Patient`` document
+instead of inserting a new one. ``resolve_patient`` is a single
+``findOneAndUpdate`` upsert on the unique ``(phone_normalized, first_name_lc,
+age)`` index: of two concurrent upserts of one person, one inserts and the
+other gets a duplicate key error and matches that document when retried
+(by the server since MongoDB 4.2, and here for older ones). Patients without
+a phone number can't be matched safely (two strangers called "Rahul", 30),
+are left out of the index and are always inserted.
+
+``merge_duplicates`` folds documents created before resolution existed into
+the oldest one and repoints references; the unique index can only be built
+once they are gone. See the ``merge_duplicate_patients`` management command.
+"""
+
+from datetime import datetime
+
+from pymongo import DeleteMany, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .mongo_models import Booking, Cart, CartItem, MemberPatient, Patient
+from .normalization import normalize_email, normalize_name, normalize_phone
+
+
+def _identity_upsert(phone, first_name, age, gender, phone_number=None, email=None,
+                     prescription_file=None, prescription_filename=None):
+    """(filter, update) upserting the patient identified by ``phone``, name and age"""
+    # Validate the incoming values the same way save() would
+    candidate = Patient(first_name=first_name, age=age, gender=gender,
+                        phone_number=phone_number, email=email)
+    candidate.validate()
+
+    updates = {}
+    # Newer contact details and prescriptions win over what we had
+    if email:
+        updates.update(email=email, email_lc=normalize_email(email))
+    if prescription_file:
+        updates.update(prescription_file=prescription_file, prescription_filename=prescription_filename)
+
+    on_insert = {
+        'first_name': candidate.first_name,
+        'gender': candidate.gender,
+        'phone_number': phone_number,
+        'user_id': None,
+        'created_at': datetime.utcnow(),
+    }
+    for key in ('email', 'email_lc', 'prescription_file', 'prescription_filename'):
+        if key not in updates:
+            on_insert[key] = None
+
+    update = {'$setOnInsert': on_insert}
+    if updates:
+        update['$set'] = updates
+    return {'phone_normalized': phone, 'first_name_lc': normalize_name(first_name), 'age': candidate.age}, update
+
+
+def resolve_patient(first_name, age, gender, phone_number=None, email=None,
+                    prescription_file=None, prescription_filename=None):
+    """Return the existing Patient for this identity, or a newly inserted one"""
+    phone = normalize_phone(phone_number)
+    if not phone:
+        patient = Patient(
+            first_name=first_name, age=age, gender=gender, phone_number=phone_number,
+            email=email, prescription_file=prescription_file,
+            prescription_filename=prescription_filename,
+        )
+        patient.save()
+        return patient
+
+    identity, update = _identity_upsert(phone, first_name, age, gender, phone_number, email,
+                                        prescription_file, prescription_filename)
+    collection = Patient._get_collection()
+    try:
+        document = collection.find_one_and_update(identity, update, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # A concurrent upsert inserted them first; this one now matches
+        document = collection.find_one_and_update(identity, update, upsert=True, return_document=ReturnDocument.AFTER)
+    return Patient._from_son(document)
+
+
+def resolve_patients(people):
+    """
+    ``resolve_patient`` for many people with one bulk write and one read;
+    returns their ids in order. Each item holds resolve_patient's arguments;
+    people without a phone number also need an ``id``, the ObjectId they are
+    inserted under, so that running this again doesn't insert them twice.
+    """
+    collection = Patient._get_collection()
+    operations, identities, ids = [], {}, []
+    for person in people:
+        fields = {key: value for key, value in person.items() if key != 'id'}
+        phone = normalize_phone(fields.get('phone_number'))
+        if not phone:
+            patient = Patient(id=person['id'], **fields)
+            patient.validate()
+            operations.append(InsertOne(patient.to_mongo().to_dict()))
+            ids.append(patient.id)
+            continue
+        identity, update = _identity_upsert(phone, **fields)
+        key = (identity['phone_normalized'], identity['first_name_lc'], identity['age'])
+        if key not in identities:
+            identities[key] = identity
+            operations.append(UpdateOne(identity, update, upsert=True))
+        ids.append(key)
+
+    if operations:
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Already inserted by an earlier run, or an upsert racing another
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+    if identities:
+        found = collection.find({'$or': list(identities.values())},
+                                {'phone_normalized': 1, 'first_name_lc': 1, 'age': 1})
+        resolved = {(d['phone_normalized'], d['first_name_lc'], d['age']): d['_id'] for d in found}
+        ids = [resolved[key] if isinstance(key, tuple) else key for key in ids]
+    return ids
+
+
+def duplicate_groups(batch_size=1000):
+    """
+    Yield ``[canonical_id, duplicate_id, ...]`` for each identity with more
+    than one document; the oldest document is canonical.
+    """
+    pipeline = [
+        {'$match': {'phone_normalized': {'$type': 'string'}}},
+        {'$sort': {'created_at': 1, '_id': 1}},
+        {'$group': {
+            '_id': {'phone': '$phone_normalized', 'name': '$first_name_lc', 'age': '$age'},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1},
+        }},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    cursor = Patient._get_collection().aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    for group in cursor:
+        yield group['ids']
+
+
+def _fill_missing_fields(collection, groups):
+    """Copy email/prescription from the newest duplicate that has one onto a canonical missing it"""
+    ids = [patient_id for group in groups for patient_id in group]
+    documents = {
+        document['_id']: document
+        for document in collection.find(
+            {'_id': {'$in': ids}}, {'email': 1, 'prescription_file': 1, 'prescription_filename': 1}
+        )
+    }
+    operations = []
+    for canonical_id, *duplicate_ids in groups:
+        canonical = documents.get(canonical_id, {})
+        updates = {}
+        for duplicate_id in reversed(duplicate_ids):
+            duplicate = documents.get(duplicate_id, {})
+            if not canonical.get('email') and duplicate.get('email') and 'email' not in updates:
+                updates.update(email=duplicate['email'], email_lc=normalize_email(duplicate['email']))
+            if (not canonical.get('prescription_file') and duplicate.get('prescription_file')
+                    and 'prescription_file' not in updates):
+                updates.update(prescription_file=duplicate['prescription_file'],
+                               prescription_filename=duplicate.get('prescription_filename'))
+        if updates:
+            operations.append(UpdateOne({'_id': canonical_id}, {'$set': updates}))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def _booking_repoint(canonical_id, duplicate_ids):
+    """Pipeline update replacing duplicates by the canonical id, de-duplicated, order kept"""
+    mapped = {'$map': {
+        'input': '$patients',
+        'as': 'patient',
+        'in': {'$cond': [{'$in': ['$$patient', duplicate_ids]}, canonical_id, '$$patient']},
+    }}
+    deduplicated = {'$reduce': {
+        'input': mapped,
+        'initialValue': [],
+        'in': {'$cond': [
+            {'$in': ['$$this', '$$value']}, '$$value', {'$concatArrays': ['$$value', ['$$this']]},
+        ]},
+    }}
+    return UpdateMany(
+        {'patients': {'$in': duplicate_ids}},
+        [{'$set': {'patients': deduplicated, 'updated_at': '$$NOW'}}],
+    )
+
+
+def _merge_carts(groups):
+    """Cart.patient is unique: move duplicate carts' items into the surviving cart"""
+    carts = Cart._get_collection()
+    items = CartItem._get_collection()
+    for canonical_id, *duplicate_ids in groups:
+        duplicate_carts = list(carts.find({'patient': {'$in': duplicate_ids}}, {'_id': 1}))
+        if not duplicate_carts:
+            continue
+        target = carts.find_one({'patient': canonical_id}, {'_id': 1})
+        if target is None:
+            target = duplicate_carts.pop(0)
+            carts.update_one({'_id': target['_id']}, {'$set': {'patient': canonical_id}})
+        merged = [cart['_id'] for cart in duplicate_carts]
+        if merged:
+            items.update_many({'cart': {'$in': merged}}, {'$set': {'cart': target['_id']}})
+            carts.delete_many({'_id': {'$in': merged}})
+
+
+def merge_duplicates(groups):
+    """
+    Merge a batch of duplicate groups (from ``duplicate_groups``). Returns
+    ``(bookings_updated, patients_deleted)``.
+    """
+    if not groups:
+        return 0, 0
+    patients = Patient._get_collection()
+    _fill_missing_fields(patients, groups)
+
+    booking_ops, member_ops = [], []
+    for canonical_id, *duplicate_ids in groups:
+        booking_ops.append(_booking_repoint(canonical_id, duplicate_ids))
+        member_ops.append(UpdateMany({'owner': {'$in': duplicate_ids}}, {'$set': {'owner': canonical_id}}))
+
+    bookings_updated = Booking._get_collection().bulk_write(booking_ops, ordered=False).modified_count
+    MemberPatient._get_collection().bulk_write(member_ops, ordered=False)
+    _merge_carts(groups)
+
+    # References are repointed; only now is it safe to delete
+    all_duplicates = [patient_id for group in groups for patient_id in group[1:]]
+    deleted = patients.bulk_write([DeleteMany({'_id': {'$in': all_duplicates}})]).deleted_count
+    return bookings_updated, deleted
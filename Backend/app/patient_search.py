@@ -0,0 +1,62 @@
+"""
+Patient search backed by the normalized search keys on ``Patient``.
+
+The query decides the lookup: an email is an exact match on ``email_lc``,
+something phone-shaped is an exact (10 digits) or prefix match on
+``phone_normalized``, anything else is an anchored prefix match on
+``first_name_lc``. Every branch is a bounded range on one of the
+``(<key>, -created_at)`` indexes and sorts in index order, so the cost
+depends on the result cap, not on the size of the collection.
+"""
+
+import re
+
+from .mongo_models import Patient
+from .normalization import normalize_email, normalize_name, normalize_phone
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MIN_QUERY_LENGTH = 2
+MIN_PHONE_DIGITS = 4
+
+_PHONE_SHAPED = re.compile(r'^\+?[\d\s().-]+$')
+
+
+def classify_query(query):
+    """('email' | 'phone' | 'name', normalized value)"""
+    query = (query or '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f'Search query must be at least {MIN_QUERY_LENGTH} characters')
+    if '@' in query:
+        return 'email', normalize_email(query)
+    if _PHONE_SHAPED.match(query):
+        digits = normalize_phone(query)
+        if digits and len(digits) < MIN_PHONE_DIGITS:
+            raise ValueError(f'Phone searches need at least {MIN_PHONE_DIGITS} digits')
+        return 'phone', digits
+    return 'name', normalize_name(query)
+
+
+def search_patients(query, limit=DEFAULT_LIMIT):
+    """
+    Ranked, capped search. Returns ``(match, patients, truncated)``.
+
+    Ranking follows the index order: exact phone/email matches newest first;
+    prefix matches by key (so an exact name sorts before longer ones), then
+    newest.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    match, value = classify_query(query)
+
+    if match == 'email':
+        queryset = Patient.objects(email_lc=value).order_by('-created_at')
+    elif match == 'phone' and len(value) >= 10:
+        queryset = Patient.objects(phone_normalized=value).order_by('-created_at')
+    elif match == 'phone':
+        queryset = Patient.objects(phone_normalized__startswith=value).order_by('phone_normalized', '-created_at')
+    else:
+        queryset = Patient.objects(first_name_lc__startswith=value).order_by('first_name_lc', '-created_at')
+
+    # One extra document tells us whether the cap cut anything off
+    patients = list(queryset.limit(limit + 1))
+    return match, patients[:limit], len(patients) > limit
@@ -0,0 +1,175 @@
+"""
+Razorpay webhook queue.
+
+The webhook view only checks the signature and appends the delivery to
+``payment_events`` (``enqueue_event``), so Razorpay gets its 200 straight
+away; a redelivery of the same event collides on the unique ``event_id``.
+The ``process_payment_events`` command drains the queue in batches:
+
+* ``claim_batch`` leases up to N queued events to one consumer; events whose
+  lease expired (the consumer died) are claimable again.
+* ``apply_payment_states`` folds the batch into one Booking update per
+  order. Payment states only move forward (failed < authorized < captured <
+  refunded) and every update is conditional on that, so replays and
+  out-of-order deliveries change nothing.
+* Applied events are marked ``done``; after an error they are re-queued
+  until ``max_attempts``, then marked ``failed``.
+
+A booking saved after its order's webhook was processed catches up with
+``sync_booking_payment``.
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import UpdateMany
+from pymongo.errors import DuplicateKeyError
+
+from .mongo_models import Booking, PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+# Webhook event -> payment state it proves; other events are acknowledged and ignored
+EVENT_STATES = {
+    'payment.failed': 'failed',
+    'payment.authorized': 'authorized',
+    'payment.captured': 'captured',
+    'order.paid': 'captured',
+    'refund.processed': 'refunded',
+}
+STATE_RANK = {'failed': 0, 'authorized': 1, 'captured': 2, 'refunded': 3}
+
+
+def _entity(payload, name):
+    return ((payload.get('payload') or {}).get(name) or {}).get('entity') or {}
+
+
+def enqueue_event(body, event_id=None):
+    """
+    Queue a verified webhook body (bytes); returns False for a redelivery.
+    Raises ValueError if the body isn't a Razorpay event.
+    """
+    try:
+        payload = json.loads(body)
+        event = payload['event']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Not a Razorpay event')
+
+    payment, order, refund = _entity(payload, 'payment'), _entity(payload, 'order'), _entity(payload, 'refund')
+    try:
+        PaymentEvent._get_collection().insert_one({
+            # Razorpay sends X-Razorpay-Event-Id; the body hash is a fallback
+            'event_id': event_id or hashlib.sha256(body).hexdigest(),
+            'event': event,
+            'order_id': payment.get('order_id') or order.get('id'),
+            'payment_id': payment.get('id') or refund.get('payment_id'),
+            'payload': payload,
+            'status': 'queued',
+            'attempts': 0,
+            'received_at': datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def claim_batch(size=500, lease=timedelta(seconds=60)):
+    """Lease up to ``size`` events to this caller; returns (claim token, raw event documents)"""
+    now = datetime.utcnow()
+    collection = PaymentEvent._get_collection()
+    claimable = {'$or': [
+        {'status': 'queued'},
+        {'status': 'processing', 'locked_until': {'$lt': now}},
+    ]}
+    ids = [doc['_id'] for doc in collection.find(claimable, {'_id': 1}).sort('received_at', 1).limit(size)]
+    if not ids:
+        return None, []
+
+    token = uuid.uuid4().hex
+    collection.update_many(
+        {'_id': {'$in': ids}, **claimable},
+        {'$set': {'status': 'processing', 'locked_until': now + lease, 'claimed_by': token},
+         '$inc': {'attempts': 1}},
+    )
+    # Another consumer may have won some of them between the find and the update
+    return token, list(collection.find({'claimed_by': token, 'status': 'processing'}))
+
+
+def fold_events(events):
+    """{order_id: (state, payment_id)} keeping the most advanced state per order"""
+    states = {}
+    for event in events:
+        state = EVENT_STATES.get(event['event'])
+        order_id = event.get('order_id')
+        if state is None or not order_id:
+            continue
+        current = states.get(order_id)
+        if current is None or STATE_RANK[state] > STATE_RANK[current[0]]:
+            states[order_id] = (state, event.get('payment_id'))
+    return states
+
+
+def _booking_update(state, payment_id, now):
+    update = {'payment_status': state, 'updated_at': now}
+    if payment_id:
+        update['payment_id'] = payment_id
+    if state == 'captured':
+        update['paid_at'] = {'$ifNull': ['$paid_at', now]}
+        update['status'] = {'$cond': [{'$eq': ['$status', 'pending']}, 'confirmed', '$status']}
+    elif state == 'refunded':
+        update['status'] = {'$cond': [{'$in': ['$status', ['pending', 'confirmed']]}, 'cancelled', '$status']}
+    return [{'$set': update}]
+
+
+def apply_payment_states(states):
+    """Move bookings of each order forward to its state; returns the number of bookings changed"""
+    if not states:
+        return 0
+    now = datetime.utcnow()
+    operations = [
+        UpdateMany(
+            # Only forward: a replayed or late, less advanced event matches nothing
+            {'payment_order_id': order_id,
+             'payment_status': {'$nin': [s for s, rank in STATE_RANK.items() if rank >= STATE_RANK[state]]}},
+            _booking_update(state, payment_id, now),
+        )
+        for order_id, (state, payment_id) in states.items()
+    ]
+    return Booking._get_collection().bulk_write(operations, ordered=False).modified_count
+
+
+def process_batch(size=500, lease=timedelta(seconds=60), max_attempts=5):
+    """Claim, apply and acknowledge one batch; returns counts for logging"""
+    token, events = claim_batch(size, lease)
+    if not events:
+        return {'events': 0, 'bookings': 0, 'failed': 0}
+
+    collection = PaymentEvent._get_collection()
+    ids = [event['_id'] for event in events]
+    try:
+        updated = apply_payment_states(fold_events(events))
+    except Exception as e:
+        logger.exception("Applying %d payment events failed", len(events))
+        owned = {'_id': {'$in': ids}, 'claimed_by': token}
+        collection.update_many({**owned, 'attempts': {'$gte': max_attempts}},
+                               {'$set': {'status': 'failed', 'error': str(e)}, '$unset': {'locked_until': ''}})
+        collection.update_many({**owned, 'status': 'processing'},
+                               {'$set': {'status': 'queued', 'error': str(e)}, '$unset': {'locked_until': ''}})
+        return {'events': len(events), 'bookings': 0, 'failed': len(events)}
+
+    collection.update_many(
+        {'_id': {'$in': ids}, 'claimed_by': token},
+        {'$set': {'status': 'done', 'processed_at': datetime.utcnow()}, '$unset': {'locked_until': ''}},
+    )
+    return {'events': len(events), 'bookings': updated, 'failed': 0}
+
+
+def sync_booking_payment(order_id):
+    """Apply already-received events of ``order_id`` to its bookings (for bookings saved late)"""
+    events = PaymentEvent._get_collection().find(
+        {'order_id': order_id}, {'event': 1, 'order_id': 1, 'payment_id': 1}
+    )
+    return apply_payment_states(fold_events(events))
@@ -0,0 +1,177 @@
+"""
+Razorpay adapter with bounded latency.
+
+* One pooled ``requests.Session`` per process (keep-alive to the gateway),
+  with connect/read timeouts applied to every request.
+* Transient failures (connection errors, timeouts, 5xx) are retried with
+  exponential backoff and full jitter, within a total time budget.
+* A circuit breaker fails fast while the gateway is down, so workers aren't
+  tied up waiting on it; ``GatewayUnavailable`` maps to a 503.
+* ``create_order_async`` runs the blocking client on a small dedicated
+  thread pool, for async views.
+
+``RAZORPAY_BASE_URL`` points the adapter at a fake gateway
+(benchmarks/fake_gateway.py) to exercise latency and failures locally.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The gateway rejected the request (not retried)"""
+
+
+class GatewayUnavailable(GatewayError):
+    """Timeouts, 5xx or an open circuit: try again later"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Worth retrying: the request may not have reached Razorpay, or Razorpay failed
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+    requests.exceptions.JSONDecodeError,  # HTML 502/504 pages from proxies in front of the API
+)
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default (connect, read) timeout to every request"""
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.default_timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+class PaymentGateway:
+    def __init__(self, key_id, key_secret, base_url=None, connect_timeout=3.05, read_timeout=10.0,
+                 max_attempts=3, backoff_base=0.2, backoff_cap=2.0, total_budget=15.0, pool_size=10,
+                 breaker=None, webhook_secret=None):
+        self.webhook_secret = webhook_secret
+        self.session = TimeoutSession((connect_timeout, read_timeout), pool_size)
+        options = {'base_url': base_url} if base_url else {}
+        self.client = razorpay.Client(session=self.session, auth=(key_id, key_secret), **options)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.total_budget = total_budget
+        self.breaker = breaker or CircuitBreaker('razorpay', failure_exceptions=TRANSIENT_ERRORS)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='razorpay')
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many workers instead of synchronizing them
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _call(self, description, function, *args, **kwargs):
+        deadline = time.monotonic() + self.total_budget
+        for attempt in range(self.max_attempts):
+            try:
+                return self.breaker.call(function, *args, **kwargs)
+            except CircuitOpenError as e:
+                raise GatewayUnavailable('Payment gateway is unavailable, please retry shortly',
+                                         retry_after=e.retry_after)
+            except TRANSIENT_ERRORS as e:
+                delay = self._backoff(attempt)
+                last_attempt = attempt == self.max_attempts - 1
+                if last_attempt or time.monotonic() + delay >= deadline:
+                    logger.warning("Razorpay %s failed after %d attempt(s): %s", description, attempt + 1, e)
+                    raise GatewayUnavailable('Payment gateway is not responding, please retry') from e
+                logger.info("Razorpay %s attempt %d failed (%s); retrying in %.2fs",
+                            description, attempt + 1, type(e).__name__, delay)
+                time.sleep(delay)
+            except razorpay.errors.BadRequestError as e:
+                raise GatewayError(str(e)) from e
+
+    def create_order(self, amount, currency='INR', receipt=None, notes=None):
+        """
+        Create a Razorpay order (``amount`` in paise). A retry after a read
+        timeout can create a second, unpaid order; it simply expires, and
+        ``receipt`` lets the two be matched up in the dashboard.
+        """
+        data = {'amount': amount, 'currency': currency, 'payment_capture': '1'}
+        if receipt:
+            data['receipt'] = receipt
+        if notes:
+            data['notes'] = notes
+        return self._call('order.create', self.client.order.create, data)
+
+    async def create_order_async(self, *args, **kwargs):
+        """create_order without blocking the event loop (bounded by the pool size)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.create_order(*args, **kwargs))
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """True if the checkout callback's signature is valid (local HMAC, no request)"""
+        try:
+            self.client.utility.verify_payment_signature({
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+            })
+            return True
+        except razorpay.errors.SignatureVerificationError:
+            return False
+
+    def verify_webhook_signature(self, body, signature):
+        """True if a webhook body (bytes) was signed with the configured webhook secret"""
+        if not self.webhook_secret:
+            logger.warning("RAZORPAY_WEBHOOK_SECRET is not set; rejecting webhook")
+            return False
+        try:
+            self.client.utility.verify_webhook_signature(body.decode(), signature, self.webhook_secret)
+            return True
+        except (razorpay.errors.SignatureVerificationError, UnicodeDecodeError):
+            return False
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide PaymentGateway built from settings"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = PaymentGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    base_url=getattr(settings, 'RAZORPAY_BASE_URL', None) or None,
+                    connect_timeout=settings.RAZORPAY_CONNECT_TIMEOUT,
+                    read_timeout=settings.RAZORPAY_READ_TIMEOUT,
+                    max_attempts=settings.RAZORPAY_MAX_ATTEMPTS,
+                    webhook_secret=settings.RAZORPAY_WEBHOOK_SECRET,
+                    breaker=CircuitBreaker(
+                        'razorpay',
+                        failure_threshold=settings.RAZORPAY_BREAKER_THRESHOLD,
+                        reset_timeout=settings.RAZORPAY_BREAKER_RESET_SECONDS,
+                        failure_exceptions=TRANSIENT_ERRORS,
+                    ),
+                )
+    return _gateway
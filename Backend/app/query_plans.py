@@ -0,0 +1,86 @@
+"""
+Query-plan inspection for captured MongoDB commands.
+
+``explain_command`` re-runs a captured read command under ``explain`` and
+``bad_stages`` walks the winning plan for collection scans and blocking
+(in-memory) sorts. Used by the ``check_query_plans`` management command.
+"""
+
+# Commands that have a query plan worth checking
+EXPLAINABLE_COMMANDS = ('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify')
+
+# Stages that mean "no usable index"
+BAD_STAGES = ('COLLSCAN', 'SORT')
+
+# Driver/session fields that explain does not accept inside the wrapped command
+_SESSION_FIELDS = (
+    'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'readConcern',
+    'writeConcern', 'autocommit', 'startTransaction', 'apiVersion', 'apiStrict',
+    'apiDeprecationErrors',
+)
+
+
+def explainable(command_name, command):
+    if command_name not in EXPLAINABLE_COMMANDS:
+        return False
+    # $indexStats/$collStats etc. are metadata reads, not queries
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or [{}]
+        first_stage = next(iter(pipeline[0]), '')
+        if first_stage in ('$indexStats', '$collStats', '$currentOp', '$listSessions'):
+            return False
+    return True
+
+
+def explain_command(db, command):
+    """Run ``explain`` (queryPlanner verbosity) for a captured command document"""
+    inner = {key: value for key, value in command.items() if key not in _SESSION_FIELDS}
+    return db.command({'explain': inner, 'verbosity': 'queryPlanner'})
+
+
+def _winning_plans(explain):
+    """Yield winning plan trees from find/count/aggregate explain output"""
+    planner = explain.get('queryPlanner')
+    if planner:
+        plan = planner.get('winningPlan', {})
+        # Slot-based engine (MongoDB 7+) nests the classic tree under queryPlan
+        yield plan.get('queryPlan', plan)
+    for stage in explain.get('stages', []):
+        cursor = stage.get('$cursor')
+        if cursor:
+            yield from _winning_plans(cursor)
+    for shard in explain.get('shards', {}).values() if isinstance(explain.get('shards'), dict) else []:
+        yield from _winning_plans(shard)
+
+
+def _stages(plan):
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'outerStage', 'innerStage'):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _stages(child)
+
+
+def bad_stages(explain):
+    """Set of COLLSCAN/SORT stages in the winning plan(s)"""
+    found = set()
+    for plan in _winning_plans(explain):
+        found.update(stage for stage in _stages(plan) if stage in BAD_STAGES)
+    return found
+
+
+def command_target(command_name, command):
+    """(collection, filter, sort) for a captured command"""
+    collection = command.get(command_name)
+    if command_name == 'aggregate':
+        match = next((stage['$match'] for stage in command.get('pipeline', []) if '$match' in stage), {})
+        sort = next((stage['$sort'] for stage in command.get('pipeline', []) if '$sort' in stage), {})
+        return collection, match, sort
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates') or command.get('deletes') or [{}]
+        return collection, statements[0].get('q', {}), {}
+    return collection, command.get('filter', command.get('query', {})), command.get('sort', {})
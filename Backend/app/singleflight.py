@@ -0,0 +1,160 @@
+"""
+Single-flight: concurrent identical reads share one fetch.
+
+``coalesce(key, fetch)`` runs ``fetch`` once per ``key`` at a time. Threads
+of this process asking for the same key while it is in flight wait for that
+call and get its result (or its exception) instead of sending the same
+query to MongoDB again. Nothing is kept once the call returns: this bounds a
+cold-cache herd to one query per key, it is not a cache.
+
+Keys name the query, e.g. ``time-slots:2025-03-14``. The result is handed
+to every waiter, so it must be treated as read-only (views serialize it).
+
+With ``SINGLEFLIGHT_SHARED = True`` the in-process leader also takes a
+lease in the ``singleflight`` collection, so one worker fetches for all of
+them: the others poll the lease until the result is written there and run
+``fetch`` themselves if the lease holder fails or its lease runs out. A
+result that can't be stored as BSON is only shared within its process: the
+leader drops its lease, so the other workers fetch for themselves.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson.errors import BSONError
+from django.conf import settings
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from .mongo_models import FlightLease
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.02
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_calls = {}
+_lock = threading.Lock()
+stats = {'fetched': 0, 'shared': 0, 'remote': 0}  # this process, for diagnostics
+
+
+def coalesce(key, fetch, shared=None):
+    """
+    ``fetch()``, or the result of an identical call already in flight
+    (across workers too with ``shared``, by default SINGLEFLIGHT_SHARED)
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+        else:
+            stats['shared'] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    try:
+        if shared is None:
+            shared = shared_enabled()
+        call.value = _shared_fetch(key, fetch) if shared else _fetch(fetch)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
+    return call.value
+
+
+def _fetch(fetch):
+    with _lock:
+        stats['fetched'] += 1
+    return fetch()
+
+
+def shared_enabled():
+    return getattr(settings, 'SINGLEFLIGHT_SHARED', False)
+
+
+def lease_seconds():
+    return getattr(settings, 'SINGLEFLIGHT_LEASE_SECONDS', 10)
+
+
+_owner_prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _acquire(collection, key, owner, now):
+    """The lease document if we now hold it, or the one in flight elsewhere"""
+    try:
+        return collection.find_one_and_update(
+            # Free: a finished fetch (its result is only for the callers that waited on it) or a dead holder
+            {'_id': key, '$or': [{'done': True}, {'expires_at': {'$lt': now}}]},
+            {'$set': {'owner': owner, 'done': False, 'expires_at': now + timedelta(seconds=lease_seconds())},
+             '$unset': {'result': ''}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Held and not expired: the upsert's insert collided with it
+        return collection.find_one({'_id': key}, {'result': 0})
+
+
+def _shared_fetch(key, fetch):
+    collection = FlightLease._get_collection()
+    owner = f'{_owner_prefix}:{uuid.uuid4().hex[:8]}'
+    try:
+        lease = _acquire(collection, key, owner, datetime.utcnow())
+    except PyMongoError:
+        logger.warning("Single-flight lease for %s unavailable; fetching locally", key, exc_info=True)
+        return _fetch(fetch)
+
+    if lease is None or lease['owner'] == owner:
+        try:
+            value = _fetch(fetch)
+        except Exception:
+            collection.delete_one({'_id': key, 'owner': owner})
+            raise
+        try:
+            # Waiters poll for a moment at most; the TTL monitor removes the rest
+            collection.update_one(
+                {'_id': key, 'owner': owner},
+                {'$set': {'done': True, 'result': {'value': value},
+                          'expires_at': datetime.utcnow() + timedelta(seconds=lease_seconds())}},
+            )
+        except (PyMongoError, BSONError):
+            # Not shareable (e.g. not BSON): dropping the lease sends waiters to fetch themselves
+            logger.warning("Could not publish single-flight result for %s", key, exc_info=True)
+            collection.delete_one({'_id': key, 'owner': owner})
+        return value
+
+    holder = lease['owner']
+    deadline = lease['expires_at']
+    while datetime.utcnow() < deadline:
+        time.sleep(POLL_SECONDS)
+        lease = collection.find_one({'_id': key})
+        if lease is None or lease['owner'] != holder:
+            break  # the holder failed, or its result was already replaced
+        if lease.get('done'):
+            with _lock:
+                stats['remote'] += 1
+            return lease['result']['value']
+    return _fetch(fetch)
@@ -0,0 +1,275 @@
+"""
+Day-bucket slot storage (``SLOT_STORAGE = 'bucket'``).
+
+One ``slot_days`` document per date, ``_id`` ``YYYY-MM-DD``, embeds that
+day's slots as a compact array::
+
+    {'_id': '2025-03-14', 'date': ..., 'slots': [
+        {'key': '0800-0900', 'start': '08:00', 'end': '09:00', 'capacity': 10, 'booked': 3}, ...]}
+
+A day's availability is one point read on ``_id`` and a month one range
+scan, with no per-slot documents to fetch or hydrate. Days nobody has booked
+have no bucket and are served from the schedule template; the bucket is
+upserted from the template on the first hold. Slots keep the template ids
+(``v:YYYY-MM-DD:HHMM-HHMM``), and booking is a conditional positional
+``$inc`` with an array filter.
+
+``migrate_timeslots`` converts between this layout and TimeSlot documents.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from pymongo import ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+
+from .mongo_models import Booking, SlotDay, SlotHold, TimeSlot
+from .slot_templates import active_schedule, parse_virtual_slot_id
+
+
+class BucketTimeSlot:
+    """Read-only stand-in for a TimeSlot, for serialize_time_slot and apply_holds"""
+
+    __slots__ = ('id', 'date', 'start_time', 'end_time', 'max_patients', 'unlimited_patients',
+                 'available_slots', 'booked_slots', 'available', 'created_at')
+
+    def __init__(self, day, slot, created_at=None):
+        self.id = None
+        self.date = day
+        self.start_time = datetime.combine(day, datetime.strptime(slot['start'], '%H:%M').time())
+        self.end_time = datetime.combine(day, datetime.strptime(slot['end'], '%H:%M').time())
+        self.max_patients = slot['capacity']
+        self.unlimited_patients = False
+        self.booked_slots = slot.get('booked', 0)
+        self.available_slots = max(0, self.max_patients - self.booked_slots)
+        self.available = self.available_slots > 0
+        self.created_at = created_at
+
+    @property
+    def virtual_id(self):
+        return f"v:{self.date.isoformat()}:{self.start_time:%H%M}-{self.end_time:%H%M}"
+
+    api_id = virtual_id
+
+
+def bucket_slots_enabled():
+    return getattr(settings, 'SLOT_STORAGE', 'virtual') == 'bucket'
+
+
+def bucket_id(day):
+    return day.isoformat()
+
+
+def template_bucket(day, schedule=None):
+    """The bucket document a day starts out as"""
+    return {
+        '_id': bucket_id(day),
+        'date': datetime.combine(day, time.min),
+        'slots': [
+            {'key': f'{start:%H%M}-{end:%H%M}', 'start': f'{start:%H:%M}', 'end': f'{end:%H:%M}',
+             'capacity': capacity, 'booked': 0}
+            for start, end, capacity in (schedule or active_schedule()).slots_for(day)
+        ],
+        'created_at': datetime.utcnow(),
+    }
+
+
+def bucket_time_slots(document, available_only=True):
+    day = document['date'].date() if isinstance(document['date'], datetime) else document['date']
+    slots = [BucketTimeSlot(day, slot, document.get('created_at')) for slot in document['slots']]
+    return [slot for slot in slots if slot.available] if available_only else slots
+
+
+def day_slots(target_date, available_only=True):
+    """Slots of one day: one point read, the template if the day has no bucket"""
+    document = SlotDay._get_collection().find_one({'_id': bucket_id(target_date)})
+    return bucket_time_slots(document or template_bucket(target_date), available_only)
+
+
+def range_slots(start, end, available_only=True):
+    """{date: slots} for ``start <= date < end`` from a single range scan on _id"""
+    stored = {
+        document['_id']: document
+        for document in SlotDay._get_collection().find({'_id': {'$gte': bucket_id(start), '$lt': bucket_id(end)}})
+    }
+    schedule = active_schedule()
+    days = {}
+    day = start
+    while day < end:
+        document = stored.get(bucket_id(day)) or template_bucket(day, schedule)
+        days[day] = bucket_time_slots(document, available_only)
+        day += timedelta(days=1)
+    return days
+
+
+def _locate(slot_id):
+    """(day, slot key) of a v:... id, or None"""
+    times = parse_virtual_slot_id(slot_id)
+    if times is None:
+        return None
+    start, end = times
+    return start.date(), f'{start:%H%M}-{end:%H%M}'
+
+
+def ensure_bucket(day):
+    """The day's bucket, inserted from the template if it doesn't exist yet"""
+    template = template_bucket(day)
+    return SlotDay._get_collection().find_one_and_update(
+        {'_id': template['_id']},
+        {'$setOnInsert': {key: value for key, value in template.items() if key != '_id'}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def bucket_counters(slot_id):
+    """(capacity, booked) of a bucket slot, creating the day's bucket; None if there is no such slot"""
+    located = _locate(slot_id)
+    if located is None:
+        return None
+    day, key = located
+    document = SlotDay._get_collection().find_one({'_id': bucket_id(day)}) or ensure_bucket(day)
+    slot = next((slot for slot in document['slots'] if slot['key'] == key), None)
+    return (slot['capacity'], slot['booked']) if slot else None
+
+
+def book_bucket_seats(slot_id, seats):
+    """
+    Add ``seats`` to a slot's booked counter unless that would exceed its
+    capacity; returns the updated BucketTimeSlot, or None if it is full
+    """
+    located = _locate(slot_id)
+    if located is None:
+        return None
+    day, key = located
+    counters = bucket_counters(slot_id)
+    if counters is None:
+        return None
+    capacity = counters[0]
+    document = SlotDay._get_collection().find_one_and_update(
+        {'_id': bucket_id(day),
+         'slots': {'$elemMatch': {'key': key, 'capacity': capacity, 'booked': {'$lte': capacity - seats}}}},
+        {'$inc': {'slots.$[slot].booked': seats}},
+        array_filters=[{'slot.key': key}],
+        return_document=ReturnDocument.AFTER,
+    )
+    if document is None:
+        return None
+    slot = next(slot for slot in document['slots'] if slot['key'] == key)
+    return BucketTimeSlot(day, slot, document.get('created_at'))
+
+
+# Migration between layouts (manage.py migrate_timeslots). Neither direction
+# deletes the source documents, so switching SLOT_STORAGE back is a re-run.
+
+def _slot_id(start, end):
+    return f'v:{start:%Y-%m-%d}:{start:%H%M}-{end:%H%M}'
+
+
+def buckets_from_slots(batch_size=500):
+    """
+    Write a bucket per date that has TimeSlot documents (replacing an
+    existing bucket) and repoint bookings and holds to the v:... ids.
+    Yields (days, slots) after every batch of days.
+    """
+    days = TimeSlot._get_collection().aggregate([
+        {'$sort': {'date': 1, 'start_time': 1}},
+        {'$group': {'_id': '$date', 'slots': {'$push': {
+            '_id': '$_id', 'start_time': '$start_time', 'end_time': '$end_time',
+            'max_patients': '$max_patients', 'booked_slots': '$booked_slots',
+        }}}},
+        {'$sort': {'_id': 1}},
+    ], allowDiskUse=True)
+
+    buckets, repoints, migrated_days, migrated_slots = [], [], 0, 0
+
+    def flush():
+        if buckets:
+            SlotDay._get_collection().bulk_write(buckets, ordered=False)
+        if repoints:
+            Booking._get_collection().bulk_write([booking for booking, _ in repoints], ordered=False)
+            SlotHold._get_collection().bulk_write([hold for _, hold in repoints], ordered=False)
+        buckets.clear()
+        repoints.clear()
+
+    for day in days:
+        slots = []
+        for slot in day['slots']:
+            start, end, key = slot['start_time'], slot['end_time'], _slot_id(slot['start_time'], slot['end_time'])
+            booked = slot.get('booked_slots') or 0
+            slots.append({
+                'key': f'{start:%H%M}-{end:%H%M}', 'start': f'{start:%H:%M}', 'end': f'{end:%H:%M}',
+                # Buckets have no unlimited slots: such a slot keeps what it has booked as its floor
+                'capacity': max(slot.get('max_patients') or 0, booked, 1), 'booked': booked,
+            })
+            repoints.append((
+                UpdateMany({'time_slot': slot['_id']}, {'$set': {'time_slot_key': key}}),
+                UpdateMany({'slot_id': str(slot['_id'])}, {'$set': {'slot_id': key}}),
+            ))
+        buckets.append(ReplaceOne(
+            {'_id': bucket_id(day['_id'].date())},
+            {'date': day['_id'], 'slots': slots, 'created_at': datetime.utcnow()},
+            upsert=True,
+        ))
+        migrated_days += 1
+        migrated_slots += len(slots)
+        if len(buckets) >= batch_size:
+            flush()
+            yield migrated_days, migrated_slots
+    flush()
+    yield migrated_days, migrated_slots
+
+
+def slots_from_buckets(batch_size=500):
+    """
+    Upsert a TimeSlot per bucket slot with the bucket's counters and repoint
+    bookings and holds from the v:... ids to the documents.
+    Yields (days, slots) after every batch of days.
+    """
+    slots_collection = TimeSlot._get_collection()
+    batch, migrated_days, migrated_slots = [], 0, 0
+
+    def flush():
+        upserts, keys = [], []
+        for document in batch:
+            for slot in bucket_time_slots(document, available_only=False):
+                keys.append(slot.api_id)
+                upserts.append(UpdateOne(
+                    {'date': document['date'], 'start_time': slot.start_time, 'end_time': slot.end_time},
+                    {'$set': {'max_patients': slot.max_patients, 'booked_slots': slot.booked_slots,
+                              'available_slots': slot.available_slots, 'available': slot.available},
+                     '$setOnInsert': {'unlimited_patients': False, 'created_at': datetime.utcnow()}},
+                    upsert=True,
+                ))
+        if not upserts:
+            batch.clear()
+            return 0
+        slots_collection.bulk_write(upserts, ordered=False)
+        ids = {
+            _slot_id(slot['start_time'], slot['end_time']): slot['_id']
+            for slot in slots_collection.find(
+                {'date': {'$in': [document['date'] for document in batch]}}, {'start_time': 1, 'end_time': 1}
+            )
+        }
+        repointed = [(key, ids[key]) for key in keys if key in ids]
+        if not repointed:
+            batch.clear()
+            return len(upserts)
+        Booking._get_collection().bulk_write(
+            [UpdateMany({'time_slot_key': key}, {'$set': {'time_slot': oid}}) for key, oid in repointed],
+            ordered=False,
+        )
+        SlotHold._get_collection().bulk_write(
+            [UpdateMany({'slot_id': key}, {'$set': {'slot_id': str(oid)}}) for key, oid in repointed],
+            ordered=False,
+        )
+        batch.clear()
+        return len(upserts)
+
+    for document in SlotDay._get_collection().find().sort('_id', 1):
+        batch.append(document)
+        migrated_days += 1
+        if len(batch) >= batch_size:
+            migrated_slots += flush()
+            yield migrated_days, migrated_slots
+    migrated_slots += flush()
+    yield migrated_days, migrated_slots
@@ -0,0 +1,301 @@
+"""
+Live slot availability for Server-Sent Events subscribers.
+
+Each date somebody is watching has one ``DateFeed`` on the server's event
+loop. The feed holds the serialized slots last sent and, when poked,
+re-reads the day once (``time_slot_data``, so it shares the read with any
+concurrent poll) and broadcasts only the slots that changed as a ``delta``
+event. One read and one pre-encoded message per change serve every
+subscriber of the date, however many there are; an idle subscriber costs a
+queue and a connection.
+
+Feeds are poked by:
+
+* the booking path in this process: ``slot_changed`` from slot_holds.py on
+  holds, confirmations and releases;
+* MongoDB change streams on ``timeslots``, ``slot_days`` and
+  ``slot_holds``, which also carry other workers' bookings
+  (``SLOT_EVENTS_CHANGE_STREAMS``: 'auto' uses them when the deployment is a
+  replica set, as on Atlas);
+* a resync every ``SLOT_EVENTS_RESYNC_SECONDS``, which catches holds expired
+  by the TTL monitor and, without change streams, other workers' writes.
+
+A slot taking its first seat in virtual mode changes id (``v:...`` to its
+ObjectId): the delta lists the new slot and the old id under ``removed``.
+
+Only bookable days can be watched, today through ``SLOT_HORIZON_DAYS``
+ahead, so clients can't open an unbounded number of feeds.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .mongo_models import SlotDay, SlotHold, TimeSlot
+from .slot_horizon import horizon_days
+from .slot_templates import parse_virtual_slot_id
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = 0.1  # fold a burst of bookings into one read
+SUBSCRIBER_BUFFER = 32  # events a slow client may fall behind before it is disconnected
+RETRY_MS = 3000  # EventSource reconnect delay
+
+_feeds = {}  # (event loop, date) -> DateFeed
+_feeds_lock = threading.Lock()
+
+
+def resync_seconds():
+    return getattr(settings, 'SLOT_EVENTS_RESYNC_SECONDS', 30)
+
+
+def keepalive_seconds():
+    return getattr(settings, 'SLOT_EVENTS_KEEPALIVE_SECONDS', 15)
+
+
+def encode(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def _same(old, new):
+    # Template slots nobody has booked are re-created, with a new created_at, on every read
+    return old is not None and {**old, 'created_at': None} == {**new, 'created_at': None}
+
+
+class Subscriber:
+    __slots__ = ('feed', 'queue', 'overflowed')
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class DateFeed:
+    """Subscribers of one date and the slots they were last sent"""
+
+    def __init__(self, day, loop):
+        self.day = day
+        self.loop = loop
+        self.subscribers = set()
+        self.snapshot = None  # {slot id: serialized slot}
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.task = None
+
+    def poke(self):
+        """Schedule a re-read; safe from any thread"""
+        self.loop.call_soon_threadsafe(self.changed.set)
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            with _feeds_lock:
+                if _feeds.get((self.loop, self.day)) is self:
+                    del _feeds[(self.loop, self.day)]
+            if self.task is not None:
+                self.task.cancel()
+
+    async def _read(self):
+        from .mongo_views import time_slot_data_or_stale  # mongo_views imports slot_holds, which imports us
+
+        # While MongoDB is unavailable the last good slots stand in, so subscribers see no changes
+        slots, _ = await sync_to_async(time_slot_data_or_stale, thread_sensitive=False)(self.day)
+        return {slot['id']: slot for slot in slots}
+
+    async def run(self):
+        try:
+            self.snapshot = await self._read()
+        except Exception:
+            logger.exception("Reading slots of %s for subscribers failed", self.day)
+            self.snapshot = {}
+        self.ready.set()
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self.changed.wait(), resync_seconds())
+                await asyncio.sleep(DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+            try:
+                current = await self._read()
+            except Exception:
+                logger.exception("Reading slots of %s for subscribers failed", self.day)
+                continue
+            changed = [slot for slot_id, slot in current.items() if not _same(self.snapshot.get(slot_id), slot)]
+            removed = [slot_id for slot_id in self.snapshot if slot_id not in current]
+            self.snapshot = current
+            if changed or removed:
+                self.broadcast(encode('delta', {'date': self.day.isoformat(), 'slots': changed, 'removed': removed}))
+
+    def broadcast(self, message):
+        for subscriber in self.subscribers:
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # It reconnects and starts over from a fresh snapshot
+                subscriber.overflowed = True
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+
+
+def watchable(day):
+    """True for the days a feed may be opened for: today through the slot horizon"""
+    today = date.today()
+    return today <= day < today + timedelta(days=horizon_days())
+
+
+def subscribe(day):
+    """A Subscriber to ``day``'s feed (call from the event loop; wait on ``feed.ready`` for the snapshot)"""
+    if not watchable(day):
+        raise ValueError(f'{day} is outside the bookable horizon')
+    loop = asyncio.get_running_loop()
+    with _feeds_lock:
+        feed = _feeds.get((loop, day))
+        if feed is None:
+            feed = _feeds[(loop, day)] = DateFeed(day, loop)
+    subscriber = Subscriber(feed)
+    feed.subscribers.add(subscriber)
+    if feed.task is None:
+        feed.task = loop.create_task(feed.run())
+        start_change_stream()
+    return subscriber
+
+
+async def stream(day):
+    """The SSE body for one client: a snapshot, then deltas and keepalives"""
+    subscriber = subscribe(day)
+    try:
+        await subscriber.feed.ready.wait()
+        yield f'retry: {RETRY_MS}\n\n'
+        yield encode('snapshot', {'date': day.isoformat(), 'slots': list(subscriber.feed.snapshot.values())})
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), keepalive_seconds())
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        subscriber.close()
+
+
+def subscriber_counts():
+    """{date: subscribers} in this process"""
+    with _feeds_lock:
+        feeds = list(_feeds.values())
+    counts = {}
+    for feed in feeds:
+        counts[feed.day.isoformat()] = counts.get(feed.day.isoformat(), 0) + len(feed.subscribers)
+    return counts
+
+
+def day_changed(day):
+    """Poke the feeds of ``day``; cheap when nobody watches it"""
+    with _feeds_lock:
+        feeds = [feed for (_, feed_day), feed in _feeds.items() if feed_day == day]
+    for feed in feeds:
+        feed.poke()
+
+
+def slot_day(slot_id):
+    times = parse_virtual_slot_id(slot_id)
+    if times is not None:
+        return times[0].date()
+    try:
+        slot = TimeSlot._get_collection().find_one({'_id': ObjectId(slot_id)}, {'date': 1})
+    except (InvalidId, TypeError):
+        return None
+    return slot['date'].date() if slot else None
+
+
+def slot_changed(slot_id, day=None):
+    """Called by the booking path after a slot's seats change"""
+    with _feeds_lock:
+        if not _feeds:
+            return
+    day = day or slot_day(slot_id)
+    if day is not None:
+        day_changed(day)
+
+
+# Change streams: one watcher thread per process
+
+_watcher = {'thread': None}
+
+
+def change_streams_mode():
+    return getattr(settings, 'SLOT_EVENTS_CHANGE_STREAMS', 'auto')
+
+
+def start_change_stream():
+    if change_streams_mode() == 'off':
+        return
+    with _feeds_lock:
+        if _watcher['thread'] is not None:
+            return
+        _watcher['thread'] = threading.Thread(target=_watch, name='slot-change-stream', daemon=True)
+    _watcher['thread'].start()
+
+
+def _change_day(change):
+    collection = change['ns']['coll']
+    document = change.get('fullDocument') or {}
+    if collection == SlotDay._get_collection_name():
+        return date.fromisoformat(change['documentKey']['_id'])
+    if collection == TimeSlot._get_collection_name() and document.get('date'):
+        return document['date'].date()
+    if collection == SlotHold._get_collection_name() and document.get('slot_id'):
+        # Deleted holds carry no slot id; confirmations also update the slot
+        return slot_day(document['slot_id'])
+    return None
+
+
+def _watch():
+    database = TimeSlot._get_collection().database
+    pipeline = [{'$match': {
+        'ns.coll': {'$in': [TimeSlot._get_collection_name(), SlotDay._get_collection_name(),
+                            SlotHold._get_collection_name()]},
+        'operationType': {'$in': ['insert', 'update', 'replace']},
+    }}]
+    resume_after, delay = None, 1.0
+    while True:
+        try:
+            with database.watch(pipeline, full_document='updateLookup', resume_after=resume_after) as changes:
+                logger.info("Watching slot changes for live availability")
+                delay = 1.0
+                for change in changes:
+                    resume_after = changes.resume_token
+                    day = _change_day(change)
+                    if day is not None:
+                        day_changed(day)
+        except OperationFailure as e:
+            if e.code in (40573, 40324):  # not a replica set / change streams unsupported
+                level = logging.WARNING if change_streams_mode() == 'on' else logging.INFO
+                logger.log(level, "Change streams unavailable (%s); live availability relies on "
+                                  "this process's bookings and periodic resyncs", e)
+                return
+            logger.warning("Slot change stream failed; retrying in %.0fs", delay, exc_info=True)
+        except PyMongoError:
+            logger.warning("Slot change stream failed; retrying in %.0fs", delay, exc_info=True)
+        except Exception:
+            logger.exception("Slot change stream stopped")
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, 60.0)
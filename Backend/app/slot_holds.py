@@ -0,0 +1,310 @@
+"""
+Temporary seat holds on time slots.
+
+Choosing a slot inserts a ``SlotHold`` that expires after
+``SLOT_HOLD_TTL_SECONDS``; paying for it confirms the hold, which moves the
+seat into the slot's ``booked_slots``. Abandoned checkouts need no cleanup:
+the TTL index deletes expired holds, and every read filters on
+``expires_at > now`` because the TTL monitor only runs once a minute.
+
+Capacity is enforced without transactions:
+
+* ``hold_seats`` inserts first, then checks ``booked + all active holds``
+  against capacity and withdraws its own hold if that's exceeded. Two racing
+  holds for the last seat can both be refused, never both granted.
+* ``confirm_hold`` deletes the hold and increments the counters with a
+  conditional update that can't push ``booked_slots`` past ``max_patients``.
+
+Availability reads subtract ``held_seats`` from ``available_slots``, and
+every change pokes live subscribers of the slot's date (slot_events.py). Holds
+accept the ``v:...`` ids of template slots (slot_templates.py); in bucket
+mode (slot_buckets.py) they keep that id and count against the day bucket.
+
+Each hold belongs to whoever created it: the signed-in user, or else the
+bearer of the ``hold_token`` returned once on creation. Reading, releasing,
+paying for or confirming a hold takes the same proof (``request_hold_owners``).
+An owner, and a client IP (anonymous owners are free to mint), may have at
+most ``SLOT_HOLD_MAX_ACTIVE`` active holds, so nobody can sit on every seat.
+"""
+
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .mongo_models import SlotHold, TimeSlot
+from .slot_buckets import book_bucket_seats, bucket_counters, bucket_slots_enabled
+from .slot_events import slot_changed
+from .slot_templates import materialize_slot, parse_virtual_slot_id
+
+
+class HoldError(Exception):
+    """Base class; ``status`` is the HTTP status the API answers with"""
+    status = 400
+
+
+class SlotNotFound(HoldError):
+    status = 404
+
+
+class SlotFull(HoldError):
+    status = 409
+
+
+class HoldExpired(HoldError):
+    status = 410
+
+
+class TooManyHolds(HoldError):
+    status = 429
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'SLOT_HOLD_TTL_SECONDS', 600))
+
+
+def max_hold_seats():
+    return getattr(settings, 'SLOT_HOLD_MAX_SEATS', 10)
+
+
+def max_active_holds():
+    return getattr(settings, 'SLOT_HOLD_MAX_ACTIVE', 5)
+
+
+def new_hold_token():
+    """``(token, owner)``: a secret for an anonymous hold's creator and the owner key stored on the hold"""
+    token = secrets.token_urlsafe(24)
+    return token, _token_owner(token)
+
+
+def _token_owner(token):
+    return 'token:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def user_owner(user):
+    return f'user:{user.id}'
+
+
+def request_hold_owners(request, token=None):
+    """Owner keys the request can prove: its user's and its hold token's (``X-Hold-Token`` or ``token``)"""
+    from .mongo_auth import request_user
+
+    owners = []
+    user = request_user(request)
+    if user is not None:
+        owners.append(user_owner(user))
+    token = request.headers.get('X-Hold-Token') or token
+    if token:
+        owners.append(_token_owner(str(token)))
+    return owners
+
+
+def request_client(request):
+    """The client key stored on holds: the request's IP, as DRF's throttles see it"""
+    from rest_framework.throttling import BaseThrottle
+
+    return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+def _owned(query, owners):
+    if owners is not None:
+        query['owner'] = {'$in': list(owners)}
+    return query
+
+
+def _slot_object_id(slot_id):
+    try:
+        return ObjectId(slot_id)
+    except (InvalidId, TypeError):
+        raise SlotNotFound(f'Time slot {slot_id} not found')
+
+
+def held_seats_pipeline(slot_ids, now=None):
+    """Aggregation summing active holds per slot (shared with the async views)"""
+    return [
+        {'$match': {'slot_id': {'$in': [str(s) for s in slot_ids]}, 'expires_at': {'$gt': now or datetime.utcnow()}}},
+        {'$group': {'_id': '$slot_id', 'seats': {'$sum': '$seats'}}},
+    ]
+
+
+def held_seats(slot_ids, now=None):
+    """{slot_id: seats held} for the given slots; slots without holds are absent"""
+    if not slot_ids:
+        return {}
+    rows = SlotHold._get_collection().aggregate(held_seats_pipeline(slot_ids, now))
+    return {row['_id']: row['seats'] for row in rows}
+
+
+def hold_seats(slot_id, seats=1, order_id=None, ttl=None, owner=None, client=None):
+    """Reserve ``seats`` on a slot; returns the SlotHold or raises SlotFull/SlotNotFound/TooManyHolds"""
+    seats = int(seats)
+    if seats < 1:
+        raise HoldError('seats must be at least 1')
+    if seats > max_hold_seats():
+        raise HoldError(f'At most {max_hold_seats()} seats can be held at once')
+    _check_active_holds(owner, client)
+    if bucket_slots_enabled() and parse_virtual_slot_id(slot_id):
+        return _hold_bucket_seats(slot_id, seats, order_id, ttl, owner, client)
+    # A template slot gets its document now, when its first seat is taken
+    slot_id = materialize_slot(slot_id) or slot_id
+    slot = TimeSlot._get_collection().find_one(
+        {'_id': _slot_object_id(slot_id)},
+        {'date': 1, 'max_patients': 1, 'unlimited_patients': 1, 'booked_slots': 1},
+    )
+    if slot is None:
+        raise SlotNotFound(f'Time slot {slot_id} not found')
+
+    now = datetime.utcnow()
+    hold = SlotHold(slot_id=str(slot_id), seats=seats, order_id=order_id, owner=owner, client=client,
+                    created_at=now, expires_at=now + (ttl or hold_ttl()))
+    hold.save()
+    if not slot.get('unlimited_patients'):
+        # Re-read after our insert so a concurrent booking or hold is counted
+        booked = TimeSlot._get_collection().find_one({'_id': slot['_id']}, {'booked_slots': 1})['booked_slots']
+        _check_capacity(hold, slot.get('max_patients') or 0, booked, now)
+    slot_changed(hold.slot_id, slot['date'].date())
+    return hold
+
+
+def _hold_bucket_seats(slot_id, seats, order_id, ttl, owner, client):
+    """hold_seats for a slot in a day bucket; the hold keeps the v:... id"""
+    counters = bucket_counters(slot_id)
+    if counters is None:
+        raise SlotNotFound(f'Time slot {slot_id} not found')
+
+    now = datetime.utcnow()
+    hold = SlotHold(slot_id=slot_id, seats=seats, order_id=order_id, owner=owner, client=client,
+                    created_at=now, expires_at=now + (ttl or hold_ttl()))
+    hold.save()
+    capacity, booked = bucket_counters(slot_id)
+    _check_capacity(hold, capacity, booked, now)
+    slot_changed(slot_id)
+    return hold
+
+
+def _check_active_holds(owner, client):
+    """Raise TooManyHolds if ``owner`` or ``client`` already has SLOT_HOLD_MAX_ACTIVE active holds"""
+    limit = max_active_holds()
+    now = datetime.utcnow()
+    for key, value in (('owner', owner), ('client', client)):
+        if value and SlotHold._get_collection().count_documents(
+            {key: value, 'expires_at': {'$gt': now}}, limit=limit,
+        ) >= limit:
+            raise TooManyHolds(f'At most {limit} seat holds can be active at once; complete or release one first')
+
+
+def _check_capacity(hold, capacity, booked, now):
+    """Withdraw ``hold`` and raise SlotFull if booked plus active holds exceed capacity"""
+    held = held_seats([hold.slot_id], now).get(hold.slot_id, 0)
+    if booked + held > capacity:
+        hold.delete()
+        raise SlotFull(f'Only {max(0, capacity - booked - held + hold.seats)} seat(s) left on this slot')
+
+
+def get_active_hold(hold_id, owners=None):
+    """The hold if it is active (and, given ``owners``, belongs to one of them); else None"""
+    try:
+        hold_oid = ObjectId(hold_id)
+    except (InvalidId, TypeError):
+        return None
+    hold = SlotHold._get_collection().find_one(_owned({'_id': hold_oid, 'expires_at': {'$gt': datetime.utcnow()}}, owners))
+    return SlotHold._from_son(hold) if hold else None
+
+
+def attach_order(hold_id, order_id, owners=None, amount=None):
+    """Record the payment order (and its amount in paise) for a hold; False if the hold has expired"""
+    try:
+        hold_oid = ObjectId(hold_id)
+    except (InvalidId, TypeError):
+        return False
+    updated = SlotHold._get_collection().update_one(
+        _owned({'_id': hold_oid, 'expires_at': {'$gt': datetime.utcnow()}}, owners),
+        {'$set': {'order_id': order_id, 'order_amount': amount}},
+    )
+    return bool(updated.matched_count)
+
+
+def release_hold(hold_id, owners=None):
+    """Give the seats back immediately (cancelled checkout); True if a hold was removed"""
+    try:
+        hold_oid = ObjectId(hold_id)
+    except (InvalidId, TypeError):
+        return False
+    hold = SlotHold._get_collection().find_one_and_delete(_owned({'_id': hold_oid}, owners), {'slot_id': 1})
+    if hold is None:
+        return False
+    slot_changed(hold['slot_id'])
+    return True
+
+
+def _book_update(seats):
+    """Pipeline update moving ``seats`` into booked_slots and refreshing availability"""
+    booked = {'$add': ['$booked_slots', seats]}
+    return [{'$set': {
+        'booked_slots': booked,
+        'available_slots': {'$cond': [
+            '$unlimited_patients', None, {'$max': [0, {'$subtract': ['$max_patients', booked]}]},
+        ]},
+        'available': {'$or': ['$unlimited_patients', {'$lt': [booked, '$max_patients']}]},
+    }}]
+
+
+def confirm_hold(hold_id):
+    """
+    Turn an active hold into booked seats; returns the updated TimeSlot
+    (a BucketTimeSlot in bucket mode).
+    Raises HoldExpired if the hold is gone (expired or released).
+    """
+    try:
+        hold_oid = ObjectId(hold_id)
+    except (InvalidId, TypeError):
+        raise HoldExpired('Seat hold not found or expired')
+    hold = SlotHold._get_collection().find_one_and_delete(
+        {'_id': hold_oid, 'expires_at': {'$gt': datetime.utcnow()}}
+    )
+    if hold is None:
+        raise HoldExpired('Seat hold not found or expired')
+
+    seats = hold.get('seats', 1)
+    if parse_virtual_slot_id(hold['slot_id']):
+        # Only bucket mode keeps template ids on holds
+        slot = book_bucket_seats(hold['slot_id'], seats)
+        if slot is None:
+            slot_changed(hold['slot_id'])  # the hold is gone all the same
+            raise SlotFull('Time slot is fully booked')
+        slot_changed(hold['slot_id'], slot.date)
+        return slot
+    slot = TimeSlot._get_collection().find_one_and_update(
+        {
+            '_id': _slot_object_id(hold['slot_id']),
+            '$or': [
+                {'unlimited_patients': True},
+                {'$expr': {'$lte': [{'$add': ['$booked_slots', seats]}, '$max_patients']}},
+            ],
+        },
+        _book_update(seats),
+        return_document=ReturnDocument.AFTER,
+    )
+    if slot is None:
+        slot_changed(hold['slot_id'])  # the hold is gone all the same
+        raise SlotFull('Time slot is fully booked')
+    slot_changed(hold['slot_id'], slot['date'].date())
+    return TimeSlot._from_son(slot)
+
+
+def book_seats(slot_id, seats=1):
+    """Book without a prior hold: a hold that is confirmed straight away"""
+    hold = hold_seats(slot_id, seats, ttl=timedelta(minutes=1))
+    return confirm_hold(hold.id)
+
+
+def apply_holds(slot, held):
+    """Subtract ``held`` seats from a slot's availability (for serialization)"""
+    if held and not slot.unlimited_patients and slot.max_patients:
+        slot.available_slots = max(0, slot.max_patients - slot.booked_slots - held)
+        slot.available = slot.available and slot.available_slots > 0
+    return slot
@@ -0,0 +1,122 @@
+"""
+The rolling horizon of bookable time slots (``SLOT_STORAGE = 'materialized'``).
+
+Slots for the next ``SLOT_HORIZON_DAYS`` days are materialized ahead of time
+from the schedule template by ``maintain_slot_horizon`` (at deploy and then
+periodically), so the availability endpoints only ever read. Every slot is
+an upsert on the unique ``(date, start_time, end_time)`` index with
+``$setOnInsert``: running the maintainer twice, or two instances at once,
+creates each slot exactly once and never touches booked counters. In the
+default virtual mode (slot_templates.py) there is nothing to materialize.
+
+``merge_duplicate_slots`` folds duplicates left by the old create-on-read
+path into the oldest slot, so the unique index can be built. It is a one-off
+migration (``maintain_slot_horizon --once --merge-duplicates``), though safe
+to run concurrently.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .mongo_models import Booking, SlotHold, TimeSlot
+from .slot_templates import active_schedule, slot_document
+
+
+def horizon_days():
+    return getattr(settings, 'SLOT_HORIZON_DAYS', 30)
+
+
+def ensure_days(days):
+    """Upsert the template slots of every day in ``days``; returns the number created"""
+    schedule = active_schedule()
+    operations = [
+        UpdateOne(
+            {'date': datetime.combine(day, time.min), 'start_time': start, 'end_time': end},
+            {'$setOnInsert': slot_document(start, end, capacity)},
+            upsert=True,
+        )
+        for day in days
+        for start, end, capacity in schedule.slots_for(day)
+    ]
+    if not operations:
+        return 0
+    return TimeSlot._get_collection().bulk_write(operations, ordered=False).upserted_count
+
+
+def ensure_horizon(days=None, start=None):
+    """Materialize slots from ``start`` (today) through ``days`` days ahead; returns the number created"""
+    start = start or date.today()
+    return ensure_days(start + timedelta(days=offset) for offset in range(days or horizon_days()))
+
+
+def missing_days(days=None, start=None):
+    """Open days within the horizon that have no slots at all"""
+    start = start or date.today()
+    end = start + timedelta(days=days or horizon_days())
+    present = {
+        value.date() for value in TimeSlot._get_collection().distinct(
+            'date', {'date': {'$gte': datetime.combine(start, time.min), '$lt': datetime.combine(end, time.min)}}
+        )
+    }
+    schedule = active_schedule()
+    return [
+        day for day in (start + timedelta(days=offset) for offset in range((end - start).days))
+        if schedule.is_open(day) and day not in present
+    ]
+
+
+def duplicate_slot_groups():
+    """Yield ``[canonical_id, duplicate_id, ...]`` per (date, start, end) with more than one slot"""
+    pipeline = [
+        {'$sort': {'created_at': 1, '_id': 1}},
+        {'$group': {
+            '_id': {'date': '$date', 'start': '$start_time', 'end': '$end_time'},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1},
+        }},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    for group in TimeSlot._get_collection().aggregate(pipeline, allowDiskUse=True):
+        yield group['ids']
+
+
+def _add_booked(booked):
+    """Pipeline update adding ``booked`` seats to a slot and refreshing its availability"""
+    total = {'$add': ['$booked_slots', booked]}
+    return [{'$set': {
+        'booked_slots': total,
+        'available_slots': {'$cond': [
+            '$unlimited_patients', None, {'$max': [0, {'$subtract': ['$max_patients', total]}]},
+        ]},
+        'available': {'$or': ['$unlimited_patients', {'$lt': [total, '$max_patients']}]},
+    }}]
+
+
+def merge_duplicate_slots(groups):
+    """
+    Keep the oldest slot of each group and fold each duplicate into it:
+    repoint its holds, delete it and add the booked seats of the document
+    that was deleted, then repoint its bookings. Deleting first makes each
+    duplicate's seats count once, even with two merges running, and a seat
+    booked on it until the delete is carried over.
+    Returns (bookings repointed, slots deleted).
+    """
+    slots = TimeSlot._get_collection()
+    holds = SlotHold._get_collection()
+    bookings = Booking._get_collection()
+    repointed = deleted = 0
+    for canonical, *duplicates in groups:
+        for duplicate in duplicates:
+            # New confirmations go to the canonical slot from here on
+            holds.update_many({'slot_id': str(duplicate)}, {'$set': {'slot_id': str(canonical)}})
+            removed = slots.find_one_and_delete({'_id': duplicate}, {'booked_slots': 1})
+            if removed is not None:
+                deleted += 1
+                if removed.get('booked_slots'):
+                    slots.update_one({'_id': canonical}, _add_booked(removed['booked_slots']))
+            repointed += bookings.update_many(
+                {'time_slot': duplicate}, {'$set': {'time_slot': canonical}},
+            ).modified_count
+    return repointed, deleted
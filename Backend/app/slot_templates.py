@@ -0,0 +1,191 @@
+"""
+Virtual time slots generated from a schedule template.
+
+The active ``ScheduleTemplate`` (weekly rules with per-slot capacity, plus
+holidays) defines which slots exist; ``DEFAULT_SCHEDULE`` applies until one
+is stored. With ``SLOT_STORAGE = 'virtual'`` nothing is seeded: a day's
+availability is the template for that day overlaid with the ``TimeSlot``
+documents that exist, which are only the slots somebody has booked or held.
+
+A slot without a document is served with a template id,
+``v:YYYY-MM-DD:HHMM-HHMM``. ``materialize_slot`` turns that id into a stored
+slot the first time a seat is taken, with an upsert on the unique
+``(date, start_time, end_time)`` index so concurrent first bookings share
+one document.
+"""
+
+from datetime import date, datetime, time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .cache_bus import LocalCache, invalidate
+from .mongo_models import ScheduleTemplate, TimeSlot
+
+SLOT_TIMES = [
+    ('08:00', '09:00'), ('09:00', '10:00'), ('10:00', '11:00'), ('11:00', '12:00'),
+    ('14:00', '15:00'), ('15:00', '16:00'), ('16:00', '17:00'), ('17:00', '18:00'),
+]
+CLOSED_WEEKDAYS = {6}  # Sundays
+DEFAULT_MAX_PATIENTS = 10
+
+TEMPLATE_CACHE_SECONDS = 60
+
+
+class Schedule:
+    """Plain, cacheable form of a ScheduleTemplate"""
+
+    def __init__(self, rules, holidays=()):
+        # rules: (weekdays, 'HH:MM', 'HH:MM', capacity)
+        self.rules = [(frozenset(weekdays), start, end, capacity) for weekdays, start, end, capacity in rules]
+        self.holidays = frozenset(holidays)
+
+    @classmethod
+    def from_document(cls, template):
+        return cls(
+            [(rule.weekdays, rule.start, rule.end, rule.capacity) for rule in template.rules],
+            template.holidays,
+        )
+
+    def slots_for(self, day):
+        """[(start datetime, end datetime, capacity)] of ``day``, by start time"""
+        if day in self.holidays:
+            return []
+        slots = {}
+        for weekdays, start, end, capacity in self.rules:
+            if day.weekday() in weekdays:
+                slots[(start, end)] = capacity  # a later rule overrides an earlier one
+        return [
+            (_at(day, start), _at(day, end), capacity)
+            for (start, end), capacity in sorted(slots.items())
+        ]
+
+    def is_open(self, day):
+        return bool(self.slots_for(day))
+
+
+DEFAULT_SCHEDULE = Schedule([
+    ([d for d in range(7) if d not in CLOSED_WEEKDAYS], start, end, DEFAULT_MAX_PATIENTS)
+    for start, end in SLOT_TIMES
+])
+
+SCHEDULE_KEY = 'schedule'
+_schedules = LocalCache(ttl=TEMPLATE_CACHE_SECONDS, max_entries=1)
+
+
+def _at(day, hhmm):
+    return datetime.combine(day, datetime.strptime(hhmm, '%H:%M').time())
+
+
+def virtual_slots_enabled():
+    return getattr(settings, 'SLOT_STORAGE', 'virtual') == 'virtual'
+
+
+def _load_schedule():
+    template = ScheduleTemplate.objects(active=True).order_by('-updated_at').first()
+    return Schedule.from_document(template) if template else DEFAULT_SCHEDULE
+
+
+def active_schedule():
+    """The active template (re-read at most once a minute, or when edited), or DEFAULT_SCHEDULE"""
+    return _schedules.get_or_fetch(SCHEDULE_KEY, _load_schedule)
+
+
+def forget_schedule():
+    """Drop the cached template in every worker (after editing it)"""
+    _schedules.clear()
+    invalidate(SCHEDULE_KEY)
+
+
+def slot_document(start, end, capacity):
+    """A stored slot as a raw document (no ``_id``)"""
+    return {
+        'date': datetime.combine(start.date(), time.min),
+        'start_time': start, 'end_time': end,
+        'max_patients': capacity, 'unlimited_patients': False, 'available_slots': capacity,
+        'booked_slots': 0, 'available': True, 'created_at': datetime.utcnow(),
+    }
+
+
+def day_slots(day, max_patients=DEFAULT_MAX_PATIENTS):
+    """The default layout of a day as raw documents (synthetic data)"""
+    return [slot_document(start, end, max_patients) for start, end, _ in DEFAULT_SCHEDULE.slots_for(day)]
+
+
+def virtual_slot(start, end, capacity):
+    """An unsaved TimeSlot for a template slot nobody has booked"""
+    return TimeSlot(
+        date=start.date(), start_time=start, end_time=end, max_patients=capacity,
+        unlimited_patients=False, available_slots=capacity, booked_slots=0, available=True,
+    )
+
+
+def overlay(target_date, stored, available_only=True):
+    """
+    Template slots of ``target_date`` with stored slots in place of their
+    virtual counterparts (stored slots outside the template are kept)
+    """
+    by_time = {(slot.start_time, slot.end_time): slot for slot in stored}
+    slots = list(stored)
+    for start, end, capacity in active_schedule().slots_for(target_date):
+        if (start, end) not in by_time:
+            slots.append(virtual_slot(start, end, capacity))
+    slots.sort(key=lambda slot: slot.start_time)
+    if available_only:
+        slots = [slot for slot in slots if slot.available]
+    return slots
+
+
+def available_slots(target_date):
+    """Bookable slots of a day, in any storage mode"""
+    from .slot_buckets import bucket_slots_enabled, day_slots as bucket_day_slots
+    if bucket_slots_enabled():
+        return bucket_day_slots(target_date)
+    if not virtual_slots_enabled():
+        return list(TimeSlot.objects.filter(date=target_date, available=True).order_by('start_time'))
+    return overlay(target_date, list(TimeSlot.objects.filter(date=target_date)))
+
+
+def parse_virtual_slot_id(slot_id):
+    """(start, end) of a ``v:YYYY-MM-DD:HHMM-HHMM`` id, or None if it isn't one"""
+    if not isinstance(slot_id, str) or not slot_id.startswith('v:'):
+        return None
+    try:
+        _, day, times = slot_id.split(':')
+        start, end = times.split('-')
+        day = date.fromisoformat(day)
+        return (datetime.combine(day, datetime.strptime(start, '%H%M').time()),
+                datetime.combine(day, datetime.strptime(end, '%H%M').time()))
+    except ValueError:
+        return None
+
+
+def materialize_slot(slot_id):
+    """
+    ObjectId (as a string) of the stored slot for ``slot_id``, creating it
+    from the template for a virtual id. None if the id matches no slot.
+    """
+    times = parse_virtual_slot_id(slot_id)
+    if times is None:
+        try:
+            ObjectId(slot_id)
+        except (InvalidId, TypeError):
+            return None
+        return str(slot_id)
+
+    start, end = times
+    capacity = next(
+        (cap for s, e, cap in active_schedule().slots_for(start.date()) if (s, e) == (start, end)), None
+    )
+    if capacity is None:
+        return None
+    document = TimeSlot._get_collection().find_one_and_update(
+        {'date': datetime.combine(start.date(), time.min), 'start_time': start, 'end_time': end},
+        {'$setOnInsert': slot_document(start, end, capacity)},
+        upsert=True,
+        projection={'_id': 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return str(document['_id'])
@@ -0,0 +1,220 @@
+"""
+Background tasks backed by the MongoDB ``tasks`` collection.
+
+Slow side effects of a request are registered with ``@task`` and queued with
+``function.delay(*args, **kwargs)``: one insert, and the request moves on.
+Arguments must be BSON-serializable (ids as strings, not documents).
+
+The ``run_task_worker`` management command runs ``Worker`` threads that
+claim due tasks with ``findOneAndUpdate`` (so each runs once), execute them
+and record the outcome and duration on the task document. A failed task is
+queued again with exponential backoff until ``max_attempts``, then marked
+``failed``; a task whose worker died is retried once its lease runs out, so
+task functions should be safe to run twice. ``task_metrics`` aggregates
+counts and durations per task.
+
+With ``TASKS_EAGER = True`` (e.g. development without a worker) ``delay``
+runs the task inline instead.
+"""
+
+import importlib
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .mongo_models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+# Modules whose @task functions the worker loads
+TASK_MODULES = ('app.booking_tasks',)
+
+TASKS = {}
+
+
+def task(name=None, max_attempts=5):
+    """Register a task function and give it ``.delay()``"""
+    def decorator(function):
+        task_name = name or f'{function.__module__}.{function.__name__}'
+        TASKS[task_name] = function
+        function.task_name = task_name
+        function.delay = lambda *args, **kwargs: enqueue(task_name, args, kwargs, max_attempts=max_attempts)
+        return function
+    return decorator
+
+
+def load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+    return TASKS
+
+
+def enqueue(name, args=(), kwargs=None, max_attempts=5, countdown=0):
+    """Queue a registered task; returns the task id (None when run eagerly)"""
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name}')
+    if getattr(settings, 'TASKS_EAGER', False):
+        try:
+            TASKS[name](*args, **(kwargs or {}))
+        except Exception:
+            logger.exception("Eager task %s failed", name)
+        return None
+
+    now = datetime.utcnow()
+    return BackgroundTask._get_collection().insert_one({
+        'name': name,
+        'args': list(args),
+        'kwargs': kwargs or {},
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'run_at': now + timedelta(seconds=countdown),
+        'created_at': now,
+    }).inserted_id
+
+
+def backoff(attempts, base=2.0, cap=600.0):
+    """Seconds before retry number ``attempts``: exponential, with jitter"""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+def claim_task(worker, lease=timedelta(minutes=5)):
+    """Take the oldest due task (or one whose worker's lease expired); None if there is none"""
+    now = datetime.utcnow()
+    return BackgroundTask._get_collection().find_one_and_update(
+        {'$or': [
+            {'status': 'queued', 'run_at': {'$lte': now}},
+            {'status': 'running', 'locked_until': {'$lt': now}},
+        ]},
+        {'$set': {'status': 'running', 'worker': worker, 'locked_until': now + lease, 'started_at': now},
+         '$inc': {'attempts': 1}},
+        sort=[('run_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def run_task(document):
+    """Execute a claimed task and record the outcome; returns (succeeded, seconds)"""
+    collection = BackgroundTask._get_collection()
+    owned = {'_id': document['_id'], 'worker': document['worker']}
+    function = TASKS.get(document['name'])
+    started = time.perf_counter()
+    try:
+        if function is None:
+            raise LookupError(f"Unknown task {document['name']}")
+        function(*document.get('args', []), **document.get('kwargs', {}))
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        attempts = document.get('attempts', 1)
+        now = datetime.utcnow()
+        update = {'last_error': f'{type(e).__name__}: {e}', 'duration_ms': seconds * 1000}
+        if function is None or attempts >= document.get('max_attempts', 5):
+            logger.exception("Task %s failed permanently after %d attempt(s)", document['name'], attempts)
+            update.update(status='failed', finished_at=now)
+        else:
+            delay = backoff(attempts)
+            logger.warning("Task %s failed (attempt %d), retrying in %.0fs: %s",
+                           document['name'], attempts, delay, e)
+            update.update(status='queued', run_at=now + timedelta(seconds=delay))
+        collection.update_one(owned, {'$set': update, '$unset': {'locked_until': ''}})
+        return False, seconds
+
+    seconds = time.perf_counter() - started
+    collection.update_one(owned, {
+        '$set': {'status': 'done', 'finished_at': datetime.utcnow(), 'duration_ms': seconds * 1000},
+        '$unset': {'locked_until': ''},
+    })
+    return True, seconds
+
+
+class Worker:
+    """``threads`` threads claiming and running tasks until ``stop()``"""
+
+    def __init__(self, threads=4, poll_interval=1.0, lease=timedelta(minutes=5)):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.metrics = {}  # task name -> counters for this process
+
+    def stop(self):
+        self._stop.set()
+
+    def _record(self, name, succeeded, seconds):
+        with self._lock:
+            row = self.metrics.setdefault(name, {'runs': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            row['runs'] += 1
+            row['failures'] += not succeeded
+            row['total_ms'] += seconds * 1000
+            row['max_ms'] = max(row['max_ms'], seconds * 1000)
+
+    def _loop(self, index, once):
+        worker = f'{self.name}:{index}'
+        while not self._stop.is_set():
+            try:
+                document = claim_task(worker, self.lease)
+            except Exception:
+                logger.exception("Claiming a task failed")
+                self._stop.wait(self.poll_interval)
+                continue
+            if document is None:
+                if once:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            succeeded, seconds = run_task(document)
+            self._record(document['name'], succeeded, seconds)
+
+    def run(self, once=False):
+        """Block until stopped (or, with ``once``, until no task is due)"""
+        load_tasks()
+        threads = [
+            threading.Thread(target=self._loop, args=(index, once), name=f'task-worker-{index}', daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+
+def task_metrics(since=None):
+    """Per task and status: count, average/max duration and average attempts"""
+    match = {'created_at': {'$gte': since}} if since else {}
+    rows = BackgroundTask._get_collection().aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {'name': '$name', 'status': '$status'},
+            'count': {'$sum': 1},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'avg_attempts': {'$avg': '$attempts'},
+        }},
+        {'$sort': {'_id.name': 1, '_id.status': 1}},
+    ])
+    return [
+        {
+            'task': row['_id']['name'],
+            'status': row['_id']['status'],
+            'count': row['count'],
+            'avg_ms': round(row['avg_ms'], 2) if row['avg_ms'] is not None else None,
+            'max_ms': round(row['max_ms'], 2) if row['max_ms'] is not None else None,
+            'avg_attempts': round(row['avg_attempts'], 2),
+        }
+        for row in rows
+    ]
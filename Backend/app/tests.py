@@ -1,3 +1,783 @@
-from django.test import TestCase
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from mongoengine.connection import get_db
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
+
+from benchmarks.fake_gateway import start_in_thread
+
+from .cache_backends import TwoTierCache
+from .cache_bus import CacheBus, LocalCache
+from . import degraded, offline_journal
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from .logging_utils import RedactingFilter
+from .management.commands.ensure_indexes import Command as EnsureIndexesCommand
+from .mongo_connection import use_database
+from .mongo_models import (
+    BackgroundTask, Booking, CacheInvalidation, Patient, PaymentEvent, SlotHold, TimeSlot,
+)
+from .patient_identity import resolve_patient
+from .payment_events import claim_batch, enqueue_event, process_batch
+from .payment_gateway import TRANSIENT_ERRORS, GatewayError, GatewayUnavailable, PaymentGateway
+from .slot_holds import (
+    HoldExpired, SlotFull, TooManyHolds, apply_holds, confirm_hold, get_active_hold, held_seats, hold_seats,
+    new_hold_token, release_hold, request_hold_owners,
+)
+from .slot_horizon import duplicate_slot_groups, merge_duplicate_slots
+from .tasks import backoff, claim_task, enqueue, run_task, task
+from .views import RazorpayWebhookView
+
+# A single local mongod for the tests that need MongoDB; they are skipped without one
+MONGO_TEST_URI = os.environ.get('MONGO_TEST_URI', 'mongodb://localhost:27017')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10,
+                                      failure_exceptions=(ConnectionError,), clock=self.clock)
+
+    def fail(self):
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(self.raise_, ConnectionError)
+
+    @staticmethod
+    def raise_(exception):
+        raise exception
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.fail()
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(lambda: 'not called')
+
+    def test_half_open_probe_closes_on_success(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_other_errors_do_not_reset_the_failure_count(self):
+        self.fail()
+        with self.assertRaises(KeyError):
+            self.breaker.call(self.raise_, KeyError)
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_other_errors_free_the_half_open_probe_without_closing(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+        with self.assertRaises(KeyError):
+            self.breaker.call(self.raise_, KeyError)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.snapshot()['consecutive_failures'], 2)
+        # The probe slot is free again; its failure re-opens the circuit
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    """PaymentGateway against benchmarks/fake_gateway.py"""
+
+    def setUp(self):
+        self.server, self.base_url = start_in_thread()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.state = self.server.RequestHandlerClass.state
+
+    def gateway(self, **options):
+        options.setdefault('backoff_base', 0)
+        return PaymentGateway('rzp_test_key', 'secret', base_url=self.base_url, **options)
+
+    def test_creates_order(self):
+        order = self.gateway().create_order(50000)
+        self.assertEqual(order['amount'], 50000)
+        self.assertEqual(self.state.requests, 1)
+
+    def test_retries_server_errors(self):
+        self.state.update(error_rate=1.0)
+        with self.assertRaises(GatewayUnavailable):
+            self.gateway(max_attempts=3).create_order(50000)
+        self.assertEqual(self.state.requests, 3)
+
+    def test_does_not_retry_bad_requests(self):
+        with self.assertRaises(GatewayError) as raised:
+            self.gateway(max_attempts=3).create_order(0)
+        self.assertNotIsInstance(raised.exception, GatewayUnavailable)
+        self.assertEqual(self.state.requests, 1)
+
+    def test_read_timeout(self):
+        self.state.update(latency=2.0)
+        with self.assertRaises(GatewayUnavailable):
+            self.gateway(read_timeout=0.2, max_attempts=1).create_order(50000)
+
+    def test_open_breaker_fails_fast(self):
+        self.state.update(error_rate=1.0)
+        breaker = CircuitBreaker('razorpay', failure_threshold=2, reset_timeout=60,
+                                 failure_exceptions=TRANSIENT_ERRORS)
+        gateway = self.gateway(max_attempts=1, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.create_order(50000)
+        with self.assertRaises(GatewayUnavailable) as raised:
+            gateway.create_order(50000)
+        self.assertIsNotNone(raised.exception.retry_after)
+        self.assertEqual(self.state.requests, 2)
+
+
+class RedactingFilterTests(SimpleTestCase):
+    def record(self, msg, args=(), **extra):
+        record = logging.LogRecord('app', logging.INFO, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        RedactingFilter().filter(record)
+        return record
+
+    def test_redacts_args(self):
+        record = self.record('Booking %s', ({'phone': '9999999999', 'test': 'CBC'},))
+        self.assertEqual(record.args, {'phone': '<redacted>', 'test': 'CBC'})
+
+    def test_redacts_extra_attributes(self):
+        record = self.record('Booking', email='a@example.com', patient={'first_name': 'Asha', 'age': 30})
+        self.assertEqual(record.email, '<redacted>')
+        self.assertEqual(record.patient, {'first_name': '<redacted>', 'age': 30})
+        self.assertEqual(record.levelname, 'INFO')
+
+
+@override_settings(METRICS_TOKEN='s3cret')
+class MetricsAccessTests(SimpleTestCase):
+    def is_client(self, **headers):
+        from .health_views import _is_metrics_client
+        return _is_metrics_client(RequestFactory().get('/', headers=headers))
+
+    def test_metrics_token(self):
+        self.assertTrue(self.is_client(x_metrics_token='s3cret'))
+        self.assertFalse(self.is_client(x_metrics_token='wrong'))
+        self.assertFalse(self.is_client(x_metrics_token='sécret'))
+        self.assertFalse(self.is_client())
+
+
+def database_view(request):
+    pass
+
+
+database_view.__module__ = 'app.mongo_views'
+
+
+class DegradedModeTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(degraded.breaker, '_clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(degraded.breaker.record_success)
+        self.middleware = degraded.DegradedModeMiddleware(lambda request: None)
+        self.factory = RequestFactory()
+        for _ in range(degraded.breaker.failure_threshold):
+            degraded.breaker.record_failure()
+
+    def view(self, request):
+        return self.middleware.process_view(request, database_view, (), {})
+
+    def half_open(self):
+        self.clock.now += degraded.breaker.reset_timeout
+        self.assertEqual(degraded.breaker.state, HALF_OPEN)
+
+    def test_open_circuit_fails_fast(self):
+        self.assertEqual(self.view(self.factory.post('/')).status_code, 503)
+        self.assertTrue(degraded.database_down())
+
+    def test_half_open_lets_one_probe_through(self):
+        self.half_open()
+        probe = self.factory.post('/')
+        self.assertIsNone(self.view(probe))
+        self.assertEqual(self.view(self.factory.post('/')).status_code, 503)
+        self.assertFalse(degraded.database_down(probe))
+        self.assertTrue(degraded.database_down())
+        self.middleware.process_response(probe, JsonResponse({}))
+        self.assertEqual(degraded.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.half_open()
+        probe = self.factory.post('/')
+        self.view(probe)
+        response = self.middleware.process_exception(probe, ConnectionFailure('down'))
+        self.middleware.process_response(probe, response)
+        self.assertEqual(degraded.breaker.state, OPEN)
+
+    def test_async_reads_serve_snapshots(self):
+        degraded.breaker.record_success()
+
+        async def fresh():
+            return ['slot']
+
+        async def failing():
+            raise ConnectionFailure('down')
+
+        async def read(query):
+            return await degraded.read_or_stale_async(
+                'test-key', lambda: degraded.guarded_fetch_async('test-key', query)
+            )
+
+        self.assertEqual(asyncio.run(read(fresh)), (['slot'], None))
+        value, stale_since = asyncio.run(read(failing))
+        self.assertEqual(value, ['slot'])
+        self.assertIsNotNone(stale_since)
+
+
+@override_settings(CACHE_BUS=False)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TwoTierCache('memory', {})
+
+    def test_delete_evicts_local_copy(self):
+        self.cache.set('key', 3, None)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_zero_timeout_evicts_local_copy(self):
+        self.cache.set('key', 3, None)
+        self.cache.set('key', 4, 0)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_delete_many_evicts_local_copies(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.delete_many(['a'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': 2})
+
+
+@override_settings(CACHE_BUS=True, CACHE_BUS_MAX_STALENESS=30)
+class LocalCacheStalenessTests(SimpleTestCase):
+    def setUp(self):
+        self.bus = CacheBus()
+        self.bus.heard_at = time.monotonic()
+        for patcher in (mock.patch('app.cache_bus.bus', self.bus), mock.patch.object(self.bus, 'start')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = LocalCache(ttl=300)
+        self.fetch = mock.Mock(side_effect=[1, 2, 3])
+
+    def test_serves_entries_only_while_the_bus_is_live(self):
+        self.assertEqual([self.cache.get_or_fetch('key', self.fetch) for _ in range(2)], [1, 1])
+        self.bus.heard_at -= 31  # tailer stalled or MongoDB unreachable
+        self.assertEqual([self.cache.get_or_fetch('key', self.fetch) for _ in range(2)], [2, 3])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidation_bumps_the_version(self):
+        self.cache.get_or_fetch('key', self.fetch)
+        self.bus.apply({'_id': ObjectId(), 'keys': ['key']}, tailed=False)
+        self.assertEqual(self.cache.get_or_fetch('key', self.fetch), 2)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class MongoTestCase(SimpleTestCase):
+    """Runs against a scratch database on ``MONGO_TEST_URI``, dropped afterwards"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=500).admin.command('ping')
+        except PyMongoError:
+            raise unittest.SkipTest(f'No MongoDB at {MONGO_TEST_URI}')
+        super().setUpClass()
+        cls.database = f'test_{os.getpid()}'
+        use_database(cls.database, host=MONGO_TEST_URI)
+
+    @classmethod
+    def tearDownClass(cls):
+        get_db().client.drop_database(cls.database)
+        use_database(settings.MONGODB_SETTINGS['db'])
+        super().tearDownClass()
+
+
+class CacheBusTests(MongoTestCase):
+    def setUp(self):
+        # Recreated as a capped collection on first use
+        CacheInvalidation.drop_collection()
+        self.collection = CacheInvalidation._get_collection()
+
+    def tail(self, bus=None):
+        bus = bus or CacheBus()
+        bus.start()
+        self.addCleanup(bus.stop, 5)
+        return bus
+
+    def publish(self, key, when=None):
+        message = {'keys': [key], 'origin': 'test'}
+        if when is not None:
+            # What another host's clock (or the same second) can produce
+            message['_id'] = ObjectId.from_datetime(when)
+        self.collection.insert_one(message)
+        return message['_id']
+
+    def test_applies_messages_with_smaller_ids(self):
+        bus = self.tail()
+        self.assertTrue(wait_for(lambda: bus.positioned))
+        self.publish('a')
+        self.assertTrue(wait_for(lambda: 'a' in bus.versions))
+        older = self.publish('b', datetime(2000, 1, 1))
+        self.assertTrue(wait_for(lambda: 'b' in bus.versions))
+        self.assertEqual(bus.versions['b'], older)
+
+    def test_resumes_after_the_last_tailed_message(self):
+        seen = self.publish('seen')
+        self.publish('missed')
+        self.publish('missed-older', datetime(2000, 1, 1))
+        bus = CacheBus()
+        bus.last_id, bus.positioned = seen, True  # as after a disconnect
+        self.tail(bus)
+        self.assertTrue(wait_for(lambda: {'missed', 'missed-older'} <= set(bus.versions)))
+        self.assertNotIn('seen', bus.versions)
+        self.assertEqual(bus.epoch, 0)
+
+    def test_drops_everything_when_its_position_rolled_off(self):
+        self.publish('a')
+        bus = CacheBus()
+        bus.last_id, bus.positioned = ObjectId(), True  # no longer in the capped collection
+        bus.versions['cached'] = bus.last_id
+        self.tail(bus)
+        self.assertTrue(wait_for(lambda: bus.epoch == 1))
+        self.assertEqual(bus.versions, {})
+
+    def test_starts_at_the_newest_message(self):
+        self.publish('before')
+        bus = self.tail()
+        self.assertTrue(wait_for(lambda: bus.positioned))
+        self.publish('after')
+        self.assertTrue(wait_for(lambda: 'after' in bus.versions))
+        self.assertNotIn('before', bus.versions)
+
+
+class EnsureIndexesTests(MongoTestCase):
+    def setUp(self):
+        Booking.drop_collection()
+        self.collection = Booking._get_collection()
+
+    def ensure_indexes(self, *args):
+        call_command('ensure_indexes', '--collection', self.collection.name, *args, stdout=StringIO())
+
+    def test_failed_rebuild_restores_the_previous_index(self):
+        self.collection.create_index('payment_order_id', name='payment_order_id_1')
+        # Duplicates that turn up after the check, e.g. from instances still on the old release
+        self.collection.insert_many([{'booking_id': 'BK1', 'payment_order_id': 'order_1'},
+                                     {'booking_id': 'BK2', 'payment_order_id': 'order_1'}])
+        with mock.patch.object(EnsureIndexesCommand, '_buildable', return_value=True):
+            with self.assertRaises(CommandError):
+                self.ensure_indexes('--rebuild')
+        indexes = self.collection.index_information()
+        self.assertNotIn('unique', indexes['payment_order_id_1'])
+        # The collection's other missing indexes were built all the same
+        self.assertIn('booking_id_1', indexes)
+
+
+class PatientIdentityTests(MongoTestCase):
+    def setUp(self):
+        Patient.drop_collection()
+        call_command('ensure_indexes', '--collection', Patient._get_collection_name(), stdout=StringIO())
+
+    def test_same_person_resolves_to_one_document(self):
+        first = resolve_patient('Asha', 30, 'F', '98765 43210')
+        again = resolve_patient('asha', 30, 'F', '+91 98765 43210', email='asha@example.com')
+        self.assertEqual(first.id, again.id)
+        self.assertEqual(again.email, 'asha@example.com')
+        self.assertEqual(Patient.objects.count(), 1)
+
+    def test_identity_index_is_unique_for_phones_only(self):
+        resolve_patient('Asha', 30, 'F', '9876543210')
+        with self.assertRaises(DuplicateKeyError):
+            Patient._get_collection().insert_one(
+                {'first_name': 'Asha', 'first_name_lc': 'asha', 'age': 30, 'phone_normalized': '9876543210'}
+            )
+        # Without a phone number nobody is matched, so nobody collides
+        resolve_patient('Rahul', 30, 'M')
+        resolve_patient('Rahul', 30, 'M')
+        self.assertEqual(Patient.objects(first_name='Rahul').count(), 2)
+
+    def test_losing_a_concurrent_upsert_matches_the_winner(self):
+        winner = resolve_patient('Asha', 30, 'F', '9876543210')
+        upsert = Patient._get_collection().find_one_and_update
+        calls = iter([DuplicateKeyError('E11000')])
+
+        def race(*args, **kwargs):
+            error = next(calls, None)
+            if error:
+                raise error
+            return upsert(*args, **kwargs)
+
+        with mock.patch.object(Patient, '_get_collection', return_value=mock.Mock(find_one_and_update=race)):
+            self.assertEqual(resolve_patient('Asha', 30, 'F', '9876543210').id, winner.id)
+
+
+class SlotHoldTests(MongoTestCase):
+    def setUp(self):
+        TimeSlot.drop_collection()
+        SlotHold.drop_collection()
+
+    def slot(self, max_patients=2, booked=0):
+        day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        slot = TimeSlot(date=day, start_time=day.replace(hour=9), end_time=day.replace(hour=10),
+                        unlimited_patients=False, max_patients=max_patients, booked_slots=booked,
+                        available_slots=max_patients - booked)
+        slot.save()
+        return slot
+
+    def booked(self, slot):
+        return TimeSlot._get_collection().find_one({'_id': slot.id})['booked_slots']
+
+    def test_holds_count_against_capacity(self):
+        slot = self.slot(max_patients=2)
+        hold_seats(slot.id, 1)
+        hold_seats(slot.id, 1)
+        with self.assertRaises(SlotFull):
+            hold_seats(slot.id, 1)
+        # The refused hold withdrew itself
+        self.assertEqual(held_seats([slot.id]), {str(slot.id): 2})
+
+    def test_availability_subtracts_active_holds(self):
+        slot = self.slot(max_patients=3, booked=1)
+        hold_seats(slot.id, 1)
+        hold_seats(slot.id, 1, ttl=timedelta(seconds=-1))  # expired, not yet removed by the TTL monitor
+        slot = apply_holds(TimeSlot.objects.get(id=slot.id), held_seats([slot.id]).get(str(slot.id), 0))
+        self.assertEqual(slot.available_slots, 1)
+        self.assertTrue(slot.available)
+
+    def test_confirm_moves_held_seats_into_booked(self):
+        slot = self.slot(max_patients=2)
+        hold = hold_seats(slot.id, 2)
+        confirmed = confirm_hold(hold.id)
+        self.assertEqual((confirmed.booked_slots, confirmed.available_slots, confirmed.available), (2, 0, False))
+        self.assertEqual(held_seats([slot.id]), {})
+        with self.assertRaises(HoldExpired):
+            confirm_hold(hold.id)  # only once
+
+    def test_confirm_never_overbooks(self):
+        slot = self.slot(max_patients=2)
+        hold = hold_seats(slot.id, 1)
+        # Seats booked behind the holds' back (e.g. an offline journal replay)
+        TimeSlot._get_collection().update_one({'_id': slot.id}, {'$set': {'booked_slots': 2}})
+        with self.assertRaises(SlotFull):
+            confirm_hold(hold.id)
+        self.assertEqual(self.booked(slot), 2)
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        slot = self.slot()
+        hold = hold_seats(slot.id, 1, ttl=timedelta(seconds=-1))
+        with self.assertRaises(HoldExpired):
+            confirm_hold(hold.id)
+        self.assertEqual(self.booked(slot), 0)
+
+    def test_only_the_owner_reads_or_releases(self):
+        slot = self.slot()
+        token, owner = new_hold_token()
+        hold = hold_seats(slot.id, 1, owner=owner)
+        _, stranger = new_hold_token()
+        self.assertIsNone(get_active_hold(hold.id, [stranger]))
+        self.assertFalse(release_hold(hold.id, [stranger]))
+        request = RequestFactory().get('/', headers={'X-Hold-Token': token})
+        owners = request_hold_owners(request)
+        self.assertEqual(get_active_hold(hold.id, owners).id, hold.id)
+        self.assertTrue(release_hold(hold.id, owners))
+        self.assertEqual(held_seats([slot.id]), {})
+
+    @override_settings(SLOT_HOLD_MAX_ACTIVE=2)
+    def test_active_holds_are_capped_per_client(self):
+        slot = self.slot(max_patients=10)
+        for _ in range(2):
+            hold_seats(slot.id, 1, owner=new_hold_token()[1], client='ip:203.0.113.7')
+        with self.assertRaises(TooManyHolds):
+            hold_seats(slot.id, 1, owner=new_hold_token()[1], client='ip:203.0.113.7')
+        hold_seats(slot.id, 1, client='ip:203.0.113.8')
+
+
+class MergeDuplicateSlotsTests(MongoTestCase):
+    def setUp(self):
+        TimeSlot.drop_collection()
+        Booking.drop_collection()
+        SlotHold.drop_collection()
+
+    def slot(self, booked, created_at):
+        day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        slot = TimeSlot(date=day, start_time=day.replace(hour=9), end_time=day.replace(hour=10),
+                        unlimited_patients=False, max_patients=5, booked_slots=booked,
+                        available_slots=5 - booked, created_at=created_at)
+        slot.save()
+        return slot
+
+    def test_each_duplicate_is_counted_once(self):
+        canonical = self.slot(1, datetime(2024, 1, 1))
+        duplicate = self.slot(2, datetime(2024, 1, 2))
+        Booking(booking_id='BK1', total_amount=0, booking_date=date.today(), time_slot=duplicate).save()
+        hold = hold_seats(duplicate.id, 1)
+        groups = list(duplicate_slot_groups())
+        self.assertEqual(groups, [[canonical.id, duplicate.id]])
+        self.assertEqual(merge_duplicate_slots(groups), (1, 1))
+        # A second instance merging the same groups finds nothing left to add
+        self.assertEqual(merge_duplicate_slots(groups), (0, 0))
+
+        merged = TimeSlot._get_collection().find_one({'_id': canonical.id})
+        self.assertEqual((merged['booked_slots'], merged['available_slots']), (3, 2))
+        self.assertEqual(TimeSlot.objects.count(), 1)
+        self.assertEqual(Booking.objects.get().time_slot.id, canonical.id)
+        self.assertEqual(confirm_hold(hold.id).booked_slots, 4)
+
+
+def webhook_body(event, order_id, payment_id='pay_1'):
+    return json.dumps({'event': event, 'payload': {
+        'payment': {'entity': {'id': payment_id, 'order_id': order_id}},
+    }}).encode()
+
+
+class PaymentEventTests(MongoTestCase):
+    def setUp(self):
+        Booking.drop_collection()
+        PaymentEvent.drop_collection()
+        call_command('ensure_indexes', '--collection', PaymentEvent._get_collection_name(), stdout=StringIO())
+        self.booking = Booking(booking_id='BK1', total_amount=500, booking_date=date.today(),
+                               status='pending', payment_order_id='order_1')
+        self.booking.save()
+
+    def test_redelivered_event_is_queued_once(self):
+        view = RazorpayWebhookView.as_view()
+        gateway = mock.Mock(**{'verify_webhook_signature.return_value': True})
+
+        def deliver():
+            request = RequestFactory().post('/', webhook_body('payment.captured', 'order_1'),
+                                            content_type='application/json',
+                                            headers={'X-Razorpay-Event-Id': 'evt_1'})
+            return view(request).data['status']
+
+        with mock.patch('app.views.get_gateway', return_value=gateway):
+            self.assertEqual([deliver(), deliver()], ['queued', 'duplicate'])
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_late_failure_does_not_undo_a_capture(self):
+        enqueue_event(webhook_body('payment.captured', 'order_1'), event_id='evt_1')
+        process_batch()
+        enqueue_event(webhook_body('payment.failed', 'order_1', 'pay_0'), event_id='evt_0')
+        self.assertEqual(process_batch()['bookings'], 0)
+        self.booking.reload()
+        self.assertEqual((self.booking.payment_status, self.booking.status), ('captured', 'confirmed'))
+        self.assertEqual(self.booking.payment_id, 'pay_1')
+
+    def test_batch_keeps_the_most_advanced_state(self):
+        enqueue_event(webhook_body('payment.captured', 'order_1'), event_id='evt_1')
+        enqueue_event(webhook_body('payment.failed', 'order_1', 'pay_0'), event_id='evt_0')
+        self.assertEqual(process_batch(), {'events': 2, 'bookings': 1, 'failed': 0})
+        self.booking.reload()
+        self.assertEqual(self.booking.payment_status, 'captured')
+
+    def test_leased_events_are_claimed_once_until_the_lease_expires(self):
+        enqueue_event(webhook_body('payment.captured', 'order_1'), event_id='evt_1')
+        _, events = claim_batch(lease=timedelta(seconds=-1))  # a consumer that died
+        self.assertEqual(len(events), 1)
+        _, events = claim_batch()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(claim_batch(), (None, []))
+
+    def test_errors_requeue_until_max_attempts(self):
+        enqueue_event(webhook_body('payment.captured', 'order_1'), event_id='evt_1')
+        with mock.patch('app.payment_events.apply_payment_states', side_effect=PyMongoError('boom')):
+            self.assertEqual(process_batch(max_attempts=2)['failed'], 1)
+            self.assertEqual(PaymentEvent.objects.get().status, 'queued')
+            process_batch(max_attempts=2)
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.error), ('failed', 2, 'boom'))
+
+
+calls = []
+
+
+@task(name='tests.record')
+def record_call(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError('try again')
+
+
+class TaskQueueTests(MongoTestCase):
+    def setUp(self):
+        BackgroundTask.drop_collection()
+        calls.clear()
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        self.assertIsNone(record_call.delay('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertEqual(BackgroundTask.objects.count(), 0)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_a_task_is_claimed_once_until_its_lease_runs_out(self):
+        task_id = record_call.delay('queued')
+        self.assertEqual(calls, [])
+        claimed = claim_task('worker-1', lease=timedelta(seconds=-1))  # a worker that died
+        self.assertEqual(claimed['_id'], task_id)
+        claimed = claim_task('worker-2')
+        self.assertEqual((claimed['worker'], claimed['attempts']), ('worker-2', 2))
+        self.assertIsNone(claim_task('worker-3'))
+        self.assertEqual(run_task(claimed)[0], True)
+        self.assertEqual(calls, ['queued'])
+        self.assertEqual(BackgroundTask.objects.get(id=task_id).status, 'done')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_failures_retry_with_backoff_then_fail(self):
+        task_id = enqueue('tests.record', ('flaky',), {'fail': True}, max_attempts=2)
+        before = datetime.utcnow()
+        with mock.patch('app.tasks.backoff', return_value=30) as backoff:
+            self.assertEqual(run_task(claim_task('worker'))[0], False)
+        backoff.assert_called_once_with(1)
+        retry = BackgroundTask._get_collection().find_one({'_id': task_id})
+        self.assertEqual(retry['status'], 'queued')
+        self.assertGreaterEqual(retry['run_at'], before + timedelta(seconds=29))
+        self.assertIsNone(claim_task('worker'))  # not due yet
+
+        BackgroundTask._get_collection().update_one({'_id': task_id}, {'$set': {'run_at': before}})
+        run_task(claim_task('worker'))
+        failed = BackgroundTask._get_collection().find_one({'_id': task_id})
+        self.assertEqual((failed['status'], failed['attempts']), ('failed', 2))
+        self.assertEqual(failed['last_error'], 'RuntimeError: try again')
+
+    def test_backoff_grows_exponentially_up_to_the_cap(self):
+        with mock.patch('app.tasks.random.uniform', return_value=1.0):
+            self.assertEqual([backoff(n) for n in (1, 2, 3)], [2.0, 4.0, 8.0])
+            self.assertEqual(backoff(20), 600.0)
+
+
+def journal_entry(booking_id, recorded_at, slot_id=None, **fields):
+    return {
+        'entry_id': uuid.uuid4().hex, 'recorded_at': recorded_at.isoformat(), 'source': 'book-test',
+        'booking_id': booking_id, 'booking_date': recorded_at.date().isoformat(), 'slot_id': slot_id,
+        'preferred_time': None, 'total_amount': 500, 'payment_order_id': None, 'hold_id': None,
+        'tests': ['CBC'], 'patients': [], **fields,
+    }
+
+
+class JournalFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'offline_journal.jsonl')
+        override = override_settings(OFFLINE_JOURNAL_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_append_and_read_back(self):
+        entries = [journal_entry(f'BK{n}', datetime(2026, 1, 1, 9, n)) for n in range(2)]
+        offline_journal.append(entries)
+        with open(self.path, 'a') as handle:
+            handle.write('{"entry_id": "cut sho')  # a crash mid-write
+        self.assertEqual(offline_journal.read_entries(self.path), entries)
+
+    def test_move_aside_starts_a_fresh_journal(self):
+        offline_journal.append([journal_entry('BK1', datetime(2026, 1, 1, 9))])
+        moved = offline_journal._move_aside()
+        self.assertEqual(offline_journal.pending_files(), [moved])
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(offline_journal._move_aside())  # nothing new to replay
+        offline_journal.append([journal_entry('BK2', datetime(2026, 1, 1, 10))])
+        self.assertEqual([e['booking_id'] for e in offline_journal.read_entries(self.path)], ['BK2'])
+        self.assertEqual(offline_journal.pending_count(), 2)
+
+    def test_append_racing_a_move_aside_lands_in_the_new_journal(self):
+        offline_journal.append([journal_entry('BK1', datetime(2026, 1, 1, 9))])
+        flock, raced = fcntl.flock, []
+
+        def move_aside_before_locking(handle, operation):
+            if not raced:
+                raced.append(True)
+                raced.append(offline_journal._move_aside())  # between append's open and its lock
+            flock(handle, operation)
+
+        with mock.patch('app.offline_journal.fcntl.flock', side_effect=move_aside_before_locking):
+            offline_journal.append([journal_entry('BK2', datetime(2026, 1, 1, 10))])
+        self.assertEqual([e['booking_id'] for e in offline_journal.read_entries(raced[1])], ['BK1'])
+        self.assertEqual([e['booking_id'] for e in offline_journal.read_entries(self.path)], ['BK2'])
+
+
+class JournalReplayTests(MongoTestCase):
+    def setUp(self):
+        for document in (Booking, Patient, TimeSlot, SlotHold):
+            document.drop_collection()
+        call_command('ensure_indexes', '--collection', Booking._get_collection_name(), stdout=StringIO())
+
+    def slot(self, max_patients):
+        day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        slot = TimeSlot(date=day, start_time=day.replace(hour=9), end_time=day.replace(hour=10),
+                        unlimited_patients=False, max_patients=max_patients, booked_slots=0,
+                        available_slots=max_patients)
+        slot.save()
+        return slot
+
+    def test_replaying_an_entry_again_changes_nothing(self):
+        slot = self.slot(5)
+        entry = journal_entry('BK1', datetime(2026, 1, 1, 9), str(slot.id),
+                              patients=[{'id': str(ObjectId()), 'first_name': 'Asha', 'age': 30, 'gender': 'F',
+                                         'phone_number': '9876543210', 'email': None}])
+        counts, unsynced = offline_journal.replay([entry])
+        self.assertEqual((counts['bookings'], counts['seated'], counts['patients'], unsynced), (1, 1, 1, []))
+        counts, _ = offline_journal.replay([entry])
+        self.assertEqual((counts['bookings'], counts['already_synced'], counts['seated']), (0, 1, 0))
+        self.assertEqual((Booking.objects.count(), Patient.objects.count()), (1, 1))
+        self.assertEqual(TimeSlot.objects.get().booked_slots, 1)
+
+    def test_taken_booking_id_is_renamed(self):
+        Booking(booking_id='BK1', total_amount=0, booking_date=date.today()).save()
+        entry = journal_entry('BK1', datetime(2026, 1, 1, 9))
+        counts, _ = offline_journal.replay([entry])
+        self.assertEqual(counts['renamed'], 1)
+        replayed = Booking.objects.get(offline_entry_id=entry['entry_id'])
+        self.assertEqual(replayed.booking_id, offline_journal.renamed_booking_id(entry))
+
+    def test_a_full_slot_seats_entries_in_journal_order(self):
+        slot = self.slot(1)
+        later = journal_entry('BK2', datetime(2026, 1, 1, 10), str(slot.id))
+        earlier = journal_entry('BK1', datetime(2026, 1, 1, 9), str(slot.id))
+        counts, _ = offline_journal.replay([later, earlier])
+        self.assertEqual((counts['seated'], counts['overbooked']), (1, 1))
+        statuses = {booking.booking_id: (booking.offline_status, booking.status) for booking in Booking.objects}
+        self.assertEqual(statuses, {'BK1': (offline_journal.SEATED, 'confirmed'),
+                                    'BK2': (offline_journal.OVERBOOKED, 'pending')})
+        self.assertEqual(TimeSlot.objects.get().booked_slots, 1)
+
+    def test_sync_replays_and_removes_the_journal(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(OFFLINE_JOURNAL_PATH=os.path.join(directory, 'offline_journal.jsonl')):
+            offline_journal.append([journal_entry('BK1', datetime(2026, 1, 1, 9))])
+            self.assertEqual(offline_journal.sync()['bookings'], 1)
+            self.assertEqual(offline_journal.pending_count(), 0)
+        self.assertEqual(Booking.objects.get().offline_status, offline_journal.NO_SLOT)
@@ -16,6 +16,7 @@ urlpatterns = [
     path('', home, name='home'),
     path('create-order/', CreateOrderView.as_view(), name='create-order'),
     path('verify-payment/', VerifyPaymentView.as_view(), name='verify-payment'),
+    path('razorpay/webhook/', RazorpayWebhookView.as_view(), name='razorpay-webhook'),
 ]
 
 urlpatterns += router.urls
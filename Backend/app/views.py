@@ -6,7 +6,6 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
-import razorpay
 
 from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
@@ -25,14 +24,25 @@ from .serializers import (
 
 from .models import *
 from .serializers import *
+from .payment_events import apply_payment_states, enqueue_event
+from .payment_gateway import GatewayError, GatewayUnavailable, get_gateway
+from .slot_holds import attach_order, get_active_hold, request_hold_owners
 
 
 # ------------------------------
-# 🔑 Razorpay Initialization
+# 🔑 Razorpay: pooled client with timeouts, retries and a circuit breaker
 # ------------------------------
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-)
+ORDER_AMOUNT = 34900  # amount in paise (Rs. 349.00)
+
+
+def gateway_error_response(error):
+    """503 + Retry-After while the gateway is down, 502 when it rejects the request"""
+    if isinstance(error, GatewayUnavailable):
+        response = Response({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if error.retry_after:
+            response['Retry-After'] = str(int(error.retry_after) + 1)
+        return response
+    return Response({'error': str(error)}, status=status.HTTP_502_BAD_GATEWAY)
 
 
 # ------------------------------
@@ -167,23 +177,35 @@ class CreateOrderView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
-        amount = 34900  # amount in paise (Rs. 349.00)
+        amount = ORDER_AMOUNT
         currency = 'INR'
 
+        # Optional seat hold (POST /api/mongo/time-slots/<id>/hold/) this order pays for
+        hold_id = request.data.get('hold_id')
+        hold_owners = request_hold_owners(request, request.data.get('hold_token'))
+        if hold_id and get_active_hold(hold_id, hold_owners) is None:
+            return Response(
+                {'error': 'Seat hold not found or expired'},
+                status=status.HTTP_410_GONE
+            )
+
         try:
-            razorpay_order = razorpay_client.order.create(dict(
-                amount=amount,
-                currency=currency,
-                payment_capture='1'
-            ))
+            razorpay_order = get_gateway().create_order(
+                amount, currency, notes={'hold_id': hold_id} if hold_id else None
+            )
+            if hold_id:
+                attach_order(hold_id, razorpay_order['id'], hold_owners, razorpay_order['amount'])
             return Response(
                 {
                     'order_id': razorpay_order['id'],
                     'amount': razorpay_order['amount'],
-                    'currency': razorpay_order['currency']
+                    'currency': razorpay_order['currency'],
+                    'hold_id': hold_id
                 },
                 status=status.HTTP_201_CREATED
             )
+        except GatewayError as e:
+            return gateway_error_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -202,19 +224,35 @@ class VerifyPaymentView(APIView):
         order_id = request.data.get('razorpay_order_id', '')
         signature = request.data.get('razorpay_signature', '')
 
-        params_dict = {
-            'razorpay_order_id': order_id,
-            'razorpay_payment_id': payment_id,
-            'razorpay_signature': signature
-        }
-
         try:
-            razorpay_client.utility.verify_payment_signature(params_dict)
-            return Response({'status': 'Payment Successful'}, status=status.HTTP_200_OK)
-        except razorpay.errors.SignatureVerificationError:
+            if get_gateway().verify_payment_signature(order_id, payment_id, signature):
+                # The webhook will say the same; this just confirms the booking sooner
+                apply_payment_states({order_id: ('captured', payment_id)})
+                return Response({'status': 'Payment Successful'}, status=status.HTTP_200_OK)
             return Response(
                 {'status': 'Payment Failed', 'error': 'Signature verification failed'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class RazorpayWebhookView(APIView):
+    """
+    Razorpay webhooks: verify the signature, queue the event, acknowledge.
+    Bookings are updated by the process_payment_events command, so the
+    gateway is answered in one insert and its retries stay cheap.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        body = request.body
+        signature = request.headers.get('X-Razorpay-Signature', '')
+        if not get_gateway().verify_webhook_signature(body, signature):
+            return Response({'error': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queued = enqueue_event(body, request.headers.get('X-Razorpay-Event-Id'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'queued' if queued else 'duplicate'}, status=status.HTTP_200_OK)
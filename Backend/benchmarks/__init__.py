@@ -0,0 +1,7 @@
+"""
+Performance tooling for the Backend: benchmarks and load generators.
+
+Run from the Backend directory, e.g. ``python -m benchmarks.startup_time``.
+Results are written as JSON to ``benchmarks/results/`` so runs can be
+compared across commits.
+"""
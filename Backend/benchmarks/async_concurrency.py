@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Concurrency limits: sync (gunicorn gthread) vs async (uvicorn) endpoints.
+
+For each concurrency level, N closed-loop clients hammer an endpoint for a
+fixed duration; throughput, latency percentiles and errors are reported per
+(target, level). With ``--spawn`` the script starts one single-worker server
+of each kind itself, so both get the same process budget:
+
+    python -m benchmarks.async_concurrency --spawn --levels 10,50,100,200,400
+
+Point MONGO_URI at a remote cluster (or add netem latency) to reproduce the
+slow-network case the async views are meant for.
+"""
+
+import argparse
+import asyncio
+import time
+
+from .common import save_results, spawn_server, summarize
+from .http_client import HttpClient
+
+# (name, sync path, async path)
+ENDPOINT_PAIRS = {
+    'time-slots': ('/api/mongo/time-slots/', '/api/mongo/async/time-slots/'),
+    'tests': ('/api/mongo/tests/', '/api/mongo/async/tests/'),
+    'consultations': ('/api/mongo/consultations/', '/api/mongo/async/consultations/'),
+    'verify': ('/api/mongo/auth/verify/', '/api/mongo/async/auth/verify/'),
+}
+
+
+async def run_level(base_url, path, concurrency, duration, timeout):
+    latencies, errors = [], {}
+    stop_at = time.perf_counter() + duration
+
+    async def user():
+        client = HttpClient(base_url, timeout=timeout)
+        try:
+            while time.perf_counter() < stop_at:
+                try:
+                    response = await client.request('GET', path)
+                    # verify without a cookie is a valid 401; anything 5xx is a failure
+                    if response.status >= 500:
+                        errors[str(response.status)] = errors.get(str(response.status), 0) + 1
+                    else:
+                        latencies.append(response.elapsed)
+                except Exception as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    total_errors = sum(errors.values())
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies) + total_errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'error_rate': round(total_errors / max(len(latencies) + total_errors, 1), 4),
+        'errors': errors,
+        'latency': summarize(latencies),
+    }
+
+
+async def run(args, targets):
+    results = {}
+    for endpoint in args.endpoints.split(','):
+        sync_path, async_path = ENDPOINT_PAIRS[endpoint]
+        query = f'?date={args.date}' if args.date and endpoint == 'time-slots' else ''
+        for kind, base_url, path in (('sync', targets['sync'], sync_path), ('async', targets['async'], async_path)):
+            rows = []
+            for level in args.levels:
+                row = await run_level(base_url, path + query, level, args.duration, args.timeout)
+                rows.append(row)
+                print(f"{endpoint:<14} {kind:<6} c={level:<5} {row['throughput_rps']:>9} rps  "
+                      f"p95={row['latency'].get('p95_ms', '-')}ms  errors={row['error_rate']:.2%}")
+            results[f'{endpoint}/{kind}'] = rows
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync-url', help='base URL of a WSGI server')
+    parser.add_argument('--async-url', help='base URL of an ASGI server')
+    parser.add_argument('--spawn', action='store_true', help='start one single-worker server of each kind')
+    parser.add_argument('--threads', type=int, default=4, help='gthread threads for the spawned sync server')
+    parser.add_argument('--endpoints', default='time-slots,tests,verify')
+    parser.add_argument('--levels', default='10,50,100,200')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--date', help='date for time-slot requests (YYYY-MM-DD)')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(',')]
+
+    processes = []
+    try:
+        if args.spawn:
+            sync_process, args.sync_url = spawn_server('wsgi', args.threads)
+            async_process, args.async_url = spawn_server('asgi', args.threads)
+            processes = [sync_process, async_process]
+        if not (args.sync_url and args.async_url):
+            parser.error('pass --spawn or both --sync-url and --async-url')
+        results = asyncio.run(run(args, {'sync': args.sync_url, 'async': args.async_url}))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    path = save_results('async_concurrency', {
+        'sync_url': args.sync_url, 'async_url': args.async_url, 'threads': args.threads,
+        'duration': args.duration, 'endpoints': results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Shared helpers for benchmark scripts: result files, summary statistics,
+Django setup and spawning a local server.
+"""
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BACKEND_DIR / 'benchmarks' / 'results'
+
+
+def git_revision():
+    """Short commit hash of the working tree ('unknown' outside git)"""
+    try:
+        revision = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = subprocess.call(
+            ['git', 'diff', '--quiet', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        )
+        return revision + ('-dirty' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'host': socket.gethostname(),
+    }
+
+
+def setup_django():
+    """Configure Django for in-process benchmarks (run from Backend/)"""
+    import django
+
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    django.setup()
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile; ``values`` need not be sorted"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples_seconds):
+    """Latency summary in milliseconds"""
+    if not samples_seconds:
+        return {'count': 0}
+    ms = [s * 1000 for s in samples_seconds]
+    return {
+        'count': len(ms),
+        'min_ms': round(min(ms), 3),
+        'mean_ms': round(sum(ms) / len(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p90_ms': round(percentile(ms, 90), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'max_ms': round(max(ms), 3),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(app_server, threads, workers=1):
+    """Start gunicorn from gunicorn.conf.py on a free port; returns (process, base_url)"""
+    port = free_port()
+    env = dict(
+        os.environ, PORT=str(port), APP_SERVER=app_server, WEB_CONCURRENCY=str(workers),
+        WEB_THREADS=str(threads), GUNICORN_LOG_LEVEL='warning', LOG_LEVEL='WARNING',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/api/mongo/health/', timeout=2)
+            return process, base_url
+        except Exception:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{app_server} server did not start')
+
+
+def save_results(name, results, output=None):
+    """Write ``results`` with run metadata; returns the path written"""
+    payload = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'environment': environment(),
+        'results': results,
+    }
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = RESULTS_DIR / f"{name}-{payload['revision']}-{stamp}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2))
+    return path
+
+
+def load_results(path):
+    return json.loads(Path(path).read_text())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+A fake Razorpay orders API with injectable latency and failures.
+
+Point the backend at it with ``RAZORPAY_BASE_URL=http://127.0.0.1:<port>``
+to see how checkout behaves when the gateway is slow or down:
+
+    python -m benchmarks.fake_gateway --port 8099 --latency 0.2 --error-rate 0.1
+
+The behaviour can be changed while it runs (used by
+benchmarks/payment_gateway.py)::
+
+    POST /_control {"latency": 5, "error_rate": 0, "outage": true}
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGatewayState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, outage=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.outage = outage
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def update(self, **changes):
+        with self.lock:
+            for key, value in changes.items():
+                if hasattr(self, key) and key not in ('lock', 'requests'):
+                    setattr(self, key, value)
+
+    def as_dict(self):
+        return {
+            'latency': self.latency, 'jitter': self.jitter, 'error_rate': self.error_rate,
+            'error_status': self.error_status, 'outage': self.outage, 'requests': self.requests,
+        }
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (read timeout): expected in the slow scenarios
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/_control':
+            return self.send_json(200, self.state.as_dict())
+        self.send_json(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+    def do_POST(self):
+        payload = self.read_json()
+        if self.path == '/_control':
+            self.state.update(**payload)
+            return self.send_json(200, self.state.as_dict())
+        if self.path.rstrip('/') != '/v1/orders':
+            return self.send_json(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+        with self.state.lock:
+            self.state.requests += 1
+            latency = self.state.latency + random.uniform(0, self.state.jitter)
+            outage, error_rate, error_status = self.state.outage, self.state.error_rate, self.state.error_status
+
+        if outage:
+            # Accept the connection but never answer: only a read timeout ends it
+            time.sleep(3600)
+        time.sleep(latency)
+        if random.random() < error_rate:
+            return self.send_json(error_status, {'error': {'code': 'SERVER_ERROR', 'description': 'Injected failure'}})
+        if not payload.get('amount'):
+            return self.send_json(400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'amount is required'}})
+        self.send_json(200, {
+            'id': f'order_{uuid.uuid4().hex[:14]}', 'entity': 'order', 'amount': payload['amount'],
+            'amount_paid': 0, 'amount_due': payload['amount'], 'currency': payload.get('currency', 'INR'),
+            'receipt': payload.get('receipt'), 'notes': payload.get('notes') or [], 'status': 'created',
+            'attempts': 0, 'created_at': int(time.time()),
+        })
+
+
+def make_server(port=0, **state):
+    """A ThreadingHTTPServer on 127.0.0.1 (``port=0`` picks a free one)"""
+    handler = type('Handler', (FakeGatewayHandler,), {'state': FakeGatewayState(**state)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**state):
+    """Serve in a background thread; returns (server, base_url)"""
+    server = make_server(**state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--outage', action='store_true', help='accept requests but never respond')
+    args = parser.parse_args()
+
+    server = make_server(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                         error_status=args.error_status, outage=args.outage)
+    print(f'Fake gateway on http://127.0.0.1:{args.port} ({server.RequestHandlerClass.state.as_dict()})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
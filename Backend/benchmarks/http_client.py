@@ -0,0 +1,135 @@
+"""
+Minimal asyncio HTTP/1.1 client for load generation (stdlib only).
+
+One ``HttpClient`` models one user: a single keep-alive connection and a
+cookie jar, so login cookies flow into later requests like in a browser.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: dict
+    body: bytes
+    elapsed: float
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+
+@dataclass
+class HttpClient:
+    base_url: str
+    timeout: float = 30.0
+    cookies: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        parts = urlsplit(self.base_url)
+        if parts.scheme != 'http':
+            raise ValueError('only http:// targets are supported')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, json_body=None, headers=None):
+        """Send one request; retries once on a stale keep-alive connection"""
+        body = b'' if json_body is None else json.dumps(json_body).encode()
+        for attempt in (1, 2):
+            started = time.perf_counter()
+            try:
+                await self._connect()
+                await asyncio.wait_for(self._send(method, path, body, headers or {}), self.timeout)
+                status, response_headers, response_body = await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                await self.close()
+                if attempt == 2:
+                    raise e
+                continue
+            except BaseException:
+                # Timeouts/cancellation leave the connection mid-response
+                await self.close()
+                raise
+            if response_headers.get('connection', '').lower() == 'close':
+                await self.close()
+            self._store_cookies(response_headers)
+            return HttpResponse(status, response_headers, response_body, time.perf_counter() - started)
+
+    async def _send(self, method, path, body, headers):
+        lines = [
+            f'{method} {self.prefix}{path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            'Accept: application/json',
+            f'Content-Length: {len(body)}',
+        ]
+        if body:
+            lines.append('Content-Type: application/json')
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        lines.extend(f'{k}: {v}' for k, v in headers.items())
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self._writer.drain()
+
+    async def _read_response(self):
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        set_cookies = []
+        while True:
+            line = (await self._reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                set_cookies.append(value)
+            headers[name] = value
+        headers['set-cookie'] = set_cookies
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            body = b''.join(chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get('content-length', 0)))
+        return status, headers, body
+
+    def _store_cookies(self, headers):
+        for raw in headers.get('set-cookie', []):
+            cookie = SimpleCookie()
+            cookie.load(raw)
+            for name, morsel in cookie.items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
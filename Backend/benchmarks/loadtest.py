@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Booking-funnel load generator.
+
+Each virtual user walks the real funnel on its own connection and cookie jar:
+
+    register -> login -> verify -> catalog (tests + consultations)
+             -> time-slots -> book-test
+
+Two arrival models:
+  * closed (default): ``--concurrency`` users loop through the funnel until
+    ``--duration`` is up; measures capacity at a fixed in-flight count.
+  * open (``--arrival-rate N``): new users arrive as a Poisson process at N
+    per second; arrivals beyond ``--concurrency`` in flight are counted as
+    rejected. Measures latency at a given offered load, the way real traffic
+    behaves.
+
+Throughput, latency percentiles and error rates are reported per funnel step
+and saved as JSON (see benchmarks/common.py) for comparing commits. Run
+against a local server and a local mongod (docker-compose.mongodb.yml), never
+production: every user registers an account and books a test.
+
+    python -m benchmarks.loadtest --spawn --concurrency 50 --duration 60
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --arrival-rate 20
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+from .common import save_results, spawn_server, summarize
+from .http_client import HttpClient
+
+STEPS = ('register', 'login', 'verify', 'catalog/tests', 'catalog/consultations', 'time-slots', 'book-test')
+
+PASSWORD = 'loadtest-password'
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Latency samples and outcome counts per funnel step"""
+
+    def __init__(self):
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: {} for step in STEPS}
+        self.funnel = {'started': 0, 'completed': 0, 'abandoned': {}}
+
+    def ok(self, step, elapsed):
+        self.latencies[step].append(elapsed)
+
+    def error(self, step, reason):
+        self.errors[step][reason] = self.errors[step].get(reason, 0) + 1
+
+    def report(self, elapsed):
+        steps = {}
+        for step in STEPS:
+            successes = len(self.latencies[step])
+            failures = sum(self.errors[step].values())
+            steps[step] = {
+                'requests': successes + failures,
+                'throughput_rps': round(successes / elapsed, 2) if elapsed else 0.0,
+                'error_rate': round(failures / max(successes + failures, 1), 4),
+                'errors': self.errors[step],
+                'latency': summarize(self.latencies[step]),
+            }
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'funnel': dict(self.funnel, completion_rate=round(
+                self.funnel['completed'] / max(self.funnel['started'], 1), 4)),
+            'steps': steps,
+        }
+
+
+async def call(client, recorder, step, method, path, body=None, expect=(200,)):
+    try:
+        response = await client.request(method, path, body)
+    except Exception as e:
+        recorder.error(step, type(e).__name__)
+        raise StepFailed(step)
+    if response.status not in expect:
+        recorder.error(step, str(response.status))
+        raise StepFailed(step)
+    recorder.ok(step, response.elapsed)
+    return response
+
+
+async def user_session(args, recorder, rng, run_id, number):
+    """One user through the whole funnel"""
+    client = HttpClient(args.base_url, timeout=args.timeout)
+    username = f'lt-{run_id}-{number}'
+    recorder.funnel['started'] += 1
+    try:
+        await call(client, recorder, 'register', 'POST', '/api/mongo/auth/register/', {
+            'username': username, 'email': f'{username}@loadtest.invalid', 'password': PASSWORD,
+        }, expect=(201,))
+        # Drop the register cookies so verify depends on the ones login sets
+        client.cookies.clear()
+        await call(client, recorder, 'login', 'POST', '/api/mongo/auth/login/',
+                   {'username': username, 'password': PASSWORD})
+        await call(client, recorder, 'verify', 'GET', '/api/mongo/auth/verify/')
+        await think(args, rng)
+
+        tests = (await call(client, recorder, 'catalog/tests', 'GET', '/api/mongo/tests/')).json()
+        await call(client, recorder, 'catalog/consultations', 'GET', '/api/mongo/consultations/')
+        await think(args, rng)
+
+        day = booking_day(args, rng)
+        slots = (await call(client, recorder, 'time-slots', 'GET',
+                            f'/api/mongo/time-slots/?date={day.isoformat()}')).json()
+        open_slots = [slot for slot in slots.get('slots', []) if slot.get('available')]
+        await think(args, rng)
+
+        test = rng.choice(tests) if tests else {'name': 'Complete Blood Count', 'price': 299}
+        await call(client, recorder, 'book-test', 'POST', '/api/mongo/book-test/', {
+            'cart_items': [{'name': test['name'], 'price': test['price'], 'patients': [{
+                'name': f'Load {number}', 'age': rng.randint(1, 90), 'gender': rng.choice('MF'),
+                'phone': f'9{rng.randrange(10**8, 10**9):09d}',
+            }]}],
+            'total_price': test['price'],
+            'booking_date': day.isoformat(),
+            'time_slot_id': rng.choice(open_slots)['id'] if open_slots else None,
+        }, expect=(201,))
+        recorder.funnel['completed'] += 1
+    except StepFailed as e:
+        abandoned = recorder.funnel['abandoned']
+        abandoned[str(e)] = abandoned.get(str(e), 0) + 1
+    finally:
+        await client.close()
+
+
+async def think(args, rng):
+    if args.think_time:
+        await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+def booking_day(args, rng):
+    day = date.today() + timedelta(days=rng.randint(1, args.days_ahead))
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return day
+
+
+async def closed_model(args, recorder, run_id):
+    stop_at = time.perf_counter() + args.duration
+    counter = iter(range(10**9))
+
+    async def worker(worker_id):
+        rng = random.Random(args.seed * 100_003 + worker_id)
+        while time.perf_counter() < stop_at:
+            await user_session(args, recorder, rng, run_id, next(counter))
+
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+
+
+async def open_model(args, recorder, run_id):
+    rng = random.Random(args.seed)
+    in_flight = asyncio.Semaphore(args.concurrency)
+    sessions, number = set(), 0
+    stop_at = time.perf_counter() + args.duration
+
+    async def session(n):
+        try:
+            await user_session(args, recorder, random.Random(args.seed * 100_003 + n), run_id, n)
+        finally:
+            in_flight.release()
+
+    while time.perf_counter() < stop_at:
+        await asyncio.sleep(rng.expovariate(args.arrival_rate))
+        if in_flight.locked():
+            # Over capacity: an open system drops (and we count) the arrival
+            recorder.funnel['rejected'] = recorder.funnel.get('rejected', 0) + 1
+            continue
+        await in_flight.acquire()
+        task = asyncio.create_task(session(number))
+        sessions.add(task)
+        task.add_done_callback(sessions.discard)
+        number += 1
+    if sessions:
+        await asyncio.gather(*sessions)
+
+
+async def run(args):
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    if args.arrival_rate:
+        await open_model(args, recorder, run_id)
+    else:
+        await closed_model(args, recorder, run_id)
+    return recorder.report(time.perf_counter() - started)
+
+
+def print_report(report):
+    funnel = report['funnel']
+    print(f"users={funnel['started']} completed={funnel['completed']} "
+          f"({funnel['completion_rate']:.1%}) abandoned={funnel['abandoned']} in {report['elapsed_s']}s")
+    for step, row in report['steps'].items():
+        latency = row['latency']
+        print(f"{step:<22} {row['requests']:>7} req {row['throughput_rps']:>8} rps  "
+              f"p50={latency.get('p50_ms', '-')}ms p95={latency.get('p95_ms', '-')}ms "
+              f"p99={latency.get('p99_ms', '-')}ms  errors={row['error_rate']:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='server to load (default: --spawn)')
+    parser.add_argument('--spawn', action='store_true', help='start a local gunicorn from gunicorn.conf.py')
+    parser.add_argument('--app-server', choices=('wsgi', 'asgi'), default='wsgi', help='with --spawn')
+    parser.add_argument('--workers', type=int, default=2, help='with --spawn')
+    parser.add_argument('--threads', type=int, default=4, help='with --spawn')
+    parser.add_argument('--concurrency', type=int, default=20, help='users in flight (closed model: always)')
+    parser.add_argument('--arrival-rate', type=float, default=0.0,
+                        help='new users per second (open model); 0 = closed model')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to generate load')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between funnel stages (s)')
+    parser.add_argument('--days-ahead', type=int, default=14, help='book up to this many days out')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    process = None
+    try:
+        if args.spawn:
+            process, args.base_url = spawn_server(args.app_server, args.threads, args.workers)
+        if not args.base_url:
+            parser.error('pass --base-url or --spawn')
+        report = asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.terminate()
+
+    print_report(report)
+    path = save_results('loadtest', {
+        'base_url': args.base_url,
+        'model': 'open' if args.arrival_rate else 'closed',
+        'concurrency': args.concurrency,
+        'arrival_rate': args.arrival_rate,
+        'duration': args.duration,
+        'think_time': args.think_time,
+        **report,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for CPU-bound hot paths.
+
+Each benchmark is warmed up, then timed ``--repeat`` times over ``number``
+calls with the garbage collector off (like ``timeit``); per-call best,
+median, mean and stdev are reported and saved. ``--compare`` prints the
+median change against an earlier result file:
+
+    python -m benchmarks.micro                        # all benchmarks
+    python -m benchmarks.micro -k serialize -k jwt    # name filter
+    python -m benchmarks.micro --compare benchmarks/results/micro-<rev>-<stamp>.json
+
+Benchmarks marked ``mongo`` need a reachable MongoDB (``--mongo-uri``; they
+use a scratch database that is dropped afterwards) and are skipped
+otherwise. They include the round trips, so compare them on the same host.
+"""
+
+import argparse
+import gc
+import io
+import itertools
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from bson import ObjectId
+
+from .common import load_results, save_results, setup_django
+
+BENCHMARKS = []
+
+
+def benchmark(name, number, mongo=False):
+    """Register ``factory() -> callable``; the factory does the (untimed) setup"""
+    def decorator(factory):
+        BENCHMARKS.append({'name': name, 'number': number, 'mongo': mongo, 'factory': factory})
+        return factory
+    return decorator
+
+
+def measure(function, number, repeat, warmup):
+    """Per-call seconds for each of ``repeat`` runs of ``number`` calls"""
+    for _ in range(warmup):
+        function()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                function()
+            runs.append((time.perf_counter() - started) / number)
+        return runs
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def describe(runs, number):
+    median = statistics.median(runs)
+    return {
+        'number': number,
+        'repeat': len(runs),
+        'best_us': round(min(runs) * 1e6, 3),
+        'median_us': round(median * 1e6, 3),
+        'mean_us': round(statistics.fmean(runs) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(runs) * 1e6, 3) if len(runs) > 1 else 0.0,
+        'ops_per_s': round(1 / median, 1) if median else None,
+    }
+
+
+# --- Fixtures --------------------------------------------------------------
+
+def patient_documents(count):
+    """Patients as loaded from MongoDB (``_from_son``), not freshly constructed"""
+    from app.mongo_models import Patient
+
+    now = datetime.utcnow()
+    return [
+        Patient._from_son({
+            '_id': ObjectId(), 'first_name': f'Patient {i}', 'age': 20 + i % 60, 'gender': 'MFO'[i % 3],
+            'phone_number': f'98{i:08d}', 'email': f'patient{i}@example.com',
+            'prescription_file': None, 'prescription_filename': None, 'created_at': now,
+        })
+        for i in range(count)
+    ]
+
+
+def time_slot_documents(count):
+    from app.datagen import make_day_slots
+    from app.mongo_models import TimeSlot
+
+    slots, day = [], date.today()
+    while len(slots) < count:
+        slots.extend(TimeSlot._from_son(slot) for slot in make_day_slots(day))
+        day += timedelta(days=1)
+    return slots[:count]
+
+
+def bench_user():
+    from app.mongo_models import User
+
+    user = User(id=ObjectId(), username='bench', email='bench@example.com', role='patient')
+    user.set_password('bench-password')
+    return user
+
+
+def standalone_payload(days=30):
+    """A month of slots in the shape the standalone servers return"""
+    from app.datagen import make_day_slots
+
+    slots = []
+    for offset in range(days):
+        for slot in make_day_slots(date.today() + timedelta(days=offset)):
+            slots.append({
+                'id': str(slot['_id']), 'date': slot['date'].date().isoformat(),
+                'start_time': slot['start_time'].strftime('%H:%M'), 'end_time': slot['end_time'].strftime('%H:%M'),
+                'available_slots': slot['available_slots'], 'booked_slots': 0, 'available': True,
+                'created_at': slot['created_at'],
+            })
+    return {'success': True, 'count': len(slots), 'slots': slots}
+
+
+def bare_handler(handler_class):
+    """A request handler with just enough state for send_json_response"""
+    handler = handler_class.__new__(handler_class)
+    handler.headers = {}
+    handler.send_response = lambda *args, **kwargs: None
+    handler.send_header = lambda *args, **kwargs: None
+    handler.end_headers = lambda: None
+    handler.wfile = io.BytesIO()
+    return handler
+
+
+# --- Benchmarks ------------------------------------------------------------
+
+@benchmark('serialize_patient x1000', number=20)
+def _serialize_patients():
+    from app.mongo_views import serialize_patient
+
+    patients = patient_documents(1000)
+    return lambda: [serialize_patient(p) for p in patients]
+
+
+@benchmark('serialize_time_slot x1000', number=20)
+def _serialize_time_slots():
+    from app.mongo_views import serialize_time_slot
+
+    slots = time_slot_documents(1000)
+    return lambda: [serialize_time_slot(s) for s in slots]
+
+
+@benchmark('User.set_password', number=3)
+def _set_password():
+    user = bench_user()
+    return lambda: user.set_password('bench-password')
+
+
+@benchmark('User.check_password', number=3)
+def _check_password():
+    user = bench_user()
+    return lambda: user.check_password('bench-password')
+
+
+@benchmark('encode_jwt_token', number=2000)
+def _encode_jwt():
+    from app.mongo_auth import encode_jwt_token
+
+    user = bench_user()
+    return lambda: encode_jwt_token(user, 'access')
+
+
+@benchmark('jwt.decode', number=2000)
+def _decode_jwt():
+    import jwt
+    from app.mongo_auth import JWT_ALGORITHM, JWT_SECRET, encode_jwt_token
+
+    token, _ = encode_jwt_token(bench_user(), 'access')
+    return lambda: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
+
+@benchmark('builtin_timeslots_server.send_json_response (30 days)', number=50)
+def _send_json_builtin():
+    from builtin_timeslots_server import TimeSlotHandler
+
+    handler, payload = bare_handler(TimeSlotHandler), standalone_payload()
+
+    def send():
+        handler.wfile.seek(0)
+        handler.wfile.truncate()
+        handler.send_json_response(payload)
+    return send
+
+
+@benchmark('simple_working_api.send_json_response (30 days)', number=50)
+def _send_json_simple():
+    from simple_working_api import SimpleTimeSlotHandler
+
+    handler, payload = bare_handler(SimpleTimeSlotHandler), standalone_payload()
+
+    def send():
+        handler.wfile.seek(0)
+        handler.wfile.truncate()
+        handler.send_json_response(payload)
+    return send
+
+
+@benchmark('create_jwt_token (encode + save)', number=200, mongo=True)
+def _create_jwt():
+    from app.mongo_auth import create_jwt_token
+
+    user = bench_user()
+    user.save()
+    return lambda: create_jwt_token(user, 'access')
+
+
+@benchmark('create_default_time_slots_in_mongodb (new day)', number=20, mongo=True)
+def _create_slots_new_day():
+    from app.mongo_views import create_default_time_slots_in_mongodb
+
+    days = (day for day in (date(2100, 1, 1) + timedelta(days=n) for n in itertools.count())
+            if day.weekday() != 6)
+    return lambda: create_default_time_slots_in_mongodb(next(days))
+
+
+@benchmark('create_default_time_slots_in_mongodb (existing day)', number=20, mongo=True)
+def _create_slots_existing_day():
+    from app.mongo_views import create_default_time_slots_in_mongodb
+
+    day = date(2099, 1, 5)
+    create_default_time_slots_in_mongodb(day)
+    return lambda: create_default_time_slots_in_mongodb(day)
+
+
+def mongo_available(args):
+    from app.mongo_connection import ping, use_database
+
+    use_database(args.database, host=args.mongo_uri)
+    try:
+        ping()
+        return True
+    except Exception as e:
+        print(f'MongoDB not reachable ({e}); skipping mongo benchmarks')
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='filters', action='append', default=[],
+                        help='only benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--warmup', type=int, default=3, help='untimed calls before timing')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply each benchmark\'s call count')
+    parser.add_argument('--no-mongo', action='store_true', help='skip benchmarks that need MongoDB')
+    parser.add_argument('--mongo-uri', default=None)
+    parser.add_argument('--database', default='infinite_clinic_bench_micro')
+    parser.add_argument('--compare', help='earlier micro result file to compare medians against')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup_django()
+    selected = [
+        spec for spec in BENCHMARKS
+        if not args.filters or any(f.lower() in spec['name'].lower() for f in args.filters)
+    ]
+    use_mongo = not args.no_mongo and any(spec['mongo'] for spec in selected) and mongo_available(args)
+    baseline = load_results(args.compare)['results']['benchmarks'] if args.compare else {}
+
+    results = {}
+    try:
+        for spec in selected:
+            if spec['mongo'] and not use_mongo:
+                continue
+            number = max(1, int(spec['number'] * args.scale))
+            runs = measure(spec['factory'](), number, args.repeat, args.warmup)
+            results[spec['name']] = row = describe(runs, number)
+
+            change = ''
+            if spec['name'] in baseline:
+                before = baseline[spec['name']]['median_us']
+                change = f"  {(row['median_us'] - before) / before:+.1%} vs baseline"
+            print(f"{spec['name']:<55} median={row['median_us']:>12.3f}us  "
+                  f"best={row['best_us']:>12.3f}us  ±{row['stdev_us']:.3f}{change}")
+    finally:
+        if use_mongo:
+            from mongoengine.connection import get_db
+            get_db().client.drop_database(args.database)
+
+    path = save_results('micro', {
+        'repeat': args.repeat, 'warmup': args.warmup, 'scale': args.scale, 'benchmarks': results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Patient search latency on a large synthetic collection.
+
+Seeds ``--patients`` (default 500k) patients into a scratch database, builds
+the declared indexes, then times ``search_patients`` in-process for phone,
+phone-prefix, email and name-prefix queries drawn from the seeded data.
+``--baseline`` also times the unindexed case-insensitive ``icontains``
+filter the frontend effectively did before the endpoint existed.
+
+    python -m benchmarks.patient_search --mongo-uri mongodb://localhost:27017
+
+The scratch database is reused when it already holds enough patients; pass
+``--reseed`` to start over and ``--drop`` to remove it afterwards.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from .common import save_results, setup_django, summarize
+
+
+def seed(db, count, batch_size):
+    from app.datagen import insert_batched, make_patient
+
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    documents = (make_patient(rng, now - timedelta(seconds=i * 30)) for i in range(count))
+    started = time.perf_counter()
+    inserted = insert_batched(db['patients'], documents, batch_size)
+    print(f'Seeded {inserted} patients in {time.perf_counter() - started:.1f}s')
+
+
+def sample_queries(db, count):
+    """Realistic queries built from random seeded patients"""
+    rng = random.Random(11)
+    size = db['patients'].estimated_document_count()
+    patients = list(db['patients'].aggregate([
+        {'$sample': {'size': min(count, size)}},
+        {'$project': {'phone_number': 1, 'email': 1, 'first_name': 1}},
+    ]))
+    queries = {'phone': [], 'phone_prefix': [], 'email': [], 'name_prefix': []}
+    for patient in patients:
+        queries['phone'].append(patient['phone_number'])
+        queries['phone_prefix'].append(patient['phone_number'][:rng.randint(4, 7)])
+        queries['email'].append(patient['email'].upper() if rng.random() < 0.3 else patient['email'])
+        queries['name_prefix'].append(patient['first_name'][:rng.randint(2, 4)].lower())
+    return queries
+
+
+def time_queries(function, queries, repeats):
+    samples = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            function(query)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=None, help='MongoDB to use (default: settings MONGO_URI)')
+    parser.add_argument('--database', default='infinite_clinic_bench_search')
+    parser.add_argument('--patients', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=200, help='distinct queries per kind')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--baseline', action='store_true', help='also time the unindexed icontains filter')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--drop', action='store_true', help='drop the scratch database afterwards')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from mongoengine.connection import get_db
+
+    from app.mongo_connection import use_database
+    from app.mongo_models import Patient
+    from app.patient_search import search_patients
+
+    use_database(args.database, host=args.mongo_uri)
+    db = get_db()
+    try:
+        if args.reseed:
+            db['patients'].drop()
+        if db['patients'].estimated_document_count() < args.patients:
+            db['patients'].drop()
+            seed(db, args.patients, args.batch_size)
+        call_command('ensure_indexes', collection=['patients'])
+
+        queries = sample_queries(db, args.queries)
+        # Warm the working set and plan cache before timing
+        for kind_queries in queries.values():
+            for query in kind_queries[:10]:
+                search_patients(query, args.limit)
+
+        results = {}
+        for kind, kind_queries in queries.items():
+            samples = time_queries(lambda q: search_patients(q, args.limit), kind_queries, args.repeats)
+            results[kind] = summarize(samples)
+            print(f"{kind:<14} p50={results[kind]['p50_ms']}ms  p95={results[kind]['p95_ms']}ms  "
+                  f"p99={results[kind]['p99_ms']}ms")
+
+        if args.baseline:
+            def icontains(query):
+                list(Patient.objects(first_name__icontains=query).order_by('-created_at').limit(args.limit))
+
+            samples = time_queries(icontains, queries['name_prefix'][:20], 1)
+            results['baseline_icontains'] = summarize(samples)
+            print(f"{'icontains':<14} p50={results['baseline_icontains']['p50_ms']}ms  "
+                  f"p95={results['baseline_icontains']['p95_ms']}ms")
+    finally:
+        if args.drop:
+            db.client.drop_database(args.database)
+
+    path = save_results('patient_search', {
+        'patients': args.patients, 'limit': args.limit, 'repeats': args.repeats, 'kinds': results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
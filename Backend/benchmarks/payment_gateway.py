@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Order creation against a misbehaving gateway.
+
+Runs ``PaymentGateway.create_order`` from ``--concurrency`` threads against
+benchmarks/fake_gateway.py through a series of scenarios and reports, per
+scenario, how long calls took and how they ended:
+
+    healthy   fast responses
+    flaky     a share of 5xx answers (absorbed by retries)
+    slow      responses slower than the read timeout (bounded by the timeout)
+    outage    no responses at all (the breaker opens and calls fail fast)
+    recovery  the gateway is back (half-open trial, then closed)
+
+    python -m benchmarks.payment_gateway --calls 40 --concurrency 8
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import save_results, setup_django, summarize
+from .fake_gateway import start_in_thread
+
+SCENARIOS = [
+    ('healthy', {'latency': 0.02, 'jitter': 0.02, 'error_rate': 0.0, 'outage': False}),
+    ('flaky', {'latency': 0.02, 'jitter': 0.0, 'error_rate': 0.3, 'outage': False}),
+    ('slow', {'latency': 2.0, 'jitter': 0.0, 'error_rate': 0.0, 'outage': False}),
+    ('outage', {'latency': 0.0, 'jitter': 0.0, 'error_rate': 0.0, 'outage': True}),
+    ('recovery', {'latency': 0.02, 'jitter': 0.0, 'error_rate': 0.0, 'outage': False}),
+]
+
+
+def run_scenario(gateway, calls, concurrency):
+    from app.payment_gateway import GatewayError, GatewayUnavailable
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            gateway.create_order(34900, 'INR')
+            outcome = 'ok'
+        except GatewayUnavailable as e:
+            outcome = 'fast_fail' if e.retry_after is not None else 'unavailable'
+        except GatewayError:
+            outcome = 'rejected'
+        return outcome, time.perf_counter() - started
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(calls)))
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return {'outcomes': outcomes, 'latency': summarize([seconds for _, seconds in results])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=40, help='calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--read-timeout', type=float, default=0.5)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--breaker-threshold', type=int, default=5)
+    parser.add_argument('--breaker-reset', type=float, default=2.0, help='seconds the breaker stays open')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup_django()
+    from app.circuit_breaker import CircuitBreaker
+    from app.payment_gateway import TRANSIENT_ERRORS, PaymentGateway
+
+    def new_breaker():
+        return CircuitBreaker('razorpay', failure_threshold=args.breaker_threshold,
+                              reset_timeout=args.breaker_reset, failure_exceptions=TRANSIENT_ERRORS)
+
+    server, base_url = start_in_thread()
+    gateway = PaymentGateway('rzp_test_fake', 'fake-secret', base_url=base_url, connect_timeout=0.5,
+                             read_timeout=args.read_timeout, max_attempts=args.max_attempts,
+                             backoff_base=0.05, backoff_cap=0.5, total_budget=5.0,
+                             pool_size=args.concurrency)
+
+    results = {}
+    try:
+        for name, state in SCENARIOS:
+            if name == 'recovery':
+                time.sleep(args.breaker_reset)  # keep the outage's open breaker; let it go half-open
+            else:
+                gateway.breaker = new_breaker()
+            server.RequestHandlerClass.state.update(**state)
+            requests_before = server.RequestHandlerClass.state.requests
+            row = run_scenario(gateway, args.calls, args.concurrency)
+            row['gateway_requests'] = server.RequestHandlerClass.state.requests - requests_before
+            row['breaker'] = gateway.breaker.snapshot()
+            results[name] = row
+            latency = row['latency']
+            print(f"{name:<9} {row['outcomes']}  p50={latency['p50_ms']:.0f}ms p99={latency['p99_ms']:.0f}ms "
+                  f"max={latency['max_ms']:.0f}ms  gateway requests={row['gateway_requests']}  "
+                  f"breaker={row['breaker']['state']}")
+    finally:
+        server.RequestHandlerClass.state.update(outage=False)
+        server.shutdown()
+
+    path = save_results('payment_gateway', {
+        'calls': args.calls, 'concurrency': args.concurrency, 'read_timeout': args.read_timeout,
+        'max_attempts': args.max_attempts, 'breaker_threshold': args.breaker_threshold,
+        'breaker_reset': args.breaker_reset, 'scenarios': results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Time slot reads and bookings: per-slot documents vs day buckets.
+
+Seeds ``--days`` days of template slots in both layouts into a scratch
+database (TimeSlot documents as ``maintain_slot_horizon`` writes them, and
+one ``slot_days`` bucket per day), then times in-process:
+
+* ``day``: a day's bookable slots (``available_slots`` in each mode)
+* ``month``: every slot of 30 consecutive days
+* ``book``: ``book_seats`` (hold + confirm) on a random slot
+
+    python -m benchmarks.slot_layout --mongo-uri mongodb://localhost:27017 --drop
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from .common import save_results, setup_django, summarize
+
+
+def timed(function, arguments):
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=None, help='MongoDB to use (default: settings MONGO_URI)')
+    parser.add_argument('--database', default='infinite_clinic_bench_slots')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--reads', type=int, default=500, help='day and month reads per layout')
+    parser.add_argument('--bookings', type=int, default=1000, help='bookings per layout')
+    parser.add_argument('--drop', action='store_true', help='drop the scratch database afterwards')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.test import override_settings
+    from mongoengine.connection import get_db
+
+    from app.mongo_connection import use_database
+    from app.mongo_models import SlotDay, SlotHold, TimeSlot
+    from app.slot_buckets import range_slots, template_bucket
+    from app.slot_holds import HoldError, book_seats
+    from app.slot_horizon import ensure_days
+    from app.slot_templates import DEFAULT_SCHEDULE, available_slots
+
+    use_database(args.database, host=args.mongo_uri)
+    db = get_db()
+    start = date.today()
+    days = [start + timedelta(days=offset) for offset in range(args.days)]
+    rng = random.Random(5)
+    try:
+        for document in (TimeSlot, SlotDay, SlotHold):
+            db[document._get_collection_name()].drop()
+        call_command('ensure_indexes', collection=[TimeSlot._get_collection_name(), SlotHold._get_collection_name()])
+        started = time.perf_counter()
+        ensure_days(days)
+        SlotDay._get_collection().insert_many([template_bucket(day, DEFAULT_SCHEDULE) for day in days])
+        print(f'Seeded {args.days} days in both layouts in {time.perf_counter() - started:.1f}s')
+
+        read_days = [rng.choice(days) for _ in range(args.reads)]
+        month_starts = [rng.choice(days[:max(1, args.days - 30)]) for _ in range(args.reads)]
+        slot_documents = list(TimeSlot._get_collection().find({}, {'start_time': 1, 'end_time': 1}))
+        booked_slots = [rng.choice(slot_documents) for _ in range(args.bookings)]
+
+        def month_documents(first):
+            list(TimeSlot.objects(
+                date__gte=datetime.combine(first, datetime.min.time()),
+                date__lt=datetime.combine(first + timedelta(days=30), datetime.min.time()),
+            ).order_by('date', 'start_time'))
+
+        def book(slot_id):
+            try:
+                book_seats(slot_id)
+            except HoldError:
+                pass  # a slot drawn more often than its capacity
+
+        layouts = {
+            'documents': {
+                'settings': 'materialized',
+                'month': month_documents,
+                'slot_ids': [str(slot['_id']) for slot in booked_slots],
+            },
+            'bucket': {
+                'settings': 'bucket',
+                'month': lambda first: range_slots(first, first + timedelta(days=30), available_only=False),
+                'slot_ids': [f"v:{slot['start_time']:%Y-%m-%d}:{slot['start_time']:%H%M}-{slot['end_time']:%H%M}"
+                             for slot in booked_slots],
+            },
+        }
+
+        results = {}
+        for layout, spec in layouts.items():
+            with override_settings(SLOT_STORAGE=spec['settings']):
+                for day in read_days[:20]:  # warm up
+                    available_slots(day)
+                results[layout] = {
+                    'day': summarize(timed(available_slots, read_days)),
+                    'month': summarize(timed(spec['month'], month_starts)),
+                    'book': summarize(timed(book, spec['slot_ids'])),
+                }
+            for operation, row in results[layout].items():
+                print(f"{layout:<10} {operation:<6} p50={row['p50_ms']}ms  p95={row['p95_ms']}ms  p99={row['p99_ms']}ms")
+    finally:
+        if args.drop:
+            db.client.drop_database(args.database)
+
+    path = save_results('slot_layout', {
+        'days': args.days, 'reads': args.reads, 'bookings': args.bookings, 'layouts': results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Idle live-availability subscribers on one ASGI worker.
+
+Opens ``--subscribers`` (default 5000) Server-Sent Events connections to
+``/api/mongo/async/time-slots/stream/`` for one date and keeps them idle,
+then takes ``--holds`` seat holds on that date one at a time and measures
+how long each ``delta`` takes to reach every subscriber. Reports the time
+to connect everybody, the worker's subscriber count and peak RSS (from
+``metrics/slot-subscribers/``) and fan-out latency percentiles.
+
+    python -m benchmarks.sse_subscribers --spawn
+    python -m benchmarks.sse_subscribers --url http://127.0.0.1:8000 --metrics-token ...
+
+``--spawn`` starts a single uvicorn worker against MONGO_URI. The open file
+limit is raised to its hard limit for both sides; 5000 subscribers need
+roughly 10k descriptors on one machine.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import secrets
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from .common import save_results, spawn_server, summarize
+from .http_client import HttpClient
+
+
+class Subscriber:
+    def __init__(self, host, port, path):
+        self.host, self.port, self.path = host, port, path
+        self.deltas = []  # perf_counter of each delta received
+        self.snapshot = asyncio.Event()
+        self.delta = asyncio.Event()
+        self.writer = None
+
+    async def run(self):
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f'GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        await self.writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'event: snapshot'):
+                self.snapshot.set()
+            elif line.startswith(b'event: delta'):
+                self.deltas.append(time.perf_counter())
+                self.delta.set()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def connect_all(base_url, path, count, concurrency):
+    parts = urlsplit(base_url)
+    subscribers = [Subscriber(parts.hostname, parts.port or 80, path) for _ in range(count)]
+    tasks = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def open_one(subscriber):
+        async with gate:
+            tasks.append(asyncio.create_task(subscriber.run()))
+            await subscriber.snapshot.wait()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(open_one(subscriber) for subscriber in subscribers))
+    return subscribers, tasks, time.perf_counter() - started
+
+
+async def available_slot_ids(client, day):
+    response = await client.request('GET', f'/api/mongo/time-slots/?date={day}')
+    return [slot['id'] for slot in response.json()['slots'] if slot['available']]
+
+
+async def run(args):
+    client = HttpClient(args.url)
+    metrics = {'X-Metrics-Token': args.metrics_token} if args.metrics_token else {}
+    path = f'/api/mongo/async/time-slots/stream/?date={args.date}'
+    subscribers, tasks, connect_seconds = await connect_all(args.url, path, args.subscribers, args.connect_concurrency)
+    print(f'{len(subscribers)} subscribers connected in {connect_seconds:.1f}s')
+
+    await asyncio.sleep(args.idle)
+    server = (await client.request('GET', '/api/mongo/metrics/slot-subscribers/', headers=metrics)).json()
+    print(f"Worker reports {server.get('subscribers')} subscribers, peak RSS {server.get('max_rss_kb')} kB")
+
+    slot_ids = await available_slot_ids(client, args.date)
+    if not slot_ids:
+        raise SystemExit(f'No bookable slots on {args.date}; pick another --date')
+    fanout, last = [], []
+    for index in range(args.holds):
+        for subscriber in subscribers:
+            subscriber.delta.clear()
+        started = time.perf_counter()
+        response = await client.request('POST', f'/api/mongo/time-slots/{slot_ids[index % len(slot_ids)]}/hold/',
+                                        json_body={'seats': 1})
+        if response.status != 201:
+            print(f'Hold {index} failed: {response.status} {response.body[:200]!r}')
+            continue
+        try:
+            await asyncio.wait_for(asyncio.gather(*(s.delta.wait() for s in subscribers)), args.timeout)
+        except asyncio.TimeoutError:
+            print(f'Hold {index}: only {sum(s.delta.is_set() for s in subscribers)} subscribers got the delta')
+        arrivals = [s.deltas[-1] - started for s in subscribers if s.delta.is_set()]
+        fanout.extend(arrivals)
+        if arrivals:
+            last.append(max(arrivals))
+        await asyncio.sleep(args.pause)
+
+    for subscriber in subscribers:
+        subscriber.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await client.close()
+    return {
+        'connect_seconds': round(connect_seconds, 3),
+        'server': server,
+        'fanout': summarize(fanout),
+        'last_subscriber': summarize(last),
+    }
+
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of an ASGI server')
+    parser.add_argument('--spawn', action='store_true', help='start a single uvicorn worker')
+    parser.add_argument('--metrics-token', default=os.environ.get('METRICS_TOKEN', ''))
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--connect-concurrency', type=int, default=200, help='connections opened at once')
+    parser.add_argument('--idle', type=float, default=5.0, help='seconds to stay idle before booking')
+    parser.add_argument('--holds', type=int, default=20)
+    parser.add_argument('--pause', type=float, default=0.5, help='seconds between holds')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for a delta')
+    parser.add_argument('--date', default=(date.today() + timedelta(days=1)).isoformat())
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    limit = raise_file_limit()
+    if limit < args.subscribers * 2 + 100:
+        print(f'Warning: open file limit {limit} is low for {args.subscribers} subscribers')
+
+    process = None
+    try:
+        if args.spawn:
+            args.metrics_token = args.metrics_token or secrets.token_hex(8)
+            os.environ['METRICS_TOKEN'] = args.metrics_token
+            process, args.url = spawn_server('asgi', threads=1)
+        if not args.url:
+            parser.error('pass --spawn or --url')
+        results = asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.terminate()
+
+    for name in ('fanout', 'last_subscriber'):
+        row = results[name]
+        print(f"{name:<16} p50={row.get('p50_ms')}ms  p95={row.get('p95_ms')}ms  p99={row.get('p99_ms')}ms")
+    path = save_results('sse_subscribers', {
+        'url': args.url, 'subscribers': args.subscribers, 'holds': args.holds, 'date': args.date, **results,
+    }, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
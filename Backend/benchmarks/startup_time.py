@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark.
+
+Measures, with and without a reachable MongoDB:
+  * ``manage.py check`` wall time (what every management command pays), and
+  * time-to-first-request of gunicorn workers, from process spawn until the
+    first 200 on ``--path``, for each MONGODB_WARMUP mode.
+
+Usage (from Backend/):
+    python -m benchmarks.startup_time --reachable-uri mongodb://localhost:27017
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from .common import BACKEND_DIR, free_port, save_results, summarize
+
+# Non-routable address: connections hang until the driver's timeouts fire
+DEFAULT_UNREACHABLE_URI = 'mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=5000'
+
+
+def time_manage_check(env):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, 'manage.py', 'check'], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+    )
+    return time.perf_counter() - started
+
+
+def time_first_request(env, workers, path, timeout):
+    port = free_port()
+    cmd = [
+        sys.executable, '-m', 'gunicorn', 'project.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+    ]
+    started = time.perf_counter()
+    server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}{path}'
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.02)
+        raise TimeoutError(f'no 200 from {url} within {timeout}s')
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def run_scenario(name, mongo_uri, warmup, args):
+    env = dict(os.environ, MONGO_URI=mongo_uri, MONGODB_WARMUP=warmup)
+    check_samples, first_request_samples, errors = [], [], []
+    for _ in range(args.runs):
+        check_samples.append(time_manage_check(env))
+        try:
+            first_request_samples.append(time_first_request(env, args.workers, args.path, args.timeout))
+        except Exception as e:
+            errors.append(str(e))
+    result = {
+        'mongo_uri': mongo_uri,
+        'warmup': warmup,
+        'manage_check': summarize(check_samples),
+        'time_to_first_request': summarize(first_request_samples),
+        'errors': errors,
+    }
+    print(f"{name:<28} check p50={result['manage_check'].get('p50_ms', '-')}ms  "
+          f"first request p50={result['time_to_first_request'].get('p50_ms', '-')}ms  errors={len(errors)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reachable-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--unreachable-uri', default=DEFAULT_UNREACHABLE_URI)
+    parser.add_argument('--warmup-modes', default='off,background,blocking')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', default='/api/mongo/health/')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/...)')
+    args = parser.parse_args()
+
+    results = {}
+    for warmup in args.warmup_modes.split(','):
+        results[f'reachable/{warmup}'] = run_scenario(f'reachable/{warmup}', args.reachable_uri, warmup, args)
+        results[f'unreachable/{warmup}'] = run_scenario(f'unreachable/{warmup}', args.unreachable_uri, warmup, args)
+
+    path = save_results('startup_time', {'workers': args.workers, 'path': args.path, 'scenarios': results}, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
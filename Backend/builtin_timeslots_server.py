@@ -87,6 +87,14 @@ def create_default_timeslots_for_date(target_date_str):
         print(f"Error creating default timeslots: {e}")
         return []
 
+def journal_booking(request_data, booking_id, booking_date):
+    """Append the booking to the Django app's offline journal (app/offline_journal.py)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    import django
+    django.setup()
+    from app.offline_journal import record_booking
+    return record_booking(request_data, booking_id, booking_date)
+
 class TimeSlotHandler(BaseHTTPRequestHandler):
     """HTTP request handler for time slots API"""
     
@@ -506,31 +514,17 @@ class TimeSlotHandler(BaseHTTPRequestHandler):
                             db = client['infinite_clinic_db']
                             timeslots_collection = db['timeslots']
                             
-                            # Find and update the time slot
+                            # Find the time slot
                             slot = timeslots_collection.find_one({'_id': ObjectId(time_slot_id)})
                             
                             if slot:
-                                # Update booked slots
-                                new_booked = slot.get('booked_slots', 0) + 1
-                                available_slots = slot.get('available_slots', 10) - 1
-                                
-                                timeslots_collection.update_one(
-                                    {'_id': ObjectId(time_slot_id)},
-                                    {
-                                        '$set': {
-                                            'booked_slots': new_booked,
-                                            'available_slots': max(0, available_slots),
-                                            'available': available_slots > 0
-                                        }
-                                    }
-                                )
-                                
+                                # Only read for the reply: the journal replay takes the seat
                                 start_time = slot['start_time'].strftime('%H:%M') if hasattr(slot['start_time'], 'strftime') else str(slot['start_time'])[:5]
                                 end_time = slot['end_time'].strftime('%H:%M') if hasattr(slot['end_time'], 'strftime') else str(slot['end_time'])[:5]
                                 time_slot_info['time'] = f"{start_time} - {end_time}"
                                 time_slot_info['source'] = 'mongodb_atlas'
                                 
-                                print(f"✅ Updated MongoDB Atlas slot: {time_slot_info['time']}")
+                                print(f"✅ Found MongoDB Atlas slot: {time_slot_info['time']}")
                             
                             client.close()
                             
@@ -543,11 +537,23 @@ class TimeSlotHandler(BaseHTTPRequestHandler):
                     print(f"⚠️ Time slot processing error: {slot_error}")
                     time_slot_info['time'] = request_data.get('preferred_time', 'Custom time')
             
+            # Journal it for the Django app to replay (sync_offline_journal)
+            journal_data = dict(request_data)
+            if time_slot_info.get('source') == 'fallback':
+                journal_data['time_slot_id'] = None  # only ever existed in the JSON file
+            try:
+                booking_day = datetime.strptime(booking_date, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                booking_day = date.today()
+            journal_booking(journal_data, booking_id, booking_day)
+            
             # Create booking response
             response = {
                 'success': True,
-                'message': 'Test booking successful!',
+                'queued': True,
+                'message': 'Booking received; it will be confirmed as soon as our database is reachable again',
                 'booking_id': booking_id,
+                'status': 'queued',
                 'total_amount': request_data.get('total_price', 0),
                 'booking_date': booking_date,
                 'time_slot_info': time_slot_info,
@@ -556,11 +562,11 @@ class TimeSlotHandler(BaseHTTPRequestHandler):
                     'total_patients': len(request_data.get('cart_items', [])),
                     'booking_time': datetime.utcnow().isoformat()
                 },
-                'note': 'Booking processed successfully'
+                'note': 'Booking recorded in the offline journal'
             }
             
-            print(f"✅ Booking successful: {booking_id}")
-            self.send_json_response(response)
+            print(f"✅ Booking journaled: {booking_id}")
+            self.send_json_response(response, 202)
             
         except Exception as e:
             print(f"❌ Booking error: {str(e)}")
@@ -0,0 +1,83 @@
+"""
+Gunicorn configuration for production (used by start_production.py).
+
+Environment overrides:
+    PORT                  listen port (default 8000)
+    APP_SERVER            'wsgi' (gthread workers) or 'asgi' (uvicorn workers)
+    WEB_CONCURRENCY       fixed worker count; otherwise derived from CPU/memory
+    WEB_WORKER_MEMORY_MB  memory budget per worker used for that derivation
+    BACKGROUND_PROCESSES  manage.py commands running next to gunicorn (set by
+                          start_production.py); each gets a worker's budget
+    WEB_THREADS           threads per gthread worker
+    MAX_REQUESTS          recycle a worker after this many requests (jittered)
+"""
+
+import multiprocessing
+import os
+
+
+def _memory_limit_mb():
+    """Container memory limit (cgroup v2/v1), falling back to physical memory"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            continue
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _worker_count():
+    if os.environ.get('WEB_CONCURRENCY'):
+        return max(int(os.environ['WEB_CONCURRENCY']), 1)
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory_mb = _memory_limit_mb()
+    if memory_mb is None:
+        return by_cpu
+    # Leave headroom for the master process, the OS and the background
+    # commands, each a full Django process with its own MongoClient
+    worker_mb = int(os.environ.get('WEB_WORKER_MEMORY_MB', 160))
+    background_mb = int(os.environ.get('BACKGROUND_PROCESSES', 0)) * worker_mb
+    by_memory = (memory_mb - 128 - background_mb) // worker_mb
+    return max(min(by_cpu, by_memory), 1)
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = _worker_count()
+
+if os.environ.get('APP_SERVER', 'wsgi') == 'asgi':
+    wsgi_app = 'project.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'project.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Import Django once in the master; workers share the pages copy-on-write
+preload_app = True
+
+# Recycle workers periodically, staggered so they don't all restart together
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = max(max_requests // 10, 1)
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# pymongo clients must not be shared across fork(): keep the master from
+# opening one while preloading and warm up in each worker instead.
+_worker_warmup = os.environ.get('MONGODB_WARMUP', 'background')
+os.environ['MONGODB_WARMUP'] = 'off'
+
+
+def post_fork(server, worker):
+    from app.mongo_connection import warm_up
+    warm_up(mode=_worker_warmup)
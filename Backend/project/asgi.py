@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_asgi_application()
+
+# Open the MongoDB pool ahead of the first request (settings.MONGODB_WARMUP)
+from app.mongo_connection import warm_up
+
+warm_up()
@@ -14,7 +14,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-0npo4&-ne8grl#s8tfu3qz2nt=1ei$x3_uqzght7dth%!d&&x*'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = False
+DEBUG = config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = ["*"]
 
@@ -26,6 +26,8 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Application definition
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",   # MUST BE FIRST
+    "app.instrumentation.RequestTimingMiddleware",
+    "app.degraded.DegradedModeMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,14 +55,20 @@ INSTALLED_APPS = [
     "django_filters",
 ]
 
-# Caching Configuration
+# Caching Configuration: a per-process LRU in front of a store shared by all
+# workers (app/cache_backends.py). CACHE_L2: 'mongodb' (TTL collection),
+# 'redis://...', 'memcached://host:port' or 'memory' (not shared)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'app.cache_backends.TwoTierCache',
+        'LOCATION': config('CACHE_L2', default='mongodb'),
         'TIMEOUT': 300,  # 5 minutes
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,  # longest a worker serves a value another worker has replaced
+            'EARLY_REFRESH_BETA': 1.0,
+            'LOCK_TIMEOUT': 10,
+            'STALE_GRACE': 60,
         }
     }
 }
@@ -92,7 +100,11 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        # POST time-slots/<id>/hold/ per user, or per IP when signed out
+        'slot_holds': config('SLOT_HOLD_THROTTLE_RATE', default='20/min'),
+    },
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),  # Increased from 10 minutes
@@ -145,8 +157,8 @@ DATABASES = {
 }
 
 # MongoDB Configuration with MongoEngine
-import mongoengine
-
+# The connection is registered lazily in AppConfig.ready (app/mongo_connection.py),
+# so importing settings never waits on server selection.
 MONGODB_SETTINGS = {
     'db': config('MONGO_DB_NAME', default='infinite_clinic_db'),
     'host': config('MONGO_URI', default='mongodb://localhost:27017'),
@@ -158,17 +170,101 @@ MONGODB_SETTINGS = {
     'connectTimeoutMS': 10000,  # 10 second connection timeout
 }
 
-# Connect to MongoDB with optimized settings
-mongoengine.connect(
-    db=MONGODB_SETTINGS['db'],
-    host=MONGODB_SETTINGS['host'],
-    maxPoolSize=MONGODB_SETTINGS['maxPoolSize'],
-    minPoolSize=MONGODB_SETTINGS['minPoolSize'],
-    maxIdleTimeMS=MONGODB_SETTINGS['maxIdleTimeMS'],
-    serverSelectionTimeoutMS=MONGODB_SETTINGS['serverSelectionTimeoutMS'],
-    socketTimeoutMS=MONGODB_SETTINGS['socketTimeoutMS'],
-    connectTimeoutMS=MONGODB_SETTINGS['connectTimeoutMS'],
+# Open the pool when a server process starts: 'off', 'background' or 'blocking'
+MONGODB_WARMUP = config('MONGODB_WARMUP', default='background')
+
+# Seconds a seat stays held between choosing a slot and completing payment
+SLOT_HOLD_TTL_SECONDS = config('SLOT_HOLD_TTL_SECONDS', default=600, cast=int)
+# Most seats one hold (one checkout) may take
+SLOT_HOLD_MAX_SEATS = config('SLOT_HOLD_MAX_SEATS', default=10, cast=int)
+# Most active holds one owner, or one client IP, may have at a time
+SLOT_HOLD_MAX_ACTIVE = config('SLOT_HOLD_MAX_ACTIVE', default=5, cast=int)
+# 'virtual': slots come from the schedule template and are stored on first
+# booking (app/slot_templates.py); 'materialized': maintain_slot_horizon keeps
+# SLOT_HORIZON_DAYS days of slot documents ahead (app/slot_horizon.py);
+# 'bucket': one document per day embedding its slots (app/slot_buckets.py,
+# convert existing slots with `manage.py migrate_timeslots --to bucket`)
+SLOT_STORAGE = config('SLOT_STORAGE', default='virtual')
+SLOT_HORIZON_DAYS = config('SLOT_HORIZON_DAYS', default=30, cast=int)
+# Concurrent identical slot/catalog/stats reads share one query per process
+# (app/singleflight.py); shared: one per deployment, via a lease in MongoDB
+SINGLEFLIGHT_SHARED = config('SINGLEFLIGHT_SHARED', default=False, cast=bool)
+SINGLEFLIGHT_LEASE_SECONDS = config('SINGLEFLIGHT_LEASE_SECONDS', default=10, cast=int)
+# In-process caches (schedule template, catalogs) are invalidated in every
+# worker through a capped collection each process tails (app/cache_bus.py)
+CACHE_BUS = config('CACHE_BUS', default=True, cast=bool)
+CACHE_BUS_MAX_STALENESS = config('CACHE_BUS_MAX_STALENESS', default=30, cast=float)
+# Live availability over SSE (app/slot_events.py): change streams 'auto'
+# (when the deployment supports them), 'on' or 'off'
+SLOT_EVENTS_CHANGE_STREAMS = config('SLOT_EVENTS_CHANGE_STREAMS', default='auto')
+SLOT_EVENTS_RESYNC_SECONDS = config('SLOT_EVENTS_RESYNC_SECONDS', default=30, cast=float)
+SLOT_EVENTS_KEEPALIVE_SECONDS = config('SLOT_EVENTS_KEEPALIVE_SECONDS', default=15, cast=float)
+# MongoDB circuit breaker (app/degraded.py): after this many connection
+# failures in a row, database views fail fast and slot/catalog reads are
+# served from their last good snapshot; one read probes again after the reset
+DEGRADED_FAILURE_THRESHOLD = config('DEGRADED_FAILURE_THRESHOLD', default=5, cast=int)
+DEGRADED_RESET_SECONDS = config('DEGRADED_RESET_SECONDS', default=15.0, cast=float)
+# Files that must outlive a deploy go on a persistent volume: DATA_DIR,
+# Railway's volume mount or /data (the Dockerfile's VOLUME). BASE_DIR is
+# replaced on every deploy and only used when none of them exists (development)
+DATA_DIR = Path(config('DATA_DIR', default=config('RAILWAY_VOLUME_MOUNT_PATH', default='/data')))
+# Bookings taken while MongoDB is down are appended here and replayed by
+# `manage.py sync_offline_journal` (app/offline_journal.py), which
+# start_production.py runs next to gunicorn
+OFFLINE_JOURNAL_PATH = config(
+    'OFFLINE_JOURNAL_PATH',
+    default=str((DATA_DIR if DATA_DIR.is_dir() else BASE_DIR) / 'offline_journal.jsonl'),
 )
+# Background tasks (app/tasks.py) run on `manage.py run_task_worker`, which
+# start_production.py runs next to gunicorn; eager (the default with
+# DEBUG=1) runs them inline instead, for development without a worker
+TASKS_EAGER = config('TASKS_EAGER', default=DEBUG, cast=bool)
+
+# Request timing: number of samples kept per endpoint for /api/mongo/metrics/slow-endpoints/
+REQUEST_TIMING_WINDOW = config('REQUEST_TIMING_WINDOW', default=500, cast=int)
+# Optional shared secret for scraping timing metrics without a staff login
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Logging
+# Handlers write through a background queue; see app/logging_utils.py
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_SAMPLE_RATE = config('LOG_SAMPLE_RATE', default=1.0, cast=float)  # DEBUG/INFO only
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "redact": {"()": "app.logging_utils.RedactingFilter"},
+        "sample": {"()": "app.logging_utils.SamplingFilter", "rate": LOG_SAMPLE_RATE},
+    },
+    "formatters": {
+        "json": {"()": "app.logging_utils.JsonFormatter"},
+    },
+    "handlers": {
+        "queue": {
+            "()": "app.logging_utils.QueueLogHandler",
+            "filters": ["redact", "sample"],
+            "formatter": "json",
+        },
+    },
+    "root": {
+        "handlers": ["queue"],
+        "level": "WARNING",
+    },
+    "loggers": {
+        "django": {
+            "handlers": ["queue"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "app": {
+            "handlers": ["queue"],
+            "level": LOG_LEVEL,
+            "propagate": False,
+        },
+    },
+}
 
 
 # Password validation
@@ -214,3 +310,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Razorpay Settings
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='rzp_test_ROhm8gRpTv2xUm')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='AOX9CU7x2sCR2Sp8XYv3lFoq')
+# Gateway client limits (see app/payment_gateway.py); RAZORPAY_BASE_URL is for fake gateways
+RAZORPAY_BASE_URL = config('RAZORPAY_BASE_URL', default='')
+RAZORPAY_CONNECT_TIMEOUT = config('RAZORPAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+RAZORPAY_READ_TIMEOUT = config('RAZORPAY_READ_TIMEOUT', default=10.0, cast=float)
+RAZORPAY_MAX_ATTEMPTS = config('RAZORPAY_MAX_ATTEMPTS', default=3, cast=int)
+RAZORPAY_BREAKER_THRESHOLD = config('RAZORPAY_BREAKER_THRESHOLD', default=5, cast=int)
+RAZORPAY_BREAKER_RESET_SECONDS = config('RAZORPAY_BREAKER_RESET_SECONDS', default=30.0, cast=float)
+# Secret set on the webhook in the Razorpay dashboard (POST /razorpay/webhook/)
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
@@ -1,9 +1,14 @@
 from .settings import *
 import os
 
+from decouple import config
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
+# start_production.py runs a task worker next to gunicorn, whatever DEBUG was set to
+TASKS_EAGER = config('TASKS_EAGER', default=False, cast=bool)
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-production-secret-key-here')
 
@@ -57,10 +62,30 @@ CSRF_COOKIE_SAMESITE = "None"
 # SESSION_COOKIE_SECURE = True
 # CSRF_COOKIE_SECURE = True
 
-# Static files for production
+# Static files for production, served by whitenoise from the gunicorn workers
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+MIDDLEWARE = list(MIDDLEWARE)
+# Under ASGI too: nothing else serves /static/ with DEBUG off. whitenoise's
+# middleware is sync-only, so there Django runs it through a thread hop.
+MIDDLEWARE.insert(
+    MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1,
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+)
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        # Pre-compressed, content-hashed files with far-future cache headers
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+# Don't 500 on assets missing from the manifest (e.g. collectstatic skipped)
+WHITENOISE_MANIFEST_STRICT = False
+
 # MongoDB settings for production
 MONGODB_SETTINGS = {
     'db': os.environ.get('MONGO_DB_NAME', 'infinite_clinic_prod'),
@@ -75,26 +100,3 @@ MONGODB_SETTINGS = {
 
 # Time Slots Configuration
 ENABLE_TIME_SLOTS_AUTO_CREATION = os.environ.get('ENABLE_TIME_SLOTS_AUTO_CREATION', 'True').lower() == 'true'
-
-# Logging for production
-LOGGING = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-        },
-    },
-    "loggers": {
-        "django": {
-            "handlers": ["console"],
-            "level": "INFO",
-            "propagate": True,
-        },
-        "app": {
-            "handlers": ["console"],
-            "level": "INFO",
-            "propagate": True,
-        },
-    },
-}
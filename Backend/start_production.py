@@ -5,8 +5,19 @@ This ensures the correct Django server starts with MongoDB Atlas connection
 """
 
 import os
+import signal
 import sys
 import subprocess
+import threading
+
+# Seconds before a background command that exited is started again
+RESTART_DELAY = 5
+
+# name -> Popen of the background commands running next to gunicorn
+background_processes = {}
+background_commands = []
+_background_lock = threading.Lock()
+_stopping = threading.Event()
 
 def setup_production_environment():
     """Setup production environment"""
@@ -16,33 +27,156 @@ def setup_production_environment():
     # Set production environment variables
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings_prod')
     
-    # Get port from environment (Render.com sets this)
+    # Get port from environment (Render.com sets this); gunicorn.conf.py reads it too
     port = os.environ.get('PORT', '8000')
+    os.environ['PORT'] = port
     
     print(f"📡 Port: {port}")
     print(f"🔧 Django Settings: {os.environ.get('DJANGO_SETTINGS_MODULE')}")
-    print(f"🗄️ MongoDB URI: {os.environ.get('MONGO_URI', 'Not set')}")
+    print(f"🗄️ MongoDB URI: {'set' if os.environ.get('MONGO_URI') else 'Not set'}")
+    
+    # Mirrors OFFLINE_JOURNAL_PATH's default in project/settings.py
+    data_dir = os.environ.get('DATA_DIR') or os.environ.get('RAILWAY_VOLUME_MOUNT_PATH') or '/data'
+    if not os.environ.get('OFFLINE_JOURNAL_PATH') and not os.path.isdir(data_dir):
+        print(f"⚠️ No persistent volume at {data_dir} - bookings journaled during a MongoDB outage won't survive a redeploy")
     
     return port
 
+def collect_static():
+    """Collect static files for whitenoise (idempotent, skipped with COLLECTSTATIC=0)"""
+    if os.environ.get('COLLECTSTATIC', '1') == '0':
+        return
+    cmd = [sys.executable, 'manage.py', 'collectstatic', '--noinput', '--verbosity', '0']
+    result = subprocess.run(cmd)
+    if result.returncode != 0:
+        print("⚠️ collectstatic failed - static files may be missing")
+
+def ensure_indexes():
+    """
+    Create missing declared MongoDB indexes and rebuild those whose options
+    changed, e.g. a new unique constraint (skipped with ENSURE_INDEXES=0)
+    """
+    if os.environ.get('ENSURE_INDEXES', '1') == '0':
+        return
+    result = subprocess.run([sys.executable, 'manage.py', 'ensure_indexes', '--rebuild'])
+    if result.returncode != 0:
+        print("⚠️ ensure_indexes failed - continuing with the current indexes")
+
+def maintain_slot_horizon():
+    """
+    With SLOT_STORAGE=materialized create the next SLOT_HORIZON_DAYS of slots
+    (skipped with SLOT_HORIZON=0). Duplicate slots are merged once, by hand:
+    `manage.py maintain_slot_horizon --once --merge-duplicates`
+    """
+    if os.environ.get('SLOT_HORIZON', '1') == '0':
+        return
+    command = [sys.executable, 'manage.py', 'maintain_slot_horizon', '--once']
+    result = subprocess.run(command)
+    if result.returncode != 0:
+        print("⚠️ maintain_slot_horizon failed - availability may show empty days")
+
+def keep_slot_horizon():
+    """Keep the materialized horizon rolling in the background (SLOT_STORAGE=materialized only)"""
+    if os.environ.get('SLOT_HORIZON', '1') == '0' or os.environ.get('SLOT_STORAGE', 'virtual') != 'materialized':
+        return
+    # Re-runs are idempotent, so one maintainer per instance is harmless
+    run_in_background('maintain_slot_horizon', ['maintain_slot_horizon'])
+
+def run_in_background(name, args):
+    """Run ``manage.py <args>`` next to gunicorn; restarted when it exits, stopped with the server"""
+    command = [sys.executable, 'manage.py', *args]
+
+    def supervise():
+        while True:
+            with _background_lock:
+                if _stopping.is_set():
+                    return
+                process = subprocess.Popen(command)
+                background_processes[name] = process
+            returncode = process.wait()
+            if _stopping.is_set():
+                return
+            print(f"⚠️ {name} exited with {returncode} - restarting in {RESTART_DELAY}s")
+            _stopping.wait(RESTART_DELAY)
+
+    print(f"🔁 Background: {' '.join(command[1:])}")
+    background_commands.append(name)
+    threading.Thread(target=supervise, name=name, daemon=True).start()
+
+def stop_background():
+    """Terminate the background commands, killing those that don't exit within 10s"""
+    with _background_lock:
+        _stopping.set()
+        processes = list(background_processes.values())
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def process_payment_events():
+    """Apply queued Razorpay webhooks to bookings in the background (skipped with PAYMENT_EVENTS=0)"""
+    if os.environ.get('PAYMENT_EVENTS', '1') == '0':
+        return
+    run_in_background('process_payment_events', ['process_payment_events'])
+
+def run_task_worker():
+    """Run queued background tasks, e.g. prescription uploads (not needed with TASKS_EAGER=1)"""
+    if os.environ.get('TASKS_EAGER', '').lower() in ('1', 'true', 'yes', 'on'):
+        return
+    run_in_background('run_task_worker', ['run_task_worker'])
+
+def sync_offline_journal():
+    """Replay bookings journaled during a MongoDB outage once it is back (skipped with OFFLINE_JOURNAL_SYNC=0)"""
+    if os.environ.get('OFFLINE_JOURNAL_SYNC', '1') == '0':
+        return
+    run_in_background('sync_offline_journal', ['sync_offline_journal'])
+
+def gunicorn_command():
+    """gunicorn (WSGI, gthread workers) or gunicorn + uvicorn workers (ASGI)"""
+    if os.environ.get('APP_SERVER', 'wsgi') == 'asgi':
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            print("⚠️ APP_SERVER=asgi but uvicorn is not installed - using WSGI workers")
+            os.environ['APP_SERVER'] = 'wsgi'
+    # Workers, preload, max-requests jitter etc. live in gunicorn.conf.py
+    return [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py']
+
 def start_django_server(port):
-    """Start Django server for production"""
+    """Start Django under gunicorn for production"""
     try:
-        print("🔄 Starting Django server with MongoDB Atlas...")
+        print(f"🔄 Starting gunicorn ({os.environ.get('APP_SERVER', 'wsgi')}) with MongoDB Atlas...")
         
-        # Django server command
-        cmd = [
-            sys.executable, 
-            'manage.py', 
-            'runserver', 
-            f'0.0.0.0:{port}',
-            '--settings=project.settings_prod'
-        ]
+        collect_static()
+        maintain_slot_horizon()
+        ensure_indexes()
+        keep_slot_horizon()
+        process_payment_events()
+        run_task_worker()
+        sync_offline_journal()
+        cmd = gunicorn_command()
+        # gunicorn.conf.py leaves each of them a worker's memory budget
+        os.environ['BACKGROUND_PROCESSES'] = str(len(background_commands))
         
         print(f"📋 Command: {' '.join(cmd)}")
         
-        # Start Django server
-        subprocess.run(cmd, check=True)
+        # Blocks until gunicorn exits; a non-zero exit triggers the fallback.
+        # The platform stops us with SIGTERM: pass it on for a graceful shutdown
+        server = subprocess.Popen(cmd)
+
+        def forward_sigterm(signum, frame):
+            _stopping.set()
+            server.send_signal(signum)
+
+        signal.signal(signal.SIGTERM, forward_sigterm)
+        returncode = server.wait()
+        if returncode != 0 and not _stopping.is_set():
+            raise subprocess.CalledProcessError(returncode, cmd)
+        return True
         
     except subprocess.CalledProcessError as e:
         print(f"❌ Django server failed: {e}")
@@ -50,6 +184,8 @@ def start_django_server(port):
     except Exception as e:
         print(f"❌ Error starting Django: {e}")
         return False
+    finally:
+        stop_background()
 
 def start_simple_server(port):
     """Fallback to simple server if Django fails"""
@@ -75,7 +211,7 @@ def main():
     """Main production startup"""
     port = setup_production_environment()
     
-    # Try Django first (preferred for MongoDB Atlas)
+    # Try Django under gunicorn first (preferred for MongoDB Atlas)
     print("🎯 Attempting Django server with MongoDB Atlas...")
     django_success = start_django_server(port)
     